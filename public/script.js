@@ -1,6 +1,9 @@
 // Global variables
 let allProducts = [];
 let trendingProducts = [];
+// Cursor of the next /api/products page for the current sort and filters (null: no more pages)
+let nextCursor = null;
+let searchTimer = null;
 
 // DOM elements
 const productsGrid = document.getElementById('productsGrid');
@@ -12,6 +15,7 @@ const refreshBtn = document.getElementById('refreshBtn');
 const urlInput = document.getElementById('urlInput');
 const addUrlsBtn = document.getElementById('addUrlsBtn');
 const crawlingStatus = document.getElementById('crawlingStatus');
+const loadMoreBtn = document.getElementById('loadMoreBtn');
 
 // Tab navigation
 const navTabs = document.querySelectorAll('.nav-tab');
@@ -71,6 +75,9 @@ function setupEventListeners() {
     // Refresh button
     refreshBtn.addEventListener('click', loadProducts);
     
+    // Next page of products
+    loadMoreBtn.addEventListener('click', loadMoreProducts);
+    
     // Recrawl all button
     const recrawlAllBtn = document.getElementById('recrawlAllBtn');
     if (recrawlAllBtn) {
@@ -103,11 +110,8 @@ function setupEventListeners() {
 // Recrawl all existing products
 async function recrawlAllProducts() {
     try {
-        if (!allProducts || allProducts.length === 0) {
-            showError('No products to recrawl');
-            return;
-        }
-        const urls = allProducts.map(p => p.url).filter(Boolean);
+        const urlsResponse = await fetch('/api/products/urls');
+        const urls = urlsResponse.ok ? ((await urlsResponse.json()).urls || []) : [];
         if (urls.length === 0) {
             showError('No valid URLs to recrawl');
             return;
@@ -131,17 +135,33 @@ async function recrawlAllProducts() {
     }
 }
 
-// Load products from API
+// Query string for /api/products from the search box, sort and filter controls
+function productQuery(cursor = null) {
+    const params = new URLSearchParams({ sort: sortSelect.value });
+    const searchTerm = searchInput.value.trim();
+    if (searchTerm) {
+        params.set('q', searchTerm);
+    }
+    if (filterSelect.value === 'trending') {
+        params.set('trending', '1');
+    }
+    if (cursor) {
+        params.set('cursor', cursor);
+    }
+    return params.toString();
+}
+
+// Load the first page of products from API
 async function loadProducts() {
     try {
         showLoading(productsGrid);
         
-        const response = await fetch('/api/products');
+        const response = await fetch(`/api/products?${productQuery()}`);
         const data = await response.json();
         
         if (response.ok) {
             allProducts = data.products || [];
-            trendingProducts = data.trending || [];
+            nextCursor = data.next_cursor || null;
             
             renderProducts(allProducts);
             showSuccess('Products loaded successfully');
@@ -151,22 +171,48 @@ async function loadProducts() {
     } catch (error) {
         console.error('Error loading products:', error);
         showError('Failed to load products');
+        nextCursor = null;
         renderNoProducts();
     }
+    loadMoreBtn.style.display = nextCursor ? '' : 'none';
 }
 
-// Load trending products
-function loadTrendingProducts() {
-    if (trendingProducts.length > 0) {
-        renderTrendingProducts(trendingProducts);
-    } else {
-        trendingGrid.innerHTML = `
-            <div class="no-products-message">
-                <i class="fas fa-fire"></i>
-                <p>No trending products found</p>
-            </div>
-        `;
+// Append the next page of products
+async function loadMoreProducts() {
+    if (!nextCursor) {
+        return;
     }
+    loadMoreBtn.disabled = true;
+    try {
+        const response = await fetch(`/api/products?${productQuery(nextCursor)}`);
+        const data = await response.json();
+        if (!response.ok) {
+            throw new Error(data.error || 'Failed to load products');
+        }
+        const products = data.products || [];
+        allProducts = allProducts.concat(products);
+        nextCursor = data.next_cursor || null;
+        productsGrid.insertAdjacentHTML('beforeend', products.map(product => createProductCard(product)).join(''));
+    } catch (error) {
+        console.error('Error loading more products:', error);
+        showError('Failed to load more products');
+    } finally {
+        loadMoreBtn.disabled = false;
+        loadMoreBtn.style.display = nextCursor ? '' : 'none';
+    }
+}
+
+// Load trending products (biggest rank climbers first)
+async function loadTrendingProducts() {
+    try {
+        const response = await fetch('/api/products?trending=1&sort=change');
+        const data = await response.json();
+        trendingProducts = response.ok ? (data.products || []) : [];
+    } catch (error) {
+        console.error('Error loading trending products:', error);
+        trendingProducts = [];
+    }
+    renderTrendingProducts(trendingProducts);
 }
 
 // Render products grid
@@ -332,85 +378,18 @@ function renderNoProducts() {
     `;
 }
 
-// Search functionality
+// Search, sort and filter run on the server; each change reloads the first page
 function handleSearch() {
-    const searchTerm = searchInput.value.toLowerCase();
-    const filteredProducts = allProducts.filter(product => 
-        product.name.toLowerCase().includes(searchTerm) ||
-        (product.asin && product.asin.toLowerCase().includes(searchTerm)) ||
-        (product.brand && product.brand.toLowerCase().includes(searchTerm))
-    );
-    renderProducts(filteredProducts);
+    clearTimeout(searchTimer);
+    searchTimer = setTimeout(loadProducts, 250);
 }
 
-// Sort functionality
 function handleSort() {
-    const sortBy = sortSelect.value;
-    const sortedProducts = [...allProducts].sort((a, b) => {
-        switch (sortBy) {
-            case 'rank':
-                // Check if values are N/A
-                const aIsNA = !a.rank || a.rank === 'N/A';
-                const bIsNA = !b.rank || b.rank === 'N/A';
-                
-                // Put non-N/A values first
-                if (aIsNA && !bIsNA) return 1;
-                if (!aIsNA && bIsNA) return -1;
-                if (aIsNA && bIsNA) return 0;
-                
-                // Sort by rank value
-                return parseInt(a.rank) - parseInt(b.rank);
-                
-            case 'date':
-                // Check if values are N/A
-                const aDateIsNA = !a.date || a.date === 'N/A';
-                const bDateIsNA = !b.date || b.date === 'N/A';
-                
-                // Put non-N/A values first
-                if (aDateIsNA && !bDateIsNA) return 1;
-                if (!aDateIsNA && bDateIsNA) return -1;
-                if (aDateIsNA && bDateIsNA) return 0;
-                
-                // Sort by date value (newest first)
-                const aDate = new Date(a.date);
-                const bDate = new Date(b.date);
-                return bDate - aDate;
-                
-            case 'name':
-                return a.name.localeCompare(b.name);
-                
-            case 'ratings':
-                // Check if values are N/A
-                const aRatingsIsNA = !a.ratings || a.ratings === 'N/A';
-                const bRatingsIsNA = !b.ratings || b.ratings === 'N/A';
-                
-                // Put non-N/A values first
-                if (aRatingsIsNA && !bRatingsIsNA) return 1;
-                if (!aRatingsIsNA && bRatingsIsNA) return -1;
-                if (aRatingsIsNA && bRatingsIsNA) return 0;
-                
-                // Sort by ratings value (descending)
-                return parseInt(b.ratings) - parseInt(a.ratings);
-                
-            default:
-                return 0;
-        }
-    });
-    renderProducts(sortedProducts);
+    loadProducts();
 }
 
-// Filter functionality
 function handleFilter() {
-    const filterBy = filterSelect.value;
-    let filteredProducts = allProducts;
-    
-    if (filterBy === 'trending') {
-        filteredProducts = allProducts.filter(product => 
-            product.rank_change_percent && product.rank_change_percent > 10
-        );
-    }
-    
-    renderProducts(filteredProducts);
+    loadProducts();
 }
 
 // URL submission
@@ -454,7 +433,7 @@ async function handleUrlSubmission() {
             urlInput.value = '';
             
             // Start real-time updates
-            startRealTimeUpdates(urls);
+            startRealTimeUpdates(urls, data.eventId);
         } else {
             throw new Error(data.error || 'Crawling failed');
         }
@@ -513,52 +492,91 @@ function addLoadingCards(urls) {
     productsGrid.insertAdjacentHTML('afterbegin', loadingCards);
 }
 
-// Start real-time updates
-function startRealTimeUpdates(urls) {
-    let processedUrls = new Set(); // Track processed URLs
-    
-    const updateInterval = setInterval(async () => {
-        try {
-            // Check crawl status for specific URLs
-            const statusResponse = await fetch(`/api/crawl-status?urls=${encodeURIComponent(JSON.stringify(urls))}`);
-            const statusData = await statusResponse.json();
-            
-            if (statusResponse.ok) {
-                // Update loading cards with real data as soon as they're available
-                urls.forEach((url, index) => {
-                    const status = statusData[url];
-                    if (status && status.crawled && !processedUrls.has(url)) {
-                        // Get full product data
-                        fetch('/api/products')
-                            .then(response => response.json())
-                            .then(data => {
-                                const product = data.products.find(p => p.url === url);
-                                if (product) {
-                                    updateLoadingCard(product, index);
-                                    processedUrls.add(url);
-                                    console.log(`Updated product: ${product.name}`);
-                                }
-                            })
-                            .catch(error => console.error('Error fetching product data:', error));
+// Start real-time updates (crawl events pushed by the server over SSE)
+function startRealTimeUpdates(urls, lastEventId = 0) {
+    const pending = new Set(urls);
+    const written = new Set();
+    let runId = null;
+    let refreshTimer = null;
+    const source = new EventSource(`/api/crawl-events?lastEventId=${lastEventId || 0}`);
+
+    // One /api/products request per burst of committed writes; they are the most recently updated products
+    const refreshWritten = () => {
+        refreshTimer = null;
+        fetch(`/api/products?sort=updated&limit=${Math.min(200, written.size * 2 + 10)}`)
+            .then(response => response.json())
+            .then(data => {
+                written.forEach(url => {
+                    const product = data.products.find(p => p.url === url);
+                    if (product) {
+                        updateLoadingCard(product, urls.indexOf(url));
+                        written.delete(url);
+                        console.log(`Updated product: ${product.name}`);
                     }
                 });
-                
-                // Check if all URLs have been processed
-                const allProcessed = urls.every(url => processedUrls.has(url));
-                
-                if (allProcessed) {
-                    clearInterval(updateInterval);
-                    console.log('All products processed, stopping real-time updates');
-                    // Final refresh to get all data
-                    setTimeout(() => {
-                        loadProducts();
-                    }, 1000);
-                }
-            }
-        } catch (error) {
-            console.error('Error in real-time update:', error);
+            })
+            .catch(error => console.error('Error fetching product data:', error));
+    };
+
+    const finish = () => {
+        source.close();
+        console.log('All products processed, stopping real-time updates');
+        // Final refresh to get all data
+        setTimeout(() => {
+            loadProducts();
+        }, 1000);
+    };
+
+    source.addEventListener('started', (e) => {
+        const evt = JSON.parse(e.data);
+        if (runId === null) {
+            runId = evt.run_id;
+        }
+    });
+
+    source.addEventListener('written', (e) => {
+        const evt = JSON.parse(e.data);
+        if (!pending.delete(evt.url)) {
+            return;
+        }
+        written.add(evt.url);
+        if (!refreshTimer) {
+            refreshTimer = setTimeout(refreshWritten, 300);
+        }
+    });
+
+    source.addEventListener('failed', (e) => {
+        const evt = JSON.parse(e.data);
+        if (!pending.delete(evt.url)) {
+            return;
         }
-    }, 500); // Check every 500ms for even faster updates
+        markLoadingCardFailed(urls.indexOf(evt.url), evt.error);
+    });
+
+    source.addEventListener('finished', (e) => {
+        const evt = JSON.parse(e.data);
+        if (evt.run_id === runId || pending.size === 0) {
+            finish();
+        }
+    });
+
+    source.onerror = () => {
+        // EventSource reconnects by itself and resumes from the last event id
+        console.error('Crawl event stream interrupted, reconnecting...');
+    };
+}
+
+// Show a crawl failure on its loading card
+function markLoadingCardFailed(index, error) {
+    const loadingCard = document.querySelector(`[data-index="${index}"]`);
+    if (loadingCard) {
+        loadingCard.classList.remove('loading-card');
+        loadingCard.querySelector('.product-title').textContent = 'Failed to crawl product';
+        loadingCard.querySelector('.no-image').innerHTML = '<i class="fas fa-exclamation-circle"></i>';
+        if (error) {
+            loadingCard.title = error;
+        }
+    }
 }
 
 // Update loading card with real data
@@ -0,0 +1,66 @@
+"""
+Amazon product URL canonicalization.
+
+Any product URL (/dp/, /gp/product/, /gp/aw/d/, /product-reviews/, ...,
+with or without a title slug, ref path segments and tracking query strings)
+maps to a (marketplace, ASIN) key, and every key has one canonical URL,
+https://www.<marketplace>/dp/<ASIN>. The crawler deduplicates on the key, so
+each product is fetched once per run whatever variant of its URL was pasted.
+src/utils/amazonUrl.js is the Node counterpart; keep the two in step (both
+are checked against tests/amazon_url_cases.json).
+
+Hosts that are not an Amazon marketplace (test servers, mirrors) use their
+host as the marketplace and keep their scheme and host in the canonical URL.
+"""
+
+import re
+from urllib.parse import urlsplit
+
+MARKETPLACES = (
+    'amazon.com', 'amazon.ca', 'amazon.com.mx', 'amazon.com.br',
+    'amazon.co.uk', 'amazon.de', 'amazon.fr', 'amazon.it', 'amazon.es', 'amazon.nl', 'amazon.se', 'amazon.pl',
+    'amazon.com.be', 'amazon.com.tr', 'amazon.ae', 'amazon.sa', 'amazon.eg',
+    'amazon.in', 'amazon.co.jp', 'amazon.sg', 'amazon.com.au',
+)
+
+ASIN_PATH = re.compile(
+    r'/(?:dp|dp/product|gp/product|gp/aw/d|gp/offer-listing|product-reviews|exec/obidos/asin'
+    r'|exec/obidos/tg/detail/-|o/asin)/([a-z0-9]{10})(?=[/?#;]|$)',
+    re.IGNORECASE,
+)
+
+
+def marketplace(netloc):
+    """Marketplace of a URL host: 'amazon.co.uk' for www.amazon.co.uk, the host itself elsewhere."""
+    netloc = netloc.lower()
+    host = netloc.split('@')[-1].split(':')[0].rstrip('.')
+    for domain in MARKETPLACES:
+        if host == domain or host.endswith('.' + domain):
+            return domain
+    return netloc
+
+
+def canonicalize(url):
+    """(marketplace, ASIN) of a product URL, or None if the URL names no product."""
+    if not url:
+        return None
+    try:
+        parts = urlsplit(url.strip())
+    except ValueError:
+        return None
+    match = ASIN_PATH.search(parts.path)
+    if not match or not parts.netloc:
+        return None
+    return marketplace(parts.netloc), match.group(1).upper()
+
+
+def canonical_url(url):
+    """The canonical URL for `url`'s product, or `url` unchanged when it names no product."""
+    key = canonicalize(url)
+    if key is None:
+        return url
+    market, asin = key
+    if market in MARKETPLACES:
+        return f'https://www.{market}/dp/{asin}'
+    parts = urlsplit(url.strip())
+    return f'{parts.scheme or "https"}://{parts.netloc.lower()}/dp/{asin}'
@@ -0,0 +1,189 @@
+"""
+Streaming bulk import of ASIN lists into `tracked_asins`.
+
+The input is read from a file or stdin one line at a time and is never held
+whole:
+
+- lines: one product URL or bare ASIN per line; blank lines and `#` comments
+  are skipped
+- csv: `asin, marketplace, tags` columns. The header row is optional, the
+  asin column may hold a product URL, an empty marketplace means
+  `default_marketplace`, and tags are separated by `;` or `|` (or `,` inside
+  a quoted field)
+
+Entries are canonicalized to (marketplace, ASIN) exactly like crawl URLs
+(amazon_urls.py) and written with executemany, one transaction per batch.
+Repeats inside a batch are merged in memory; repeats across batches and
+ASINs that are already tracked are merged by the table's unique key. Memory
+therefore depends on the batch size, not on the length of the list. The
+adaptive scheduler (crawl_scheduler.py) picks new rows up on its next tick.
+
+Run through the crawler CLI so the database path matches the server's:
+    python crawl_and_update_fixed.py --import asins.txt
+    python crawl_and_update_fixed.py --import - --import-format csv < asins.csv
+"""
+
+import csv
+import io
+import re
+import sys
+from itertools import chain
+
+from amazon_urls import MARKETPLACES, canonical_url, canonicalize, marketplace
+
+BATCH_SIZE = 20_000
+PROGRESS_EVERY = 100_000
+# Rejected entries reported back, with their line numbers
+REJECTED_SAMPLES = 10
+
+BARE_ASIN = re.compile(r'[A-Za-z0-9]{10}')
+TAG_SEPARATORS = re.compile(r'[;|,]')
+HEADER_NAMES = {'asin': 'asin', 'url': 'asin', 'marketplace': 'marketplace', 'tags': 'tags'}
+
+# Tags accumulate over imports; a repeat that adds no tag writes nothing
+UPSERT = '''
+    INSERT INTO tracked_asins (marketplace, asin, url, tags) VALUES (?, ?, ?, ?)
+    ON CONFLICT(marketplace, asin) DO UPDATE SET
+        tags = merge_tags(tracked_asins.tags, excluded.tags), updated_at = CURRENT_TIMESTAMP
+    WHERE merge_tags(tracked_asins.tags, excluded.tags) IS NOT tracked_asins.tags
+'''
+
+
+def open_source(source):
+    """Text stream for a path, or for stdin when `source` is '-' (a UTF-8 BOM is dropped)."""
+    if source == '-':
+        return io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8-sig', errors='replace', newline='')
+    return open(source, encoding='utf-8-sig', errors='replace', newline='')
+
+
+def parse_tags(*values):
+    """Comma-joined unique tags from the given tag fields, or None."""
+    tags = dict.fromkeys(
+        tag.strip() for value in values if value for tag in TAG_SEPARATORS.split(value) if tag.strip()
+    )
+    return ','.join(tags) or None
+
+
+def parse_entry(value, market=None, default_marketplace='amazon.com'):
+    """(marketplace, ASIN, canonical URL) of a product URL or bare ASIN, or None.
+
+    A URL carries its own marketplace; a bare ASIN takes `market` (any host
+    of a known marketplace, e.g. www.amazon.de) or `default_marketplace`.
+    """
+    value = value.strip()
+    if BARE_ASIN.fullmatch(value):
+        domain = marketplace(market.strip()) if market and market.strip() else default_marketplace
+        if domain not in MARKETPLACES:
+            return None
+        asin = value.upper()
+        return domain, asin, f'https://www.{domain}/dp/{asin}'
+    key = canonicalize(value)
+    if key is None:
+        return None
+    domain, asin = key
+    if domain in MARKETPLACES:
+        return domain, asin, f'https://www.{domain}/dp/{asin}'
+    return domain, asin, canonical_url(value)
+
+
+def iter_rows(stream, fmt='auto'):
+    """(line number, value, marketplace, tags) for each entry of a line or CSV stream.
+
+    With fmt='auto' the first entry decides: it is CSV when its first field is
+    a header or a bare ASIN followed by a comma (a URL may contain commas
+    itself, so CSV with URLs needs a header or fmt='csv').
+    """
+    lines = enumerate(stream, 1)
+    first = None
+    for first in lines:
+        text = first[1].strip()
+        if text and not text.startswith('#'):
+            break
+    else:
+        return
+    lines = chain([first], lines)
+    if fmt == 'auto':
+        head, comma, _ = first[1].strip().partition(',')
+        head = head.strip().strip('"').strip()
+        fmt = 'csv' if comma and (head.lower() in HEADER_NAMES or BARE_ASIN.fullmatch(head)) else 'lines'
+
+    if fmt == 'lines':
+        for line_no, line in lines:
+            text = line.strip()
+            if text and not text.startswith('#'):
+                yield line_no, text, None, None
+        return
+
+    # csv.reader pulls one line at a time from the generator; numbers follow the source lines
+    reader = csv.reader(line for _, line in lines)
+    offset = first[0] - 1
+    columns = ('asin', 'marketplace', 'tags')
+    for row in reader:
+        if not any(field.strip() for field in row) or row[0].lstrip().startswith('#'):
+            continue
+        if reader.line_num == 1 and row[0].strip().lower() in HEADER_NAMES:
+            columns = tuple(HEADER_NAMES.get(name.strip().lower()) for name in row)
+            continue
+        fields = dict(zip(columns, row))
+        yield reader.line_num + offset, fields.get('asin') or '', fields.get('marketplace'), fields.get('tags')
+
+
+def import_asins(db_manager, stream, fmt='auto', default_marketplace='amazon.com', tags=None,
+                 batch_size=BATCH_SIZE, cache_mb=32, log=None):
+    """Import every entry of `stream` into tracked_asins. Returns a summary dict.
+
+    `tags` are added to every entry. `log` (a callable) gets a progress line
+    every PROGRESS_EVERY entries. The connection's page cache is raised to
+    `cache_mb` while importing, so large lists keep their index pages cached;
+    memory is bounded by that and the batch size.
+    """
+    db_manager.connect()
+    db_manager.conn.create_function('merge_tags', 2, parse_tags, deterministic=True)
+    cursor = db_manager.cursor
+    cursor.execute('PRAGMA cache_size')
+    cache_size = cursor.fetchone()[0]
+    cursor.execute(f'PRAGMA cache_size=-{int(cache_mb) * 1024}')
+    try:
+        return _import_asins(db_manager, cursor, stream, fmt, default_marketplace, tags, batch_size, log)
+    finally:
+        cursor.execute(f'PRAGMA cache_size={int(cache_size)}')
+
+
+def _import_asins(db_manager, cursor, stream, fmt, default_marketplace, tags, batch_size, log):
+    cursor.execute('SELECT COUNT(*) FROM tracked_asins')
+    tracked_before = cursor.fetchone()[0]
+    default_marketplace = marketplace(default_marketplace)
+    summary = {'read': 0, 'imported': 0, 'duplicates': 0, 'rejected': 0, 'tracked': tracked_before,
+               'rejected_samples': []}
+    batch = {}
+
+    def flush():
+        if batch:
+            # In key order, so each batch walks the unique index once instead of jumping around it
+            rows = sorted((mp, asin, url, entry_tags) for (mp, asin), (url, entry_tags) in batch.items())
+            with db_manager.conn:
+                cursor.executemany(UPSERT, rows)
+            batch.clear()
+
+    for line_no, value, market, entry_tags in iter_rows(stream, fmt):
+        summary['read'] += 1
+        entry = parse_entry(value, market, default_marketplace)
+        if entry is None:
+            summary['rejected'] += 1
+            if len(summary['rejected_samples']) < REJECTED_SAMPLES:
+                summary['rejected_samples'].append({'line': line_no, 'value': value[:200]})
+            continue
+        mp, asin, url = entry
+        previous = batch.get((mp, asin))
+        batch[(mp, asin)] = (url, parse_tags(previous and previous[1], entry_tags, tags))
+        if len(batch) >= batch_size:
+            flush()
+        if log and summary['read'] % PROGRESS_EVERY == 0:
+            log(f"Import: {summary['read']:,} read, {summary['rejected']:,} rejected")
+    flush()
+
+    cursor.execute('SELECT COUNT(*) FROM tracked_asins')
+    summary['tracked'] = cursor.fetchone()[0]
+    summary['imported'] = summary['tracked'] - tracked_before
+    summary['duplicates'] = summary['read'] - summary['rejected'] - summary['imported']
+    return summary
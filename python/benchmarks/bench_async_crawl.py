@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Throughput benchmark for the async crawl engine.
+
+Serves synthetic product pages from a local stub HTTP server (with a fixed
+artificial latency) and crawls them with CRAWL_ENGINE=async at several
+concurrency levels. Results are written to a temporary SQLite database.
+
+Usage:
+    python python/benchmarks/bench_async_crawl.py --urls 200 --latency-ms 50
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+PRODUCT_PAGE = """<html><head><title>Stub product</title></head><body>
+<span id="productTitle">Stub Product {asin}</span>
+<a id="bylineInfo">Visit the Stub Store</a>
+<span class="a-price"><span class="a-offscreen">$19.99</span></span>
+<span id="acrCustomerReviewText">1,234 ratings</span>
+<span class="a-icon-alt">4.5 out of 5 stars</span>
+<div id="imgTagWrapperId"><img src="https://example.invalid/{asin}.jpg"></div>
+<div id="detailBulletsWrapper_feature_div"><ul>
+<li><span>Best Sellers Rank: #{rank} in Stub Goods</span></li>
+<li><span>Date First Available : January 1, 2024</span></li>
+</ul></div>
+</body></html>"""
+
+
+def make_handler(latency_s):
+    class StubHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(latency_s)
+            asin = self.path.rstrip('/').split('/')[-1]
+            body = PRODUCT_PAGE.format(asin=asin, rank=sum(map(ord, asin))).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return StubHandler
+
+
+def run_once(urls, concurrency, db_path):
+    os.environ.update({
+        'DB_PATH': db_path,
+        'CRAWL_ENGINE': 'async',
+        'CRAWL_CONCURRENCY': str(concurrency),
+        'CRAWL_PER_HOST': str(concurrency),
+        'CRAWL_DELAY_MS': '0',
+        'REQUESTS_ATTEMPTS': '1',
+        'MAX_URL_RETRIES': '0',
+    })
+    from crawl_and_update_fixed import AmazonProductCrawler
+
+    crawler = AmazonProductCrawler()
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        crawler.crawl_urls(urls)
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--urls', type=int, default=200, help='number of distinct product URLs')
+    parser.add_argument('--latency-ms', type=int, default=50, help='stub server response latency')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32, 64])
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), make_handler(args.latency_ms / 1000.0))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+
+    print(f"{'concurrency':>11} {'seconds':>9} {'urls/sec':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for concurrency in args.concurrency:
+            urls = [f"{base}/dp/B{concurrency:03d}{n:06d}" for n in range(args.urls)]
+            elapsed = run_once(urls, concurrency, os.path.join(tmp, f"bench_{concurrency}.db"))
+            print(f"{concurrency:>11} {elapsed:>9.2f} {len(urls) / elapsed:>9.1f}")
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Dashboard query benchmark: the full product listing before and after product_trends.
+
+Builds `--products` products with `--points` rank history points each, then
+times the previous dashboard query (latest and previous rank found with
+correlated rank_history subqueries, per-row GROUP_CONCAT) against the current
+one (a join with product_trends in index order), each returning every
+product the way the unpaginated /api/products did. The rows they return are
+compared so the switch cannot change what the dashboard shows. Also reports the crawler write rate with the
+trend row maintained in the same transaction.
+
+Usage:
+    python python/benchmarks/bench_dashboard.py --products 50000 --points 20
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from db_utils import DatabaseManager  # noqa: E402
+
+LAST_UPDATE = """
+    CASE
+        WHEN p.updated_at IS NOT NULL
+        THEN CASE
+            WHEN julianday('now') - julianday(p.updated_at) < 1/24 THEN
+                CAST(ROUND((julianday('now') - julianday(p.updated_at)) * 24 * 60) AS INTEGER) || ' minutes ago'
+            WHEN julianday('now') - julianday(p.updated_at) < 1 THEN
+                CAST(ROUND((julianday('now') - julianday(p.updated_at)) * 24) AS INTEGER) || ' hours ago'
+            ELSE
+                CAST(ROUND(julianday('now') - julianday(p.updated_at)) AS INTEGER) || ' days ago'
+        END
+        ELSE 'Never updated'
+    END as last_update"""
+
+PREVIOUS_QUERY = f"""
+    SELECT p.*, {LAST_UPDATE},
+        CASE WHEN rh1.rank IS NOT NULL AND rh2.rank IS NOT NULL
+             THEN ROUND(((rh2.rank - rh1.rank) / rh1.rank) * 100, 2) ELSE NULL END as rank_change_percent,
+        CASE WHEN rh1.rank IS NOT NULL AND rh2.rank IS NOT NULL
+             THEN CASE WHEN rh1.rank < rh2.rank THEN 'up' WHEN rh1.rank > rh2.rank THEN 'down' ELSE 'stable' END
+             ELSE 'new' END as rank_trend,
+        (SELECT GROUP_CONCAT(rank) FROM (
+            SELECT rank FROM rank_history rh WHERE rh.asin = p.asin ORDER BY recorded_at DESC LIMIT 5)
+        ) as rank_history
+    FROM products p
+    LEFT JOIN (
+        SELECT asin, rank, recorded_at FROM rank_history
+        WHERE recorded_at = (SELECT MAX(recorded_at) FROM rank_history rh2 WHERE rh2.asin = rank_history.asin)
+    ) rh1 ON p.asin = rh1.asin
+    LEFT JOIN (
+        SELECT asin, rank, recorded_at FROM rank_history
+        WHERE recorded_at = (SELECT recorded_at FROM rank_history rh3 WHERE rh3.asin = rank_history.asin
+                             ORDER BY recorded_at DESC LIMIT 1 OFFSET 1)
+    ) rh2 ON p.asin = rh2.asin
+    ORDER BY p.rank ASC, p.name ASC"""
+
+CURRENT_QUERY = f"""
+    SELECT p.*, {LAST_UPDATE},
+        t.rank_change_percent,
+        COALESCE(t.rank_trend, 'new') as rank_trend,
+        t.rank_history
+    FROM products p
+    LEFT JOIN product_trends t ON t.marketplace = p.marketplace AND t.asin = p.asin
+    ORDER BY p.rank ASC, p.name ASC"""
+
+
+def fill(manager, products, points, days):
+    """Products with `points` history points each (one point per rank change, as the crawler writes them)."""
+    rng = random.Random(1)
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    step = timedelta(days=days) / max(1, points)
+    product_rows, history_rows = [], []
+    for n in range(products):
+        asin = f"B{n:09d}"
+        rank = rng.randrange(1, 500_000)
+        for k in range(points):
+            rank = max(1, rank + rng.randrange(-rank // 4 - 1, rank // 4 + 2))
+            recorded_at = (now - step * (points - k)).strftime('%Y-%m-%d %H:%M:%S')
+            history_rows.append((asin, rank, 19.99, recorded_at))
+        product_rows.append((f"Product {asin}", 19.99, rank, asin, 'Bench', '1', '4.5', 'Not found',
+                             'January 1, 2024', f"https://www.amazon.com/dp/{asin}"))
+    with manager.conn:
+        manager.cursor.executemany(
+            '''INSERT INTO products (name, price, rank, asin, brand, ratings, stars, image_url, date, url)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''', product_rows)
+        manager.cursor.executemany(
+            'INSERT INTO rank_history (asin, rank, price, recorded_at) VALUES (?, ?, ?, ?)', history_rows)
+
+
+def time_query(conn, sql, repeats):
+    timings = []
+    rows = None
+    for _ in range(repeats):
+        started = time.perf_counter()
+        rows = conn.execute(sql).fetchall()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings), max(timings), rows
+
+
+def crawler_writes(manager, products, writes, batch_size):
+    """Products/second through queue_product_write, each write moving the rank (history + trend row)."""
+    manager.batch_size = batch_size
+    rng = random.Random(2)
+    started = time.perf_counter()
+    for _ in range(writes):
+        asin = f"B{rng.randrange(products):09d}"
+        manager.queue_product_write({
+            'asin': asin, 'title': f"Product {asin}", 'price': '19.99', 'rank': str(rng.randrange(1, 500_000)),
+            'brand': 'Bench', 'ratings': '1', 'stars': '4.5', 'image_url': 'Not found',
+            'date': 'January 1, 2024', 'url': f"https://www.amazon.com/dp/{asin}",
+        })
+    manager.flush()
+    return writes / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--products', type=int, default=50_000)
+    parser.add_argument('--points', type=int, default=20, help='history points per product')
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--writes', type=int, default=5000, help='products written through the crawler path')
+    parser.add_argument('--batch-size', type=int, default=50)
+    parser.add_argument('--db', default=None, help='database file (default: a temporary file)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.db or os.path.join(tmp, 'dashboard.db')
+        manager = DatabaseManager(path, flush_interval=3600)
+        manager.init_tables()
+        print(f"Loading {args.products:,} products x {args.points} history points")
+        fill(manager, args.products, args.points, args.days)
+        started = time.perf_counter()
+        manager.rebuild_product_trends()
+        rebuild_s = time.perf_counter() - started
+        manager.conn.execute('ANALYZE')
+
+        print()
+        print(f"{'dashboard query':<36} {'median ms':>10} {'max ms':>10} {'rows':>7}")
+        results = {}
+        for label, sql in (('current (product_trends)', CURRENT_QUERY),
+                           ('previous (correlated subqueries)', PREVIOUS_QUERY)):
+            median, worst, rows = time_query(manager.conn, sql, args.repeats)
+            results[label] = rows
+            print(f"{label:<36} {median:>10.1f} {worst:>10.1f} {len(rows):>7}")
+
+        # Same products, order, trend and history; the change % is no longer truncated by integer division
+        current, previous = results.values()
+        trend_at = len(current[0]) - 3
+        same = all(c[:trend_at] == p[:trend_at] and c[trend_at + 1:] == p[trend_at + 1:]
+                   for c, p in zip(current, previous)) and len(current) == len(previous)
+        print(f"rows identical apart from rank_change_percent: {same}")
+
+        write_rate = crawler_writes(manager, args.products, args.writes, args.batch_size)
+        print()
+        print(f"product_trends rebuild from history: {rebuild_s:.2f}s")
+        print(f"queue_product_write with trend upkeep, batch={args.batch_size}: {write_rate:,.0f} products/s")
+        manager.close()
+
+
+if __name__ == '__main__':
+    main()
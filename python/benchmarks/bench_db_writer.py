@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Write-throughput benchmark for DatabaseManager.
+
+Compares the legacy pattern (a new sqlite3 connection and commit for each of
+lookup, upsert, history insert and history trim) against the persistent
+connection with batched transactions.
+
+Usage:
+    python python/benchmarks/bench_db_writer.py --products 10000 --batch-size 50
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from db_utils import DatabaseManager  # noqa: E402
+
+
+def make_product(n, round_no):
+    return {
+        'asin': f"B{n:09d}",
+        'title': f"Benchmark product {n}",
+        'price': '19.99',
+        'rank': str(1000 + n + round_no),
+        'brand': 'Bench',
+        'ratings': '123',
+        'stars': '4.5',
+        'image_url': f"https://example.invalid/{n}.jpg",
+        'date': 'January 1, 2024',
+        'url': f"https://www.amazon.com/dp/B{n:09d}",
+    }
+
+
+def legacy_write(db_path, product):
+    """Per-call connections, as DatabaseManager behaved before batching."""
+    def run(sql, params):
+        conn = sqlite3.connect(db_path)
+        cur = conn.execute(sql, params)
+        row = cur.fetchone()
+        conn.commit()
+        conn.close()
+        return row
+
+    existing = run('SELECT id, rank FROM products WHERE asin = ?', (product['asin'],))
+    if existing:
+        run('UPDATE products SET name=?, price=?, rank=?, updated_at=CURRENT_TIMESTAMP WHERE asin=?',
+            (product['title'], product['price'], product['rank'], product['asin']))
+        run('INSERT INTO rank_history (asin, rank, price) VALUES (?, ?, ?)',
+            (product['asin'], int(product['rank']), float(product['price'])))
+        run('''DELETE FROM rank_history WHERE asin = ? AND id NOT IN (
+                   SELECT id FROM rank_history WHERE asin = ? ORDER BY recorded_at DESC LIMIT 5)''',
+            (product['asin'], product['asin']))
+    else:
+        run('INSERT INTO products (name, price, rank, asin, url) VALUES (?, ?, ?, ?, ?)',
+            (product['title'], product['price'], product['rank'], product['asin'], product['url']))
+        run('INSERT INTO rank_history (asin, rank, price) VALUES (?, ?, ?)',
+            (product['asin'], int(product['rank']), float(product['price'])))
+
+
+def bench(label, products, write):
+    started = time.perf_counter()
+    for product in products:
+        write(product)
+    elapsed = time.perf_counter() - started
+    print(f"{label:<28} {len(products):>7} {elapsed:>9.2f} {len(products) / elapsed:>12.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--products', type=int, default=10000)
+    parser.add_argument('--batch-size', type=int, default=50)
+    args = parser.parse_args()
+
+    # Each run inserts every product once and then updates it once
+    workload = [make_product(n, r) for r in range(2) for n in range(args.products // 2)]
+
+    print(f"{'mode':<28} {'writes':>7} {'seconds':>9} {'products/sec':>12}")
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_path = os.path.join(tmp, 'legacy.db')
+        schema = DatabaseManager(legacy_path)
+        schema.init_tables()
+        schema.close()
+        # Legacy runs used the default rollback journal
+        conn = sqlite3.connect(legacy_path)
+        conn.execute('PRAGMA journal_mode=DELETE')
+        conn.close()
+        bench('per-call connections', workload, lambda p: legacy_write(legacy_path, p))
+
+        for batch_size in (1, args.batch_size):
+            manager = DatabaseManager(os.path.join(tmp, f"batched_{batch_size}.db"), batch_size=batch_size, flush_interval=60)
+            manager.init_tables()
+            bench(f"persistent, batch={batch_size}", workload, manager.queue_product_write)
+            manager.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Bulk import benchmark: peak memory and rate of the streaming ASIN import.
+
+For each list size in `--sizes`, writes a list of product URL variants and
+bare ASINs (with `--dup-rate` repeats and a few junk lines) to a temporary
+file, then imports it in a fresh process with the crawler's
+`--import` path and reports rows/second and the process's peak RSS. The same
+list is also loaded the old way (one JSON array, json.loads, one url_lists
+blob) for comparison. Streaming peak RSS should stay flat as the list grows.
+
+Usage:
+    python python/benchmarks/bench_import.py --sizes 100000,1000000
+"""
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+PYTHON_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+STREAMING = '''
+import resource, sys
+from asin_import import import_asins, open_source
+from db_utils import DatabaseManager
+manager = DatabaseManager(sys.argv[2])
+manager.init_tables()
+with open_source(sys.argv[1]) as stream:
+    summary = import_asins(manager, stream)
+summary.pop('rejected_samples')
+print(summary, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+'''
+
+# The previous path: the whole list as one JSON array, parsed and stored as a url_lists blob
+JSON_BLOB = '''
+import json, resource, sys
+from db_utils import DatabaseManager
+manager = DatabaseManager(sys.argv[2])
+manager.init_tables()
+with open(sys.argv[1], encoding='utf-8') as f:
+    urls = json.loads(f.read())
+with manager.conn:
+    manager.cursor.execute('INSERT INTO url_lists (urls) VALUES (?)', (json.dumps(urls),))
+print({'read': len(urls)}, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+'''
+
+VARIANTS = (
+    '{asin}',
+    'https://www.amazon.com/Some-Product-Title/dp/{asin}/ref=sr_1_3?keywords=usb,cable&qid=1',
+    'https://www.amazon.de/gp/product/{asin}?th=1',
+    'https://amazon.com/dp/{asin}',
+)
+
+
+def write_list(path, size, dup_rate):
+    rng = random.Random(size)
+    seen = []
+    with open(path, 'w', encoding='utf-8') as f:
+        for n in range(size):
+            if seen and rng.random() < dup_rate:
+                asin = rng.choice(seen)
+            else:
+                asin = f'B{rng.randrange(10 ** 9):09d}'
+                if len(seen) < 10_000:
+                    seen.append(asin)
+            line = 'not a product URL' if n % 5000 == 4999 else rng.choice(VARIANTS).format(asin=asin)
+            f.write(line + '\n')
+
+
+def run(code, source, db):
+    started = time.perf_counter()
+    out = subprocess.run([sys.executable, '-c', code, source, db], cwd=PYTHON_DIR, capture_output=True,
+                         text=True, check=True).stdout.strip()
+    elapsed = time.perf_counter() - started
+    summary, rss_kb = out.rsplit(' ', 1)
+    return elapsed, int(rss_kb) / 1024, summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='100000,1000000', help='comma-separated list sizes')
+    parser.add_argument('--dup-rate', type=float, default=0.05, help='share of entries repeating an earlier ASIN')
+    parser.add_argument('--skip-json', action='store_true', help='do not run the JSON array comparison')
+    args = parser.parse_args()
+
+    print(f"{'entries':>10} {'path':<22} {'seconds':>8} {'rows/s':>10} {'peak RSS MB':>12}  summary")
+    for size in [int(s) for s in args.sizes.split(',')]:
+        with tempfile.TemporaryDirectory() as tmp:
+            lines = os.path.join(tmp, 'asins.txt')
+            write_list(lines, size, args.dup_rate)
+            elapsed, rss, summary = run(STREAMING, lines, os.path.join(tmp, 'stream.db'))
+            print(f"{size:>10,} {'streaming import':<22} {elapsed:>8.1f} {size / elapsed:>10,.0f} {rss:>12.1f}  {summary}")
+            if args.skip_json:
+                continue
+            array = os.path.join(tmp, 'asins.json')
+            with open(lines, encoding='utf-8') as src, open(array, 'w', encoding='utf-8') as dst:
+                json.dump([line.rstrip('\n') for line in src], dst)
+            elapsed, rss, summary = run(JSON_BLOB, array, os.path.join(tmp, 'blob.db'))
+            print(f"{size:>10,} {'JSON array + blob':<22} {elapsed:>8.1f} {size / elapsed:>10,.0f} {rss:>12.1f}  {summary}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Parse benchmark for product_parser backends.
+
+Parses every .html page in a corpus directory with each installed backend and
+reports ms/page and peak RSS. Each backend runs in its own subprocess so the
+RSS figures do not leak into each other. `html.parser-full` is the previous
+behaviour (a full BeautifulSoup tree) for comparison.
+
+Usage:
+    python python/benchmarks/bench_parse.py --corpus python/benchmarks/fixtures --pad-kb 1500
+"""
+
+import argparse
+import glob
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import product_parser  # noqa: E402
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+FILLER = '<div class="a-section filler"><span class="a-size-base">Customers also viewed</span><a href="/dp/B000000000">x</a></div>\n'
+
+
+def load_corpus(corpus, pad_kb):
+    pages = []
+    for path in sorted(glob.glob(os.path.join(corpus, '*.html'))):
+        with open(path, encoding='utf-8') as f:
+            html = f.read()
+        if pad_kb:
+            # Real product pages are 1-2 MB, mostly markup outside the regions we read
+            filler = FILLER * (pad_kb * 1024 // len(FILLER))
+            html = html.replace('</body>', filler + '</body>')
+        pages.append(html)
+    return pages
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def run_backend(backend, corpus, pad_kb, rounds):
+    pages = load_corpus(corpus, pad_kb)
+    baseline_rss = peak_rss_mb()
+    url = 'https://www.amazon.com/dp/B000BENCH0'
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for html in pages:
+            if backend == 'html.parser-full':
+                doc = product_parser._SoupDocument(html, strain=False)
+                [doc.first(key) for key in product_parser.SELECTORS]
+            else:
+                product_parser.parse_product_page(html, url, backend)
+    elapsed = time.perf_counter() - started
+    count = rounds * len(pages)
+    return {
+        'backend': backend,
+        'pages': count,
+        'ms_per_page': round(elapsed * 1000 / count, 3) if count else None,
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+        'rss_over_baseline_mb': round(peak_rss_mb() - baseline_rss, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--corpus', default=DEFAULT_CORPUS, help='directory of saved product pages (*.html)')
+    parser.add_argument('--pad-kb', type=int, default=0, help='append this much filler markup to each page')
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--backend', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.backend:
+        print(json.dumps(run_backend(args.backend, args.corpus, args.pad_kb, args.rounds)))
+        return
+
+    backends = ['html.parser-full'] + list(product_parser.BACKENDS)
+    print(f"{'backend':<18} {'pages':>6} {'ms/page':>9} {'peak RSS MB':>12} {'RSS delta MB':>13}")
+    for backend in backends:
+        out = subprocess.run(
+            [sys.executable, __file__, '--backend', backend, '--corpus', args.corpus,
+             '--pad-kb', str(args.pad_kb), '--rounds', str(args.rounds)],
+            capture_output=True, text=True, check=True,
+        ).stdout
+        r = json.loads(out.strip().splitlines()[-1])
+        print(f"{r['backend']:<18} {r['pages']:>6} {r['ms_per_page']:>9} {r['peak_rss_mb']:>12} {r['rss_over_baseline_mb']:>13}")
+
+
+if __name__ == '__main__':
+    main()
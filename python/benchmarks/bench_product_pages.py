@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Product listing benchmark: keyset pages as the catalogue grows.
+
+For each catalogue size in `--sizes`, builds products with a few rank history
+points each (product_trends maintained by the crawler write path's helpers),
+then walks `--pages` pages of every listing the API serves with the SQL the
+Node model (Product.listProducts) sends: each sort order, plus the rank
+range, brand, trending and updated-since filters. Reports p50/p95 latency
+per page and the JSON payload size, which should not depend on the catalogue
+size. Also prints the query plans so a missing index shows up as a SCAN plus
+a temp B-tree sort.
+
+Usage:
+    python python/benchmarks/bench_product_pages.py --sizes 10000,50000,200000
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from db_utils import DatabaseManager  # noqa: E402
+
+TRENDING_PERCENT = 10
+
+# Same keys, directions and NULL handling as PRODUCT_SORTS in src/models/Product.js
+SORTS = {
+    'rank': {'keys': ['p.rank', 'p.name', 'p.id'], 'direction': 'ASC', 'nullable': True},
+    'name': {'keys': ['p.name', 'p.id'], 'direction': 'ASC'},
+    'updated': {'keys': ['p.updated_at', 'p.id'], 'direction': 'DESC'},
+    'change': {'keys': ['t.rank_change_percent', 't.marketplace', 't.asin'], 'direction': 'DESC',
+               'where': 't.rank_change_percent IS NOT NULL'},
+}
+
+SELECT = """
+    SELECT p.*,
+        CASE WHEN p.updated_at IS NOT NULL
+        THEN CASE
+            WHEN julianday('now') - julianday(p.updated_at) < 1/24 THEN
+                CAST(ROUND((julianday('now') - julianday(p.updated_at)) * 24 * 60) AS INTEGER) || ' minutes ago'
+            WHEN julianday('now') - julianday(p.updated_at) < 1 THEN
+                CAST(ROUND((julianday('now') - julianday(p.updated_at)) * 24) AS INTEGER) || ' hours ago'
+            ELSE CAST(ROUND(julianday('now') - julianday(p.updated_at)) AS INTEGER) || ' days ago'
+        END ELSE 'Never updated' END as last_update,
+        t.rank_change_percent, COALESCE(t.rank_trend, 'new') as rank_trend, t.rank_history
+    FROM products p
+    LEFT JOIN product_trends t ON t.marketplace = p.marketplace AND t.asin = p.asin"""
+
+
+def page_sql(keys, direction, filters, after):
+    where = list(filters)
+    if after:
+        comparator = '>' if direction == 'ASC' else '<'
+        where.append(f"({', '.join(keys)}) {comparator} ({', '.join('?' for _ in keys)})")
+    order = ', '.join(f'{key} {direction}' for key in keys)
+    return f"{SELECT} {'WHERE ' + ' AND '.join(where) if where else ''} ORDER BY {order} LIMIT ?"
+
+
+def list_products(conn, sort, limit, after=None, filters=(), params=()):
+    """Port of Product.listProducts: returns (rows, next key values or None)."""
+    spec = SORTS[sort]
+    filters = list(filters) + ([spec['where']] if spec.get('where') else [])
+
+    def run(keys, extra, after_values, count):
+        sql = page_sql(keys, spec['direction'], filters + extra, after_values)
+        return conn.execute(sql, [*params, *(after_values or []), count]).fetchall()
+
+    if not spec.get('nullable'):
+        rows = run(spec['keys'], [], after, limit + 1)
+    else:
+        first, rest = spec['keys'][0], spec['keys'][1:]
+        rows = []
+        if not after or after[0] is not None:
+            rows = run(spec['keys'], [f'{first} IS NOT NULL'], after, limit + 1)
+        if len(rows) <= limit:
+            rows += run(rest, [f'{first} IS NULL'], after[1:] if after and after[0] is None else None,
+                        limit + 1 - len(rows))
+    page = rows[:limit]
+    fields = [key.split('.')[1] for key in spec['keys']]
+    next_after = [page[-1][field] for field in fields] if len(rows) > limit else None
+    return page, next_after
+
+
+def fill(manager, products, points):
+    rng = random.Random(1)
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    brands = [f'Brand {n}' for n in range(max(1, products // 100))]
+    product_rows, history_rows = [], []
+    for n in range(products):
+        asin = f"B{n:09d}"
+        rank = rng.randrange(1, 500_000) if rng.random() > 0.05 else None
+        updated = (now - timedelta(minutes=rng.randrange(60 * 24 * 30))).strftime('%Y-%m-%d %H:%M:%S')
+        product_rows.append((f"Product {rng.randrange(products):08d}", 19.99, rank, asin, rng.choice(brands), '1',
+                             '4.5', 'Not found', 'January 1, 2024', f"https://www.amazon.com/dp/{asin}", updated))
+        if rank is not None:
+            r = rank
+            for k in range(points):
+                recorded_at = (now - timedelta(hours=points - k)).strftime('%Y-%m-%d %H:%M:%S')
+                history_rows.append((asin, r, 19.99, recorded_at))
+                r = max(1, r + rng.randrange(-r // 3 - 1, r // 3 + 2))
+    with manager.conn:
+        manager.cursor.executemany(
+            '''INSERT INTO products (name, price, rank, asin, brand, ratings, stars, image_url, date, url, updated_at)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''', product_rows)
+        manager.cursor.executemany(
+            'INSERT INTO rank_history (asin, rank, price, recorded_at) VALUES (?, ?, ?, ?)', history_rows)
+    manager.rebuild_product_trends()
+    manager.conn.execute('ANALYZE')
+    return brands
+
+
+def listings(brands, now):
+    since = (now - timedelta(days=1)).strftime('%Y-%m-%d %H:%M:%S')
+    return [
+        ('rank', 'rank', [], []),
+        ('name', 'name', [], []),
+        ('updated', 'updated', [], []),
+        ('change (trending tab)', 'change', ['t.rank_change_percent > ?'], [TRENDING_PERCENT]),
+        ('rank 1000-5000', 'rank', ['p.rank >= ?', 'p.rank <= ?'], [1000, 5000]),
+        ('brand', 'rank', ['p.brand = ?'], [brands[len(brands) // 2]]),
+        ('rank, trending only', 'rank', ['t.rank_change_percent > ?'], [TRENDING_PERCENT]),
+        ('updated since 1 day', 'updated', ['p.updated_at >= ?'], [since]),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='10000,50000,200000', help='comma-separated catalogue sizes')
+    parser.add_argument('--points', type=int, default=5, help='rank history points per product')
+    parser.add_argument('--limit', type=int, default=50, help='products per page')
+    parser.add_argument('--pages', type=int, default=40, help='pages walked per listing')
+    parser.add_argument('--plans', action='store_true', help='print the query plan of each listing')
+    args = parser.parse_args()
+
+    print(f"{'catalogue':>10} {'listing':<24} {'p50 ms':>8} {'p95 ms':>8} {'page KB':>8} {'pages':>6}")
+    for size in [int(s) for s in args.sizes.split(',')]:
+        with tempfile.TemporaryDirectory() as tmp:
+            manager = DatabaseManager(os.path.join(tmp, 'pages.db'), flush_interval=3600)
+            manager.init_tables()
+            brands = fill(manager, size, args.points)
+            manager.conn.row_factory = sqlite3.Row
+            now = datetime.now(timezone.utc).replace(tzinfo=None)
+            for label, sort, filters, params in listings(brands, now):
+                if args.plans:
+                    spec = SORTS[sort]
+                    sql = page_sql(spec['keys'], spec['direction'], filters, spec['keys'])
+                    plan = manager.conn.execute('EXPLAIN QUERY PLAN ' + sql,
+                                                [*params, *[0] * len(spec['keys']), args.limit]).fetchall()
+                    print(f"{'':>10} {label}: " + ' / '.join(row[3] for row in plan))
+                timings, sizes = [], []
+                after = None
+                for _ in range(args.pages):
+                    started = time.perf_counter()
+                    rows, after = list_products(manager.conn, sort, args.limit, after, filters, params)
+                    body = json.dumps({'products': [dict(row) for row in rows], 'next_cursor': after})
+                    timings.append((time.perf_counter() - started) * 1000)
+                    sizes.append(len(body))
+                    if after is None:
+                        break
+                timings.sort()
+                p95 = timings[math.ceil(len(timings) * 0.95) - 1]
+                print(f"{size:>10,} {label:<24} {statistics.median(timings):>8.2f} {p95:>8.2f} "
+                      f"{statistics.mean(sizes) / 1024:>8.1f} {len(timings):>6}")
+            manager.close()
+
+
+if __name__ == '__main__':
+    main()
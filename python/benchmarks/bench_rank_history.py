@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Rank history benchmark: insert rate, per-ASIN range queries and compaction.
+
+Fills rank_history with `--rows` points spread over `--asins` ASINs and the
+last `--days` days (in time order, as the crawler appends them), then
+measures:
+
+- bulk insert rate with the covering (asin, recorded_at) index maintained
+- the crawler write path (queue_product_write, batched) on the full table
+- 30-day and full-range queries for random ASINs, through the index and
+  with a full scan (`NOT INDEXED`, the layout without the index)
+- compact_rank_history with the default retention, then full-range
+  queries across the raw / hourly / daily tiers (rank_series)
+
+Usage:
+    python python/benchmarks/bench_rank_history.py --rows 10000000 --asins 10000
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from db_utils import DatabaseManager  # noqa: E402
+
+CHUNK = 100_000
+
+
+def fill(manager, rows, asins, days):
+    """Append `rows` history points in time order. Returns rows/second."""
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    start = now - timedelta(days=days)
+    step = (now - start) / rows
+    rng = random.Random(1)
+    started = time.perf_counter()
+    for offset in range(0, rows, CHUNK):
+        batch = []
+        for n in range(offset, min(rows, offset + CHUNK)):
+            asin = f"B{rng.randrange(asins):09d}"
+            recorded_at = (start + step * n).strftime('%Y-%m-%d %H:%M:%S')
+            batch.append((asin, rng.randrange(1, 500_000), round(rng.uniform(5, 100), 2), recorded_at))
+        with manager.conn:
+            manager.cursor.executemany(
+                'INSERT INTO rank_history (asin, rank, price, recorded_at) VALUES (?, ?, ?, ?)', batch)
+        done = min(rows, offset + CHUNK)
+        if done % (CHUNK * 10) == 0 or done == rows:
+            print(f"  {done:>11,} rows  {done / (time.perf_counter() - started):>10,.0f} rows/s", flush=True)
+    return rows / (time.perf_counter() - started)
+
+
+def crawler_writes(manager, asins, writes, batch_size):
+    """Products/second through queue_product_write (upsert + history point) on the full table."""
+    manager.batch_size = batch_size
+    rng = random.Random(2)
+    started = time.perf_counter()
+    for n in range(writes):
+        asin = f"B{rng.randrange(asins):09d}"
+        manager.queue_product_write({
+            'asin': asin, 'title': f"Product {asin}", 'price': '19.99', 'rank': str(rng.randrange(1, 500_000)),
+            'brand': 'Bench', 'ratings': '1', 'stars': '4.5', 'image_url': 'Not found',
+            'date': 'January 1, 2024', 'url': f"https://www.amazon.com/dp/{asin}",
+        })
+    manager.flush()
+    return writes / (time.perf_counter() - started)
+
+
+def time_queries(run, asins, count):
+    rng = random.Random(3)
+    timings = []
+    for _ in range(count):
+        asin = f"B{rng.randrange(asins):09d}"
+        started = time.perf_counter()
+        rows = run(asin)
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return statistics.median(timings), timings[int(len(timings) * 0.95) - 1 if len(timings) > 1 else 0], len(rows)
+
+
+def raw_range(manager, since, indexed=True):
+    hint = '' if indexed else 'NOT INDEXED'
+    sql = f'''SELECT recorded_at, rank, price FROM rank_history {hint}
+              WHERE marketplace = 'amazon.com' AND asin = ? AND recorded_at >= ? ORDER BY recorded_at'''
+    return lambda asin: manager.conn.execute(sql, (asin, since)).fetchall()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=10_000_000)
+    parser.add_argument('--asins', type=int, default=10_000)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--queries', type=int, default=200, help='indexed queries per measurement')
+    parser.add_argument('--scan-queries', type=int, default=3, help='full-scan queries per measurement')
+    parser.add_argument('--writes', type=int, default=5000, help='products written through the crawler path')
+    parser.add_argument('--batch-size', type=int, default=50)
+    parser.add_argument('--db', default=None, help='database file (default: a temporary file)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.db or os.path.join(tmp, 'history.db')
+        manager = DatabaseManager(path, flush_interval=3600)
+        manager.init_tables()
+
+        print(f"Loading {args.rows:,} history rows for {args.asins:,} ASINs over {args.days} days")
+        load_rate = fill(manager, args.rows, args.asins, args.days)
+        write_rate = crawler_writes(manager, args.asins, args.writes, args.batch_size)
+        manager.conn.execute('ANALYZE')
+
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        month = (now - timedelta(days=30)).strftime('%Y-%m-%d %H:%M:%S')
+        year = (now - timedelta(days=args.days + 1)).strftime('%Y-%m-%d %H:%M:%S')
+
+        print()
+        print(f"{'insert path':<44} {'rows/s':>12}")
+        print(f"{'bulk executemany (index maintained)':<44} {load_rate:>12,.0f}")
+        print(f"{f'queue_product_write, batch={args.batch_size}':<44} {write_rate:>12,.0f}")
+
+        print()
+        print(f"{'per-ASIN range query':<44} {'median ms':>10} {'p95 ms':>10} {'rows':>7}")
+        measurements = [
+            ('30 days, index', raw_range(manager, month), args.queries),
+            ('30 days, full scan (no index)', raw_range(manager, month, indexed=False), args.scan_queries),
+            (f'{args.days} days raw, index', raw_range(manager, year), args.queries),
+        ]
+        for label, run, count in measurements:
+            median, p95, rows = time_queries(run, args.asins, count)
+            print(f"{label:<44} {median:>10.2f} {p95:>10.2f} {rows:>7}")
+
+        started = time.perf_counter()
+        counts = manager.compact_rank_history()
+        elapsed = time.perf_counter() - started
+        sizes = {t: manager.conn.execute(f'SELECT COUNT(*) FROM {t}').fetchone()[0]
+                 for t in ('rank_history', 'rank_history_hourly', 'rank_history_daily')}
+        median, p95, rows = time_queries(lambda asin: manager.rank_series('amazon.com', asin, year), args.asins, args.queries)
+        print(f"{f'{args.days} days tiered (rank_series)':<44} {median:>10.2f} {p95:>10.2f} {rows:>7}")
+
+        print()
+        moved = counts['raw'] + counts['hourly']
+        print(f"compaction: {elapsed:.1f}s, {moved / elapsed if elapsed else 0:,.0f} rows/s, "
+              f"{counts['raw']:,} raw points and {counts['hourly']:,} hourly buckets rolled up")
+        print("rows after: " + ", ".join(f"{t} {n:,}" for t, n in sizes.items()))
+        manager.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Per-page latency and bandwidth of the lean Selenium profile.
+
+Serves the saved fixture pages with the subresources a real product page
+pulls in (stylesheet, web font, large images, video poster) from a local
+server that counts the bytes it sends and delays every asset. Pages are
+fetched through one warm pooled driver with SELENIUM_LEAN=false and
+SELENIUM_LEAN=true. Needs Chrome installed.
+
+Usage:
+    python python/benchmarks/bench_selenium_lean.py --pages 20 --asset-latency-ms 100
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+PAGES = ['product_detail_bullets.html', 'product_prod_details.html']
+
+HEAVY_HEAD = """<link rel="stylesheet" href="/assets/site.css">
+<style>@font-face { font-family: bench; src: url(/assets/font.woff2); } body { font-family: bench; }</style>
+"""
+HEAVY_BODY = """<img src="/assets/hero.jpg"><img src="/assets/alt1.png"><img src="/assets/alt2.webp">
+<video poster="/assets/poster.jpg" src="/assets/clip.mp4"></video>
+"""
+ASSETS = {
+    'site.css': ('text/css', 120_000),
+    'font.woff2': ('font/woff2', 80_000),
+    'hero.jpg': ('image/jpeg', 400_000),
+    'alt1.png': ('image/png', 150_000),
+    'alt2.webp': ('image/webp', 150_000),
+    'poster.jpg': ('image/jpeg', 100_000),
+    'clip.mp4': ('video/mp4', 500_000),
+}
+
+
+def make_handler(pages, asset_latency_s, counter):
+    class HeavyPageHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            path = self.path.split('?')[0].lstrip('/')
+            if path.startswith('assets/') and path[len('assets/'):] in ASSETS:
+                time.sleep(asset_latency_s)
+                content_type, size = ASSETS[path[len('assets/'):]]
+                body = b'\0' * size
+            elif path in pages:
+                content_type, body = 'text/html; charset=utf-8', pages[path]
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            with counter['lock']:
+                counter['bytes'] += len(body)
+
+        def log_message(self, *args):
+            pass
+
+    return HeavyPageHandler
+
+
+def load_pages():
+    pages = {}
+    for name in PAGES:
+        with open(os.path.join(FIXTURES, name), encoding='utf-8') as f:
+            html = f.read()
+        html = html.replace('<head>', '<head>' + HEAVY_HEAD, 1).replace('</body>', HEAVY_BODY + '</body>', 1)
+        pages[name] = html.encode('utf-8')
+    return pages
+
+
+def run_once(urls, lean, counter):
+    os.environ.update({
+        'CRAWL_ENGINE': 'selenium',
+        'SELENIUM_ATTEMPTS': '1',
+        'SELENIUM_POOL_SIZE': '1',
+        'SELENIUM_MAX_PAGES': str(len(urls) + 1),
+        'SELENIUM_LEAN': 'true' if lean else 'false',
+        'CRAWL_CACHE': 'false',
+    })
+    from crawl_and_update_fixed import AmazonProductCrawler
+
+    crawler = AmazonProductCrawler()
+    with contextlib.redirect_stdout(io.StringIO()):
+        # Launch the browser outside the measurement
+        crawler.get_driver_pool().release(crawler.get_driver_pool().acquire())
+        counter['bytes'] = 0
+        failures = 0
+        started = time.perf_counter()
+        for url in urls:
+            if 'error' in crawler.process_single_url(url):
+                failures += 1
+        elapsed = time.perf_counter() - started
+    crawler.get_driver_pool().close()
+    return elapsed, counter['bytes'], failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pages', type=int, default=20, help='pages fetched per profile')
+    parser.add_argument('--asset-latency-ms', type=int, default=100, help='delay before each subresource is served')
+    args = parser.parse_args()
+
+    counter = {'bytes': 0, 'lock': threading.Lock()}
+    server = ThreadingHTTPServer(('127.0.0.1', 0), make_handler(load_pages(), args.asset_latency_ms / 1000.0, counter))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    urls = [f"{base}/{PAGES[n % len(PAGES)]}?n={n}" for n in range(args.pages)]
+
+    print(f"{'profile':>8} {'ms/page':>9} {'KB/page':>9} {'failed':>7}")
+    for profile, lean in (('full', False), ('lean', True)):
+        try:
+            elapsed, sent, failures = run_once(urls, lean, counter)
+        except Exception as e:
+            print(f"{profile:>8} could not run: {e}")
+            continue
+        if failures == len(urls):
+            print(f"{profile:>8} could not run: every page failed (is Chrome installed?)")
+            continue
+        print(f"{profile:>8} {elapsed * 1000 / len(urls):>9.1f} {sent / 1024 / len(urls):>9.1f} {failures:>7}")
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
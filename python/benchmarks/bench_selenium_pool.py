@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Pages/minute of the Selenium engine with and without the driver pool.
+
+Serves the saved fixture pages from a local static-file server and fetches
+them with CRAWL_ENGINE=selenium. "unpooled" launches a new Chrome for every
+page (SELENIUM_MAX_PAGES=1, the old behaviour); "pooled" keeps the browsers
+warm and only switches the user agent between pages. Needs Chrome installed.
+
+Usage:
+    python python/benchmarks/bench_selenium_pool.py --pages 30
+"""
+
+import argparse
+import contextlib
+import functools
+import io
+import os
+import sys
+import threading
+import time
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+PAGES = ['product_detail_bullets.html', 'product_prod_details.html']
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def run_once(urls, max_pages):
+    os.environ.update({
+        'CRAWL_ENGINE': 'selenium',
+        'SELENIUM_ATTEMPTS': '1',
+        'SELENIUM_POOL_SIZE': '1',
+        'SELENIUM_MAX_PAGES': str(max_pages),
+        'CRAWL_CACHE': 'false',
+    })
+    from crawl_and_update_fixed import AmazonProductCrawler
+
+    crawler = AmazonProductCrawler()
+    failures = 0
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for url in urls:
+            if 'error' in crawler.process_single_url(url):
+                failures += 1
+    elapsed = time.perf_counter() - started
+    pool = crawler.get_driver_pool()
+    launched = pool.created
+    pool.close()
+    return elapsed, launched, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pages', type=int, default=30, help='pages fetched per mode')
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), functools.partial(QuietHandler, directory=FIXTURES))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    urls = [f"{base}/{PAGES[n % len(PAGES)]}?n={n}" for n in range(args.pages)]
+
+    print(f"{'mode':>9} {'seconds':>9} {'pages/min':>10} {'browsers':>9} {'failed':>7}")
+    for mode, max_pages in (('unpooled', 1), ('pooled', max(1, args.pages))):
+        try:
+            elapsed, launched, failures = run_once(urls, max_pages)
+        except Exception as e:
+            print(f"{mode:>9} could not run: {e}")
+            continue
+        if failures == len(urls):
+            print(f"{mode:>9} could not run: every page failed (is Chrome installed?)")
+            continue
+        print(f"{mode:>9} {elapsed:>9.2f} {len(urls) * 60 / elapsed:>10.1f} {launched:>9} {failures:>7}")
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Bytes transferred and time to fields for the streaming HTTP transport.
+
+Serves the saved fixture pages padded to the size of a real product page
+(inline scripts above and below the product details) from a local server
+that sends 16 KB chunks at a fixed bandwidth. Each page is fetched with the
+early abort off (whole body) and on, then parsed. The captcha page is only
+padded below its form, as a real one would be.
+
+Usage:
+    python python/benchmarks/bench_transport.py --pages 10 --page-kb 1500 --mbps 50
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+PAGES = ['product_prod_details.html', 'product_detail_bullets.html', 'captcha.html']
+CHUNK = 16 * 1024
+
+
+def padded_page(name, page_kb):
+    with open(os.path.join(FIXTURES, name), encoding='utf-8') as f:
+        html = f.read()
+    # Product pages: a fifth of the padding above the product (head scripts), the rest below it.
+    # Captcha pages are small, their padding only follows the form.
+    filler = 'var x="' + 'a' * 1000 + '";\n'
+    above = '' if 'captcha' in name else '<script>' + filler * (page_kb // 5) + '</script>'
+    below = '<div id="reviewsMedley"></div><script>' + filler * (page_kb - page_kb // 5) + '</script>'
+    html = html.replace('<body>', '<body>' + above, 1).replace('</body>', below + '</body>', 1)
+    return html.encode('utf-8')
+
+
+def make_handler(pages, bytes_per_s, counter):
+    class ThrottledHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            body = pages.get(self.path.split('?')[0].lstrip('/'))
+            if body is None:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            try:
+                for pos in range(0, len(body), CHUNK):
+                    self.wfile.write(body[pos:pos + CHUNK])
+                    with counter['lock']:
+                        counter['bytes'] += len(body[pos:pos + CHUNK])
+                    time.sleep(CHUNK / bytes_per_s)
+            except (BrokenPipeError, ConnectionResetError):
+                self.close_connection = True
+
+        def log_message(self, *args):
+            pass
+
+    return ThrottledHandler
+
+
+def run_once(transport, urls, counter):
+    from product_parser import parse_product_page
+
+    counter['bytes'] = 0
+    received = 0
+    started = time.perf_counter()
+    for url in urls:
+        result = transport.get(url)
+        received += len(result.content)
+        parse_product_page(result.text, url)
+    elapsed = time.perf_counter() - started
+    # Let the server notice the aborted downloads before reading its counter
+    time.sleep(0.2)
+    return elapsed, received, counter['bytes']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pages', type=int, default=10, help='fetches per page kind and mode')
+    parser.add_argument('--page-kb', type=int, default=1500, help='padded page size')
+    parser.add_argument('--mbps', type=float, default=50, help='simulated bandwidth (megabits/s)')
+    args = parser.parse_args()
+
+    from http_transport import HttpTransport
+
+    counter = {'bytes': 0, 'lock': threading.Lock()}
+    pages = {name: padded_page(name, args.page_kb) for name in PAGES}
+    server = ThreadingHTTPServer(('127.0.0.1', 0), make_handler(pages, args.mbps * 1e6 / 8, counter))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+
+    print(f"{'page':>28} {'abort':>6} {'client':>7} {'ms/page':>9} {'KB recv':>9} {'KB sent':>9}")
+    for name in PAGES:
+        urls = [f"{base}/{name}?n={n}" for n in range(args.pages)]
+        for stream in (False, True):
+            transport = HttpTransport(pool_size=4, stream=stream)
+            elapsed, received, sent = run_once(transport, urls, counter)
+            transport.close()
+            print(f"{name:>28} {'on' if stream else 'off':>6} {transport.name:>7} "
+                  f"{elapsed * 1000 / len(urls):>9.1f} {received / 1024 / len(urls):>9.1f} {sent / 1024 / len(urls):>9.1f}")
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Offline extraction harness.
+
+Runs the crawler's extraction code over a directory of saved pages and
+compares the result with golden JSON files. Each `<name>.html` page has a
+`<name>.json` next to it:
+
+    {"url": "https://www.amazon.com/dp/B0...", "kind": "product|captcha|not_found",
+     "fields": {"title": "...", "rank": "...", ...}}
+
+The report is printed as JSON. It covers per-field accuracy, page-kind
+accuracy, pages/sec, p50/p95 parse latency and the tracemalloc peak per page.
+With --baseline it exits with status 1 when accuracy drops or p50 latency
+grows by more than --max-slowdown relative to an earlier report.
+
+The requests engine calls AmazonProductCrawler.parse_page directly. The
+selenium engine loads pages from file:// URLs in headless Chrome. Neither
+uses the network.
+
+Usage:
+    python python/benchmarks/extraction_harness.py --output report.json
+    python python/benchmarks/extraction_harness.py --baseline report.json
+"""
+
+import argparse
+import contextlib
+import glob
+import io
+import json
+import os
+import pathlib
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+os.environ.setdefault('DB_PATH', os.path.join(tempfile.gettempdir(), 'extraction_harness', 'unused.db'))
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def load_cases(corpus):
+    cases = []
+    for html_path in sorted(glob.glob(os.path.join(corpus, '*.html'))):
+        golden_path = os.path.splitext(html_path)[0] + '.json'
+        if not os.path.exists(golden_path):
+            continue
+        with open(html_path, encoding='utf-8') as f:
+            html = f.read()
+        with open(golden_path, encoding='utf-8') as f:
+            golden = json.load(f)
+        cases.append({'name': os.path.basename(html_path), 'path': html_path, 'html': html, 'golden': golden})
+    return cases
+
+
+def requests_extractor(crawler):
+    def extract(case):
+        return crawler.parse_page(case['html'], case['golden']['url'])
+    return extract
+
+
+def selenium_extractor(crawler):
+    from selenium import webdriver
+
+    options = webdriver.ChromeOptions()
+    options.add_argument("--headless=new")
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-dev-shm-usage")
+    driver = webdriver.Chrome(options=options)
+
+    def extract(case):
+        data = crawler.extract_product_data_selenium(driver, pathlib.Path(case['path']).as_uri())
+        error = str(data.get('error', '')).lower()
+        if 'captcha' in error:
+            return 'captcha', None
+        if 'not found' in error:
+            return 'not_found', data
+        return 'product', data
+
+    extract.close = driver.quit
+    return extract
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def run(cases, extract, rounds, engine):
+    field_hits = {}
+    field_totals = {}
+    kind_hits = 0
+    failures = []
+    latencies = []
+    alloc_peaks = []
+
+    for case in cases:
+        golden = case['golden']
+        kind, data = extract(case)
+        kind_hits += kind == golden['kind']
+        if kind != golden['kind']:
+            failures.append({'page': case['name'], 'field': 'kind', 'expected': golden['kind'], 'actual': kind})
+        for field, expected in golden.get('fields', {}).items():
+            if engine == 'selenium' and field == 'url':
+                continue
+            actual = (data or {}).get(field)
+            field_totals[field] = field_totals.get(field, 0) + 1
+            if actual == expected:
+                field_hits[field] = field_hits.get(field, 0) + 1
+            else:
+                failures.append({'page': case['name'], 'field': field, 'expected': expected, 'actual': actual})
+
+        # Allocation pass is separate so tracing does not skew the timings
+        tracemalloc.start()
+        tracemalloc.reset_peak()
+        extract(case)
+        alloc_peaks.append(tracemalloc.get_traced_memory()[1] / 1024.0)
+        tracemalloc.stop()
+
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for case in cases:
+            t0 = time.perf_counter()
+            extract(case)
+            latencies.append((time.perf_counter() - t0) * 1000.0)
+    elapsed = time.perf_counter() - started
+
+    total_fields = sum(field_totals.values())
+    return {
+        'engine': engine,
+        'pages': len(cases),
+        'rounds': rounds,
+        'pages_per_sec': round(len(latencies) / elapsed, 2) if elapsed else None,
+        'latency_ms': {
+            'p50': round(percentile(latencies, 50), 3),
+            'p95': round(percentile(latencies, 95), 3),
+            'mean': round(statistics.mean(latencies), 3),
+        },
+        'alloc_peak_kb': {
+            'mean': round(statistics.mean(alloc_peaks), 1),
+            'max': round(max(alloc_peaks), 1),
+        },
+        'kind_accuracy': round(kind_hits / len(cases), 4),
+        'field_accuracy': {f: round(field_hits.get(f, 0) / n, 4) for f, n in sorted(field_totals.items())},
+        'overall_field_accuracy': round(sum(field_hits.values()) / total_fields, 4) if total_fields else None,
+        'failures': failures,
+    }
+
+
+def regressions(report, baseline, max_slowdown):
+    problems = []
+    if report['kind_accuracy'] < baseline['kind_accuracy']:
+        problems.append(f"kind accuracy {baseline['kind_accuracy']} -> {report['kind_accuracy']}")
+    if (report['overall_field_accuracy'] or 0) < (baseline['overall_field_accuracy'] or 0):
+        problems.append(f"field accuracy {baseline['overall_field_accuracy']} -> {report['overall_field_accuracy']}")
+    if report['latency_ms']['p50'] > baseline['latency_ms']['p50'] * max_slowdown:
+        problems.append(f"p50 latency {baseline['latency_ms']['p50']}ms -> {report['latency_ms']['p50']}ms")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--corpus', default=DEFAULT_CORPUS, help='directory of *.html pages with golden *.json')
+    parser.add_argument('--engine', choices=['requests', 'selenium'], default='requests')
+    parser.add_argument('--rounds', type=int, default=20, help='timed passes over the corpus')
+    parser.add_argument('--output', help='also write the JSON report to this file')
+    parser.add_argument('--baseline', help='earlier JSON report to compare against')
+    parser.add_argument('--max-slowdown', type=float, default=1.25, help='allowed p50 latency ratio vs baseline')
+    args = parser.parse_args()
+
+    cases = load_cases(args.corpus)
+    if not cases:
+        print(f"No pages with golden JSON found in {args.corpus}", file=sys.stderr)
+        sys.exit(2)
+
+    from crawl_and_update_fixed import AmazonProductCrawler
+    from product_parser import resolve_backend
+
+    crawler = AmazonProductCrawler()
+    extract = requests_extractor(crawler) if args.engine == 'requests' else selenium_extractor(crawler)
+    try:
+        # The crawler prints progress chatter; keep stdout for the report only
+        with contextlib.redirect_stdout(io.StringIO()):
+            report = run(cases, extract, args.rounds, args.engine)
+    finally:
+        if hasattr(extract, 'close'):
+            extract.close()
+    report['parser_backend'] = resolve_backend()
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            problems = regressions(report, json.load(f), args.max_slowdown)
+        for problem in problems:
+            print(f"REGRESSION: {problem}", file=sys.stderr)
+        if problems:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -7,69 +7,27 @@ Extracts product information from Amazon URLs and updates SQLite database
 import sys
 import json
 import time
-import re
-import random
 import os
+import hashlib
+import argparse
+import functools
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from datetime import datetime
-
-
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from webdriver_manager.chrome import ChromeDriverManager
+from urllib.parse import urlparse
 
 from multiprocessing import Lock
-import requests
-from bs4 import BeautifulSoup
-from collections import deque
-from crawl_locators import (
-    TITLE,
-    PRICE_PRIMARY,
-    PRICE_FALLBACK,
-    BRAND,
-    RATINGS,
-    STARS,
-    IMAGE_WRAPPER_IMG,
-    DETAIL_BULLETS_ITEMS,
-    DETAILS_TABLE_ROWS,
-    CAPTCHA_KEYWORDS,
-)
+from amazon_urls import canonical_url, canonicalize
+from crawl_locators import CAPTCHA_KEYWORDS
 from db_utils import DatabaseManager
+from crawl_events import EventStream
+from crawl_metrics import CrawlMetrics
+from http_transport import HttpTransport, ACCEPT_ENCODING, PROBE_BYTES
+from crawl_scheduler import CrawlScheduler
+from product_parser import parse_product_page, is_not_found_page, marketplace_profile
+from rate_limiter import HostRateLimiter
+from retry_policy import RetryQueue, classify_error, classify_status, PERMANENT, CAPTCHA, TRANSIENT
+from user_agents import get_random_user_agent
 
-FALLBACK_USER_AGENTS = [
-    # Kept as a safe fallback if dynamic generator fails
-    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.0 Safari/605.1.15",
-    "Mozilla/5.0 (X11; Ubuntu; Linux x86_64; rv:115.0) Gecko/20100101 Firefox/115.0",
-    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36 Edg/120.0.0.0",
-    "Mozilla/5.0 (iPhone; CPU iPhone OS 17_0 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) CriOS/120.0.0.0 Mobile/15E148 Safari/604.1",
-]
-
-# Dynamic user-agent provider (fake-useragent)
-ua_provider = None
-try:
-    from fake_useragent import UserAgent  # type: ignore
-    # Use external data when possible, be tolerant of SSL
-    ua_provider = UserAgent(use_external_data=True, verify_ssl=False)
-except Exception as _e:
-    ua_provider = None
-
-
-def get_random_user_agent():
-    """Return a random user-agent string using fake-useragent with fallback."""
-    if ua_provider is not None:
-        try:
-            # Prefer realistic Chrome-like UA to reduce blocks; fallback to .random
-            return ua_provider.chrome
-        except Exception:
-            try:
-                return ua_provider.random
-            except Exception:
-                pass
-    return random.choice(FALLBACK_USER_AGENTS)
 
 class AmazonProductCrawler:
     def __init__(self, db_path=None):
@@ -91,8 +49,16 @@ class AmazonProductCrawler:
             pass
         # No OCR usage anymore
         self.lock = Lock()
-        # Database manager (centralized DB operations)
-        self.db_manager = DatabaseManager(self.db_path)
+        # Database manager (centralized DB operations, batched commits)
+        try:
+            db_batch_size = max(1, int(os.environ.get('DB_BATCH_SIZE', '20')))
+        except Exception:
+            db_batch_size = 20
+        try:
+            db_flush_interval = max(0, int(os.environ.get('DB_FLUSH_INTERVAL_MS', '2000'))) / 1000.0
+        except Exception:
+            db_flush_interval = 2.0
+        self.db_manager = DatabaseManager(self.db_path, batch_size=db_batch_size, flush_interval=db_flush_interval)
         
         # Crawling behavior configuration
         self.engine = (os.environ.get('CRAWL_ENGINE', 'requests') or 'requests').lower()
@@ -105,6 +71,18 @@ class AmazonProductCrawler:
             self.selenium_attempts = max(0, int(os.environ.get('SELENIUM_ATTEMPTS', '1')))
         except Exception:
             self.selenium_attempts = 0
+        # Selenium driver pool: browsers kept warm, replaced after SELENIUM_MAX_PAGES pages
+        try:
+            self.selenium_pool_size = max(1, int(os.environ.get('SELENIUM_POOL_SIZE', '2')))
+        except Exception:
+            self.selenium_pool_size = 2
+        try:
+            self.selenium_max_pages = max(1, int(os.environ.get('SELENIUM_MAX_PAGES', '50')))
+        except Exception:
+            self.selenium_max_pages = 50
+        # Lean profile: eager page load, no images/media/fonts/stylesheets
+        self.selenium_lean = (os.environ.get('SELENIUM_LEAN', 'true') or 'true').lower() in ('1', 'true', 'yes')
+        self.driver_pool = None
         try:
             self.crawl_delay_ms = max(0, int(os.environ.get('CRAWL_DELAY_MS', '200')))
         except Exception:
@@ -113,12 +91,105 @@ class AmazonProductCrawler:
             self.max_url_retries = max(0, int(os.environ.get('MAX_URL_RETRIES', '10')))
         except Exception:
             self.max_url_retries = 10
+        # Per-host token bucket; starts at CRAWL_RATE req/s (default 1000/CRAWL_DELAY_MS) and adapts to captchas
+        try:
+            initial_rate = float(os.environ['CRAWL_RATE']) if os.environ.get('CRAWL_RATE') else None
+        except Exception:
+            initial_rate = None
+        if initial_rate is None and self.crawl_delay_ms > 0:
+            initial_rate = 1000.0 / self.crawl_delay_ms
+        try:
+            rate_min = max(0.01, float(os.environ.get('CRAWL_RATE_MIN', '0.2')))
+        except Exception:
+            rate_min = 0.2
+        try:
+            rate_max = max(rate_min, float(os.environ.get('CRAWL_RATE_MAX', '20')))
+        except Exception:
+            rate_max = 20.0
+        # Per-marketplace starting rates, e.g. CRAWL_HOST_RATES="amazon.co.jp=0.5,amazon.de=1"
+        host_rates = {}
+        for entry in (os.environ.get('CRAWL_HOST_RATES') or '').split(','):
+            domain, _, value = entry.partition('=')
+            try:
+                host_rates[domain.strip().lower()] = float(value)
+            except ValueError:
+                if entry.strip():
+                    print(f"Ignoring CRAWL_HOST_RATES entry: {entry.strip()}")
+        self.rate_limiter = HostRateLimiter(rate=initial_rate, min_rate=rate_min, max_rate=rate_max,
+                                            host_rates=host_rates)
+        # Async engine: total in-flight requests and per-host politeness limit
+        try:
+            self.concurrency = max(1, int(os.environ.get('CRAWL_CONCURRENCY', '8')))
+        except Exception:
+            self.concurrency = 8
+        try:
+            self.per_host_limit = max(1, int(os.environ.get('CRAWL_PER_HOST', '4')))
+        except Exception:
+            self.per_host_limit = 4
+        # Rank history retention: raw points, then hourly and daily rollups (compacted in batches after runs)
+        self.history_retention = {}
+        for key, env, default in (('raw_days', 'RANK_HISTORY_RAW_DAYS', 7.0), ('hourly_days', 'RANK_HISTORY_HOURLY_DAYS', 90.0),
+                                  ('daily_days', 'RANK_HISTORY_DAILY_DAYS', 0.0), ('keep_points', 'RANK_HISTORY_KEEP_POINTS', 5)):
+            try:
+                self.history_retention[key] = max(0, type(default)(os.environ.get(env, str(default))))
+            except Exception:
+                self.history_retention[key] = default
+        try:
+            self.compact_every_minutes = max(0, int(os.environ.get('RANK_HISTORY_COMPACT_MINUTES', '60')))
+        except Exception:
+            self.compact_every_minutes = 60
+        # Change-detection cache: skip parsing/writing pages that did not change
+        self.use_cache = (os.environ.get('CRAWL_CACHE', 'true') or 'true').lower() in ('1', 'true', 'yes')
+        self.cache_stats = {'not_modified': 0, 'same_body': 0, 'same_fields': 0, 'misses': 0}
+        # URLs crawled successfully (updated or unchanged) in this process
+        self.completed_urls = set()
+        # Canonical URL -> the submitted URLs it stands for, in the current run
+        self.url_aliases = {}
+        # Durable crawl run being processed (crawl_runs.id)
+        self.run_id = None
+        # NDJSON events on CRAWL_EVENTS_FD; 'written' events wait for their batch to commit
+        self.events = EventStream()
+        self.pending_written = []
+        self.run_started = None
+        # Stage histograms and counters; a `metrics` summary event every CRAWL_METRICS_INTERVAL_MS
+        self.metrics = CrawlMetrics()
+        try:
+            self.metrics_interval = max(0, int(os.environ.get('CRAWL_METRICS_INTERVAL_MS', '10000'))) / 1000.0
+        except Exception:
+            self.metrics_interval = 10.0
+        self.metrics_emitted_at = time.monotonic()
+        self.in_flight = 0
+        self.metrics.collect('crawl_in_flight', lambda: {None: self.in_flight})
+        self.metrics.collect('crawl_host_rate', lambda: {host: stats['rate']
+                                                         for host, stats in self.rate_limiter.stats().items()})
+        self.metrics.collect('crawl_host_captcha_ratio', lambda: {host: stats['captcha_ratio']
+                                                                  for host, stats in self.rate_limiter.stats().items()})
+        # CRAWL_PROFILE=1 (or --profile): cProfile each run into CRAWL_PROFILE_DIR, see crawl_profile.py
+        self.profile = (os.environ.get('CRAWL_PROFILE', 'false') or 'false').lower() in ('1', 'true', 'yes')
+        self.profile_dir = os.environ.get('CRAWL_PROFILE_DIR') or os.path.join(repo_root, 'data', 'profiles')
+        try:
+            self.profile_top = max(1, int(os.environ.get('CRAWL_PROFILE_TOP', '25')))
+        except Exception:
+            self.profile_top = 25
+        self.profiler = None
+        # Multi-process mode: worker processes fetch and parse, this process writes
+        try:
+            self.workers = max(1, int(os.environ.get('CRAWL_WORKERS', '1')))
+        except Exception:
+            self.workers = 1
         
-        # Reusable HTTP session for performance
+        # Reusable HTTP transport: httpx/HTTP2 when installed, pooled requests.Session otherwise
         try:
-            self.http = requests.Session()
+            http_pool_size = max(1, int(os.environ.get('HTTP_POOL_SIZE', str(max(10, self.concurrency)))))
         except Exception:
-            self.http = None
+            http_pool_size = max(10, self.concurrency)
+        http_client = (os.environ.get('CRAWL_HTTP_CLIENT', 'auto') or 'auto').lower()
+        stream_abort = (os.environ.get('CRAWL_STREAM_ABORT', 'true') or 'true').lower() in ('1', 'true', 'yes')
+        try:
+            self.http = HttpTransport(pool_size=http_pool_size, client=http_client, stream=stream_abort)
+        except Exception as e:
+            print(f"HTTP client setup failed, using plain requests: {e}")
+            self.http = HttpTransport(pool_size=http_pool_size, client='requests', stream=stream_abort)
         
     def is_captcha_content(self, text: str) -> bool:
         """Detect if the page content looks like an Amazon CAPTCHA/robot check."""
@@ -131,7 +202,7 @@ class AmazonProductCrawler:
     def connect_db(self):
         """Connect to SQLite database"""
         try:
-            # Initialize tables via DatabaseManager (connection handled per operation)
+            # Initialize tables via DatabaseManager (opens its long-lived connection)
             self.db_manager.init_tables()
             return True
         except Exception as e:
@@ -142,526 +213,833 @@ class AmazonProductCrawler:
 
     # OCR-based captcha solving removed per configuration; instead we rotate UA and retry
 
+    def get_driver_pool(self):
+        """Warm Chrome drivers shared by the Selenium path, created on first use."""
+        with self.lock:
+            if self.driver_pool is None:
+                # Selenium is only imported when the Selenium engine is actually used
+                from driver_pool import DriverPool, new_chrome_driver
+                self.driver_pool = DriverPool(
+                    size=self.selenium_pool_size,
+                    max_pages=self.selenium_max_pages,
+                    factory=functools.partial(new_chrome_driver, lean=self.selenium_lean),
+                )
+            return self.driver_pool
+
     def extract_product_data_selenium(self, driver, url):
-        """Extract product information from Amazon page using Selenium"""
+        """Extract product information from Amazon page using Selenium
+
+        The rendered page source is read once and parsed with the same parser
+        as the requests engine instead of one WebDriver round trip per field.
+        """
+        started = time.perf_counter()
         try:
             driver.get(url)
-            # If CAPTCHA is detected, signal caller to retry with a different UA
-            if self.is_captcha_content(driver.page_source):
-                raise Exception("Captcha detected")
-            
-            # Check for "Sorry! We couldn't find that page" error
-            page_text = driver.page_source.lower()
-            if "sorry! we couldn't find that page" in page_text or "page not found" in page_text:
-                print(f"Product not found: {url}")
-                return {
-                    'title': 'Product Not Found',
-                    'price': 'N/A',
-                    'rank': 'N/A',
-                    'asin': 'N/A',
-                    'brand': 'N/A',
-                    'ratings': 'N/A',
-                    'stars': 'N/A',
-                    'image_url': 'N/A',
-                    'url': url,
-                    'error': 'Product not found on Amazon'
-                }
-
-            asin = date = rank = title = image_url = price = brand = ratings = stars = "Not found"
+            html = driver.page_source
+        except Exception as e:
+            from driver_pool import is_driver_failure
+            print(f"Error processing URL {url}: {e}")
+            result = self.error_result(url, f'Processing error: {str(e)}')
+            # Tells the caller not to hand this driver to the next page
+            result['_driver_failed'] = is_driver_failure(e)
+            return result
+        fetched = time.perf_counter()
 
-            try:
-                asin = driver.find_element(By.CSS_SELECTOR,
-                                           "#detailBullets_feature_div > ul > li:nth-child(5) > span > span:nth-child(2)").text
-            except:
-                pass
+        parse_groups = {}
+        kind, product_data = self.parse_page(html, url, parse_groups)
+        timings = {'fetch_ms': (fetched - started) * 1000, 'parse_ms': (time.perf_counter() - fetched) * 1000,
+                   'bytes': len(html), 'kind': kind, 'parse_groups': parse_groups}
+        if kind == 'not_found':
+            print(f"Product not found: {url}")
+        elif kind == 'captcha':
+            # If CAPTCHA is detected, signal caller to retry with a different UA
+            product_data = self.error_result(url, 'Processing error: blocked by captcha (selenium)', CAPTCHA)
+        product_data['_timings'] = timings
+        return product_data
 
-            try:
-                # Parse details table rows for date using configured locator
-                date = "Not found"
-                rows = driver.find_elements(By.CSS_SELECTOR, DETAILS_TABLE_ROWS)
-                for row in rows:
-                    try:
-                        th = row.find_element(By.TAG_NAME, 'th').text.strip()
-                        if 'Date First Available' in th or 'First Available' in th or 'Date' in th:
-                            date = row.find_element(By.TAG_NAME, 'td').text.strip()
-                            break
-                    except Exception:
-                        continue
-                # Fallback: parse bullets list items
-                if date == "Not found":
-                    bullets = driver.find_elements(By.CSS_SELECTOR, DETAIL_BULLETS_ITEMS)
-                    for li in bullets:
-                        text = li.text
-                        if 'Date First Available' in text or 'First Available' in text or 'Date' in text:
-                            parts = text.split(':', 1)
-                            if len(parts) == 2:
-                                date = parts[1].strip()
-                                break
-            except Exception:
-                pass
+    def parse_page(self, html, url, group_ms=None):
+        """Classify a fetched page and extract its fields.
 
-            try:
-                details = driver.find_elements(By.CSS_SELECTOR, DETAIL_BULLETS_ITEMS)
-                for item in details:
-                    text = item.text
-                    if "Best Sellers Rank" in text and "#" in text:
-                        try:
-                            rank_text = text.split("#", 1)[1].split(" ")[0]
-                            rank = rank_text.replace(",", "")
-                            break
-                        except Exception:
-                            continue
-            except Exception:
-                pass
-                
-        except Exception as e:
-            print(f"Error processing URL {url}: {e}")
-            return {
-                'title': 'Error Processing',
-                'price': 'N/A',
-                'rank': 'N/A',
+        Returns (kind, product_data) where kind is 'product', 'not_found' or
+        'captcha' (product_data is None for captcha pages). With a `group_ms`
+        dict, parse time per field group is added to it.
+        """
+        # Captcha and not-found markers sit at the top; don't lower-case a multi-MB page for them
+        lower_text = html[:PROBE_BYTES].lower()
+        if is_not_found_page(lower_text):
+            return 'not_found', {
                 'asin': 'N/A',
+                'date': 'N/A',
+                'rank': 'N/A',
+                'title': 'Product Not Found',
+                'image_url': 'N/A',
+                'price': 'N/A',
                 'brand': 'N/A',
                 'ratings': 'N/A',
                 'stars': 'N/A',
-                'image_url': 'N/A',
                 'url': url,
-                'error': f'Processing error: {str(e)}'
+                'error': 'Product not found on Amazon',
+                'error_kind': PERMANENT
             }
+        if self.is_captcha_content(lower_text):
+            return 'captcha', None
+        return 'product', parse_product_page(html, url, group_ms=group_ms)
 
-        try:
-            title = driver.find_element(By.ID, TITLE.replace('#','')).text.strip()
-        except:
-            pass
+    @staticmethod
+    def url_asin(url):
+        key = canonicalize(url)
+        return key[1] if key else None
 
-        try:
-            # Use wrapper img src directly (configured locator)
-            img_el = driver.find_element(By.CSS_SELECTOR, IMAGE_WRAPPER_IMG)
-            image_url = img_el.get_attribute("src")
-        except Exception:
-            # Fallback to legacy locator by id
-            try:
-                image = driver.find_element(By.ID, "landingImage")
-                image_url = image.get_attribute("src")
-            except Exception:
-                pass
+    @staticmethod
+    def url_key(url):
+        """(marketplace, ASIN) of a product URL; URLs naming no product are their own key."""
+        return canonicalize(url) or url
 
-        # Extract price
-        try:
-            price_element = driver.find_element(By.CSS_SELECTOR, PRICE_FALLBACK)
-            price = price_element.text.replace(",", "")
-        except:
-            try:
-                price_element = driver.find_element(By.CSS_SELECTOR, PRICE_PRIMARY)
-                price = price_element.text.replace("$", "").replace(",", "")
-            except:
-                pass
+    @staticmethod
+    def fields_fingerprint(product_data):
+        """Hash of the fields stored in the products table (url excluded, it is never updated)."""
+        fields = {k: product_data.get(k) for k in ('title', 'price', 'currency', 'rank', 'brand', 'ratings', 'stars',
+                                                   'image_url', 'date')}
+        return hashlib.sha1(json.dumps(fields, sort_keys=True).encode('utf-8')).hexdigest()
 
-        # Extract brand
-        try:
-            brand = driver.find_element(By.CSS_SELECTOR, BRAND).text.strip()
-        except:
-            pass
+    @staticmethod
+    def error_result(url, error, kind=TRANSIENT):
+        """Result for a failed fetch; `kind` tells the retry scheduler how to treat it."""
+        return {
+            'asin': 'N/A',
+            'date': 'N/A',
+            'rank': 'N/A',
+            'title': 'Error Processing',
+            'image_url': 'N/A',
+            'price': 'N/A',
+            'brand': 'N/A',
+            'ratings': 'N/A',
+            'stars': 'N/A',
+            'url': url,
+            'error': error,
+            'error_kind': kind
+        }
 
-        # Extract ratings
-        try:
-            ratings_element = driver.find_element(By.CSS_SELECTOR, RATINGS)
-            ratings = ratings_element.text.split(" ")[0]
-        except:
-            pass
+    @staticmethod
+    def unchanged_result(url, asin, level, cache):
+        """Result for a page that did not change since the cached crawl (level: not_modified/same_body/same_fields)."""
+        return {'asin': asin, 'url': url, 'title': 'Unchanged', 'unchanged': level, '_cache': cache}
 
-        # Extract star rating
-        try:
-            stars_element = driver.find_element(By.CSS_SELECTOR, STARS)
-            stars_text = stars_element.get_attribute("innerHTML")
-            if "out of 5 stars" in stars_text:
-                stars = stars_text.split(" out of 5 stars")[0]
-        except:
-            pass
+    def extract_product_data_requests(self, url, cache_entry=None):
+        """Extract product information using requests (fallback method)
 
-        return {
-            'asin': asin,
-            'date': date,
-            'rank': rank,
-            'title': title,
-            'image_url': image_url,
-            'price': price,
-            'brand': brand,
-            'ratings': ratings,
-            'stars': stars,
-            'url': url
-        }
+        With a `cache_entry` the request is conditional (ETag/Last-Modified) and
+        a body identical to the cached one is not parsed again. Captcha pages,
+        HTTP errors and timeouts return at once, classified for the retry
+        scheduler; only pages missing their image are refetched here with
+        another user agent. Fetch/parse timings, with the HTTP stages and
+        parse field groups, are attached as `_timings`.
+        """
+        timings = {'fetch_ms': 0.0, 'parse_ms': 0.0, 'bytes': 0, 'kind': None}
+        result = self._extract_requests(url, cache_entry, timings)
+        result['_timings'] = timings
+        return result
 
-    def extract_product_data_requests(self, url):
-        """Extract product information using requests (fallback method)"""
+    def _extract_requests(self, url, cache_entry, timings):
         print(f"Using requests fallback for: {url}")
         # Try with a few different user agents to bypass simple blocks
         attempts = self.requests_attempts if hasattr(self, 'requests_attempts') else 3
+        # Ask for the marketplace's own language; its locators and number format expect it
+        accept_language = marketplace_profile(url)['accept_language']
         for attempt in range(attempts):
             user_agent = get_random_user_agent()
             headers = {
                 'User-Agent': user_agent,
                 'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-                'Accept-Language': 'en-US,en;q=0.5',
-                'Accept-Encoding': 'gzip, deflate',
+                'Accept-Language': accept_language,
+                'Accept-Encoding': ACCEPT_ENCODING,
                 'Connection': 'keep-alive',
                 'DNT': '1',
                 'Upgrade-Insecure-Requests': '1',
             }
+            if cache_entry:
+                if cache_entry.get('etag'):
+                    headers['If-None-Match'] = cache_entry['etag']
+                if cache_entry.get('last_modified'):
+                    headers['If-Modified-Since'] = cache_entry['last_modified']
             try:
-                if self.http is not None:
-                    response = self.http.get(url, headers=headers, timeout=10)
-                else:
-                    response = requests.get(url, headers=headers, timeout=10)
-                response.raise_for_status()
+                started = time.perf_counter()
+                response = self.http.get(url, headers=headers, timeout=10, timings=timings)
+                timings['fetch_ms'] += (time.perf_counter() - started) * 1000
+                timings['bytes'] += len(response.content)
+                if response.status_code >= 400:
+                    print(f"Requests fallback: HTTP {response.status_code} for {url}")
+                    return self.error_result(url, f'Processing error: HTTP {response.status_code}',
+                                             classify_status(response.status_code))
 
-                lower_text = response.text.lower()
+                asin = self.url_asin(url)
+                cache = {
+                    'etag': response.headers.get('ETag') or (cache_entry or {}).get('etag'),
+                    'last_modified': response.headers.get('Last-Modified') or (cache_entry or {}).get('last_modified'),
+                    'body_hash': hashlib.sha1(response.content).hexdigest(),
+                }
+                if cache_entry and response.status_code == 304:
+                    print(f"Not modified (304): {url}")
+                    cache.update(body_hash=cache_entry.get('body_hash'), fields_hash=cache_entry.get('fields_hash'))
+                    return self.unchanged_result(url, asin, 'not_modified', cache)
+                if cache_entry and cache['body_hash'] == cache_entry.get('body_hash'):
+                    print(f"Unchanged page body: {url}")
+                    cache['fields_hash'] = cache_entry.get('fields_hash')
+                    return self.unchanged_result(url, asin, 'same_body', cache)
+
+                started = time.perf_counter()
+                kind, product_data = self.parse_page(response.text, url, timings.setdefault('parse_groups', {}))
+                timings['parse_ms'] += (time.perf_counter() - started) * 1000
+                timings['kind'] = kind
                 # Product not found
-                if "sorry! we couldn't find that page" in lower_text or "page not found" in lower_text:
+                if kind == 'not_found':
                     print(f"Product not found (requests): {url}")
-                    return {
-                        'asin': 'N/A',
-                        'date': 'N/A',
-                        'rank': 'N/A',
-                        'title': 'Product Not Found',
-                        'image_url': 'N/A',
-                        'price': 'N/A',
-                        'brand': 'N/A',
-                        'ratings': 'N/A',
-                        'stars': 'N/A',
-                        'url': url,
-                        'error': 'Product not found on Amazon'
-                    }
-
-                # Captcha detected -> retry with a different UA
-                if self.is_captcha_content(lower_text):
-                    print("Requests fallback: captcha detected, rotating user-agent and retrying...")
-                    time.sleep(random.uniform(0.5, 1.2))
-                    continue
-
-                soup = BeautifulSoup(response.text, 'html.parser')
-
-                # Base fields
-                title = soup.select_one(TITLE) or soup.find('title')
-                title_text = title.get_text(strip=True) if title else "Product from Amazon"
-
-                asin = url.split('/dp/')[-1].split('?')[0] if '/dp/' in url else 'Not found'
-
-                product_data = {
-                    'asin': asin,
-                    'date': 'Not found',
-                    'rank': 'Not found',
-                    'title': title_text,
-                    'image_url': 'Not found',
-                    'price': 'Not found',
-                    'brand': 'Amazon',
-                    'ratings': 'Not found',
-                    'stars': 'Not found',
-                    'url': url,
-                }
+                    return product_data
 
-                # Title (prefer explicit span)
-                t = soup.select_one(TITLE)
-                if t:
-                    product_data['title'] = t.get_text(strip=True)
-
-                # Price (primary then fallback)
-                p = soup.select_one(PRICE_PRIMARY)
-                if p and p.get_text(strip=True):
-                    product_data['price'] = p.get_text(strip=True).replace('$', '').replace(',', '')
-                else:
-                    p2 = soup.select_one(PRICE_FALLBACK)
-                    if p2:
-                        product_data['price'] = p2.get_text(strip=True).replace(',', '')
-
-                # Brand
-                b = soup.select_one(BRAND)
-                if b:
-                    product_data['brand'] = b.get_text(strip=True)
-
-                # Ratings count
-                rc = soup.select_one(RATINGS)
-                if rc:
-                    txt = rc.get_text(strip=True)
-                    m = re.search(r'([\d,]+)', txt)
-                    if m:
-                        product_data['ratings'] = m.group(1).replace(',', '')
-
-                # Stars
-                st = soup.select_one(STARS)
-                if st:
-                    txt = st.get_text(strip=True)
-                    m = re.search(r'([0-9.]+)\s+out of 5', txt)
-                    if m:
-                        product_data['stars'] = m.group(1)
-
-                # Image (wrapper img, og:image, landingImage, or dynamic JSON)
-                img = soup.select_one(IMAGE_WRAPPER_IMG)
-                if img and img.get('src'):
-                    product_data['image_url'] = img['src']
-                else:
-                    og_img = soup.find('meta', attrs={'property': 'og:image'}) or soup.find('meta', attrs={'name': 'og:image'})
-                    if og_img and og_img.get('content'):
-                        product_data['image_url'] = og_img['content']
-                    else:
-                        landing_img = soup.find('img', id='landingImage')
-                        if landing_img and landing_img.get('src'):
-                            product_data['image_url'] = landing_img['src']
-                        elif landing_img and landing_img.get('data-a-dynamic-image'):
-                            try:
-                                dyn = landing_img.get('data-a-dynamic-image').replace('&quot;', '"')
-                                images_map = json.loads(dyn)
-                                best_url = None
-                                best_area = -1
-                                for u, size in images_map.items():
-                                    try:
-                                        area = int(size[0]) * int(size[1])
-                                    except Exception:
-                                        area = 0
-                                    if area > best_area:
-                                        best_area = area
-                                        best_url = u
-                                if best_url:
-                                    product_data['image_url'] = best_url
-                            except Exception:
-                                pass
-
-                # Rank (parse bullets)
-                for li in soup.select(DETAIL_BULLETS_ITEMS) or []:
-                    text = li.get_text(" ", strip=True)
-                    if 'Best Sellers Rank' in text:
-                        m = re.search(r'#([\d,]+)', text)
-                        if m:
-                            product_data['rank'] = m.group(1).replace(',', '')
-                            break
-
-                # Date First Available (details table)
-                found_date = False
-                for tr in soup.select(DETAILS_TABLE_ROWS) or []:
-                    th = tr.find('th')
-                    td = tr.find('td')
-                    if th and td and any(k in th.get_text(strip=True) for k in ['Date First Available', 'First Available', 'Date']):
-                        product_data['date'] = td.get_text(strip=True)
-                        found_date = True
-                        break
-                # Fallback: detail bullets
-                if not found_date:
-                    for li in soup.select(DETAIL_BULLETS_ITEMS) or []:
-                        text = li.get_text(' ', strip=True)
-                        if any(k in text for k in ['Date First Available', 'First Available', 'Date']):
-                            parts = text.split(':', 1)
-                            if len(parts) == 2:
-                                product_data['date'] = parts[1].strip()
-                                break
+                # Captcha detected -> the retry scheduler cools the host down
+                if kind == 'captcha':
+                    print(f"Requests fallback: captcha detected for {url}")
+                    return self.error_result(url, 'Processing error: blocked by captcha (requests)', CAPTCHA)
 
                 # If image still missing, rotate UA and retry next attempt
                 if product_data['image_url'] in ['Not found', 'N/A', None, '']:
                     print('Requests fallback: image not found, rotating user-agent and retrying...')
-                    time.sleep(random.uniform(0.5, 1.5))
                     continue
 
+                product_data['_cache'] = cache
                 return product_data
 
             except Exception as e:
+                # Timeouts and connection errors are transient; retried later with backoff
                 print(f"Requests fallback attempt {attempt+1} failed: {e}")
-                time.sleep(random.uniform(0.5, 1.5))
+                return self.error_result(url, f'Processing error: {e}', TRANSIENT)
 
-        # If still blocked
-        return {
-            'asin': 'N/A',
-            'date': 'N/A',
-            'rank': 'N/A',
-            'title': 'Error Processing',
-            'image_url': 'N/A',
-            'price': 'N/A',
-            'brand': 'N/A',
-            'ratings': 'N/A',
-            'stars': 'N/A',
-            'url': url,
-            'error': 'Processing error: blocked by captcha (requests)'
-        }
+        # Page kept coming back without its image
+        return self.error_result(url, 'Processing error: image not found (requests)', TRANSIENT)
 
-    def process_single_url(self, url):
-        """Process a single URL and return product data, preferring fast BeautifulSoup path."""
+    def process_single_url(self, url, cache_entry=None):
+        """Process a single URL and return product data, marked 'unchanged' when it matches the cache."""
+        data = self._fetch_product(url, cache_entry)
+        if data and 'error' not in data and not data.get('unchanged') and self.use_cache:
+            cache = data.setdefault('_cache', {})
+            cache['fields_hash'] = self.fields_fingerprint(data)
+            if cache_entry and cache['fields_hash'] == cache_entry.get('fields_hash'):
+                print(f"Unchanged product fields: {url}")
+                unchanged = self.unchanged_result(url, data['asin'], 'same_fields', cache)
+                unchanged['_timings'] = data.get('_timings')
+                return unchanged
+        return data
+
+    def _fetch_product(self, url, cache_entry=None):
+        """Fetch and extract one URL, preferring fast requests path."""
         print(f"Processing: {url}")
 
         engine = self.engine
+        # The async engine only changes scheduling; each fetch uses the requests path
         if engine not in ('requests', 'selenium', 'auto'):
             engine = 'requests'
 
         # Fast path: requests/BeautifulSoup first
         if engine in ('requests', 'auto'):
-            data = self.extract_product_data_requests(url)
+            data = self.extract_product_data_requests(url, cache_entry)
             # If auto mode and explicitly blocked, optionally fallback to Selenium
-            if engine == 'auto' and 'error' in data and 'captcha' in str(data['error']).lower() and self.allow_selenium_fallback:
+            if engine == 'auto' and 'error' in data and classify_error(data) == CAPTCHA and self.allow_selenium_fallback:
                 pass  # will try selenium below
             else:
                 return data
 
         # Selenium path (disabled by default for speed; attempts default to 0)
         attempts = self.selenium_attempts
+        last_error = None
         for attempt in range(1, attempts + 1):
             user_agent = get_random_user_agent()
             print(f"[Selenium Attempt {attempt}/{attempts}] Using UA: {user_agent[:40]}...")
             try:
-                options = webdriver.ChromeOptions()
-                options.add_argument(f"--user-agent={user_agent}")
-                options.add_argument("--headless=new")  # headless
-                options.add_argument("--no-sandbox")
-                options.add_argument("--disable-dev-shm-usage")
-                options.add_argument("--disable-blink-features=AutomationControlled")
-                options.add_argument("--log-level=3")
-                options.add_experimental_option("excludeSwitches", ["enable-automation", "enable-logging"])
-                options.add_experimental_option('useAutomationExtension', False)
-
-                try:
-                    driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=options)
-                except Exception as e:
-                    print(f"Chrome WebDriver error: {e}")
-                    driver = webdriver.Chrome(options=options)
-
-                try:
-                    product_data = self.extract_product_data_selenium(driver, url)
-                    print(f"Selenium extracted: {product_data['title'][:50]}...")
-                    # If image is missing, force retry with next attempt/UA
-                    if product_data.get('image_url') in ['Not found', 'N/A', None, '']:
-                        raise Exception('image not found')
-                    driver.quit()
-                    return product_data
-                except Exception as e:
-                    print(f"Selenium attempt {attempt} failed: {e}")
-                    time.sleep(random.uniform(0.6, 1.2))
-                finally:
-                    try:
-                        driver.quit()
-                    except Exception:
-                        pass
+                driver = self.get_driver_pool().acquire(user_agent)
             except Exception as e:
                 print(f"Selenium setup failed on attempt {attempt}: {e}")
-                time.sleep(random.uniform(0.6, 1.0))
+                last_error = e
+                continue
+
+            recycle = False
+            try:
+                product_data = self.extract_product_data_selenium(driver, url)
+                print(f"Selenium extracted: {product_data['title'][:50]}...")
+                if 'error' in product_data:
+                    kind = classify_error(product_data)
+                    # A browser that hit a captcha or whose session broke is replaced with a fresh one
+                    recycle = kind == CAPTCHA or product_data.get('_driver_failed', False)
+                    if kind == PERMANENT:
+                        return product_data
+                    raise Exception(product_data['error'])
+                # If image is missing, force retry with next attempt/UA
+                if product_data.get('image_url') in ['Not found', 'N/A', None, '']:
+                    raise Exception('image not found')
+                return product_data
+            except Exception as e:
+                print(f"Selenium attempt {attempt} failed: {e}")
+                last_error = e
+            finally:
+                self.get_driver_pool().release(driver, recycle)
 
         # If we get here, either engine was 'selenium' with failures or 'auto' fallback failed
-        return {
-            'asin': 'N/A',
-            'date': 'N/A',
-            'rank': 'N/A',
-            'title': 'Error Processing',
-            'image_url': 'N/A',
-            'price': 'N/A',
-            'brand': 'N/A',
-            'ratings': 'N/A',
-            'stars': 'N/A',
-            'url': url,
-            'error': 'Processing error after retries'
-        }
+        error = f'Processing error after retries: {last_error}' if last_error else 'Processing error after retries'
+        return self.error_result(url, error, classify_error({'error': error}))
 
     def update_database(self, product_data):
-        """Insert or update product in database with rank history via DatabaseManager"""
+        """Queue product insert/update with rank history; DatabaseManager batches the commit"""
         try:
             if 'error' in product_data:
                 print(f"Skipping database update for error case: {product_data['error']}")
                 return False
 
-            asin = product_data['asin']
-            current_rank = None if product_data['rank'] in ['Not found', 'N/A'] else product_data['rank']
-            current_price = None if product_data['price'] in ['Not found', 'N/A'] else product_data['price']
-
-            existing = self.db_manager.get_product_by_asin(asin)
-            if existing:
-                old_rank = existing[1]
-                self.db_manager.update_product(asin, product_data)
-                print(f"Updated product: {product_data['title'][:50]}...")
-                if current_rank and old_rank and current_rank != old_rank:
-                    self.db_manager.add_rank_history(asin, current_rank, current_price)
-                    print(f"Rank history updated: {old_rank} -> {current_rank}")
-                self.db_manager.cleanup_rank_history(asin)
-            else:
-                self.db_manager.create_product(product_data)
-                print(f"Added new product: {product_data['title'][:50]}...")
-                if current_rank:
-                    self.db_manager.add_rank_history(asin, current_rank, current_price)
-                    print(f"Initial rank history added: {current_rank}")
-
+            self.db_manager.queue_product_write(product_data)
+            print(f"Saved product: {product_data['title'][:50]}...")
             return True
         except Exception as e:
             print(f"Database error: {e}")
             return False
 
+    def _dedupe_urls(self, urls):
+        """One canonical URL per (marketplace, ASIN), in first-seen order.
+
+        The submitted URLs behind each canonical one are kept in `url_aliases`,
+        so results are reported under every URL that was asked for.
+        """
+        self.url_aliases = {}
+        canonical_by_key = {}
+        for url in urls:
+            key = self.url_key(url)
+            canonical = canonical_by_key.get(key)
+            if canonical is None:
+                canonical = canonical_by_key[key] = canonical_url(url)
+                self.url_aliases[canonical] = []
+            if url not in self.url_aliases[canonical]:
+                self.url_aliases[canonical].append(url)
+        return list(canonical_by_key.values())
+
+    def _aliases(self, url):
+        """The submitted URLs a crawled URL answers for (itself included)."""
+        aliases = self.url_aliases.get(url)
+        return [url] + [alias for alias in aliases if alias != url] if aliases else [url]
+
+    def _requeue(self, queue, url, attempts, error=None, kind=TRANSIENT):
+        """Schedule a failed URL for a delayed retry, or give up on it."""
+        if kind == PERMANENT:
+            print(f"Not retrying URL (permanent failure): {url}")
+            self.metrics.inc('crawl_failures_total', kind)
+            self._mark_job(url, 'failed', attempts + 1, error)
+            for alias in self._aliases(url):
+                self.events.emit('failed', url=alias, attempt=attempts + 1, kind=kind, error=error)
+        elif attempts < self.max_url_retries:
+            delay = queue.retry({ 'url': url, 'attempts': attempts + 1 }, kind)
+            self.metrics.inc('crawl_retries_total', kind)
+            print(f"Retry URL in {delay:.1f}s ({kind}, attempt {attempts+1}/{self.max_url_retries}): {url}")
+            self._mark_job(url, 'pending', attempts + 1, error)
+            self.events.emit('retried', url=url, attempt=attempts + 1, kind=kind, delay_ms=round(delay * 1000), error=error)
+        else:
+            self.metrics.inc('crawl_failures_total', kind)
+            self._mark_job(url, 'failed', attempts + 1, error)
+            for alias in self._aliases(url):
+                self.events.emit('failed', url=alias, attempt=attempts + 1, kind=kind, error=error)
+
+    def _emit_fetch_events(self, item, index, product_data):
+        if not self.events.enabled:
+            return
+        url = item['url']
+        timings = (product_data or {}).get('_timings') or {}
+        if not product_data or 'error' in product_data and timings.get('kind') is None:
+            status = 'error'
+        else:
+            status = 'unchanged' if product_data.get('unchanged') in ('not_modified', 'same_body') else 'ok'
+        self.events.emit('fetched', url=url, index=index, attempt=item['attempts'] + 1, status=status,
+                         fetch_ms=round(timings.get('fetch_ms', 0.0), 1), bytes=timings.get('bytes', 0))
+        if timings.get('kind'):
+            self.events.emit('parsed', url=url, asin=product_data.get('asin'), kind=timings['kind'],
+                             parse_ms=round(timings.get('parse_ms', 0.0), 1))
+
+    def _record_metrics(self, product_data):
+        """Feed the stage histograms and page counters from one fetch result."""
+        self.in_flight = max(0, self.in_flight - 1)
+        timings = (product_data or {}).get('_timings') or {}
+        for stage in ('fetch', 'dns', 'connect', 'tls', 'ttfb', 'download'):
+            self.metrics.observe_ms('crawl_stage_seconds', stage, timings.get(f'{stage}_ms'))
+        if timings.get('kind'):
+            self.metrics.observe_ms('crawl_stage_seconds', 'parse', timings.get('parse_ms'))
+        for group, ms in (timings.get('parse_groups') or {}).items():
+            self.metrics.observe_ms('crawl_parse_group_seconds', group, ms)
+        if timings.get('bytes'):
+            self.metrics.inc('crawl_downloaded_bytes_total', amount=timings['bytes'])
+        # Token wait done inside a worker process
+        if timings.get('wait_ms'):
+            self.metrics.inc('crawl_sleep_seconds_total', 'rate_limit', timings['wait_ms'] / 1000.0)
+        if not product_data:
+            result = 'error'
+        elif product_data.get('unchanged'):
+            result = 'unchanged'
+        elif timings.get('kind') == 'not_found':
+            result = 'not_found'
+        elif 'error' in product_data:
+            result = 'captcha' if classify_error(product_data) == CAPTCHA else 'error'
+        else:
+            result = 'product'
+        self.metrics.inc('crawl_pages_total', result)
+
+    def _emit_metrics(self, force=False):
+        """Send a `metrics` summary event every CRAWL_METRICS_INTERVAL_MS (and at the end of a run)."""
+        if not self.events.enabled or not (force or self.metrics_interval):
+            return
+        now = time.monotonic()
+        if force or now - self.metrics_emitted_at >= self.metrics_interval:
+            self.metrics_emitted_at = now
+            self.events.emit('metrics', **self.metrics.summary())
+
+    def _flush_writes(self, force=False):
+        """Commit queued writes (when due, or always with `force`) and announce what was committed."""
+        started = time.perf_counter()
+        rows = self.db_manager.flush() if force else self.db_manager.flush_if_due()
+        if rows:
+            self.metrics.observe('crawl_stage_seconds', 'db_write', time.perf_counter() - started)
+            self.metrics.inc('crawl_db_rows_total', amount=rows)
+        self._emit_metrics()
+        # Nothing left in the batch: every queued product write has been committed
+        if self.pending_written and not self.db_manager.pending_count:
+            written, self.pending_written = self.pending_written, []
+            for fields in written:
+                self.events.emit('written', **fields)
+
+    def _mark_job(self, url, state, attempts, error=None):
+        """Checkpoint the job for `url` in the current run (batched with product writes)."""
+        if self.run_id is not None:
+            self.db_manager.queue_job_state(self.run_id, url, state, attempts, error)
+
+    def _start_item(self, item, i, total_count):
+        print(f"Progress: {i}/{total_count}", flush=True)
+        self.in_flight += 1
+        self._mark_job(item['url'], 'in_flight', item['attempts'])
+
+    def _print_progress(self, i, total_count, product_data, status):
+        # Flush one-line JSON status to stdout so Node can stream it to UI
+        try:
+            host = urlparse(product_data.get('url') or '').netloc
+            rate = self.rate_limiter.rate(host)
+            print(json.dumps({
+                'type': 'progress',
+                'index': i,
+                'total': total_count,
+                'asin': product_data.get('asin'),
+                'url': product_data.get('url'),
+                'status': status,
+                'rate': round(rate, 2) if rate is not None else None,
+                'captcha_ratio': round(self.rate_limiter.captcha_ratio(host), 3),
+            }), flush=True)
+        except Exception:
+            pass
+
+    def _cache_entry_for(self, url):
+        key = canonicalize(url)
+        if not self.use_cache or not key:
+            return None
+        try:
+            return self.db_manager.get_page_cache(*key)
+        except Exception as e:
+            print(f"Cache lookup failed for {url}: {e}")
+            return None
+
+    def _finish_run(self, success_count, total_count):
+        """Flush pending writes, close the durable run and print the run summary."""
+        self._flush_writes(force=True)
+        if self.run_id is not None:
+            self.db_manager.finish_crawl_run(self.run_id)
+        self.db_manager.flush()
+        self.compact_history()
+        print(f"Crawling completed. Successfully processed {success_count}/{total_count} URLs.")
+        if self.use_cache:
+            hits = sum(v for k, v in self.cache_stats.items() if k != 'misses')
+            print(f"Change-detection cache: {hits} unchanged, {self.cache_stats['misses']} changed or new")
+        try:
+            print(json.dumps({
+                'type': 'summary',
+                'success': success_count,
+                'total': total_count,
+                'cache': dict(self.cache_stats, hits=sum(v for k, v in self.cache_stats.items() if k != 'misses')),
+            }), flush=True)
+        except Exception:
+            pass
+        self._print_stage_summary()
+        self._emit_metrics(force=True)
+        self.events.emit('finished', success=success_count, total=total_count,
+                         elapsed_ms=round((time.perf_counter() - (self.run_started or time.perf_counter())) * 1000),
+                         cache=dict(self.cache_stats))
+        return success_count > 0
+
+    def _print_stage_summary(self):
+        """One line of p50/p95 per crawl stage, cumulative over the process."""
+        stages = []
+        for stage, histogram in sorted(self.metrics.histograms['crawl_stage_seconds'].items()):
+            if histogram.count:
+                stages.append(f"{stage} {histogram.quantile(0.5) * 1000:.0f}/{histogram.quantile(0.95) * 1000:.0f}")
+        if stages:
+            print(f"Stage timings p50/p95 ms: {', '.join(stages)}")
+
+    def compact_history(self, force=False):
+        """Roll old rank history into hourly/daily buckets, at most every RANK_HISTORY_COMPACT_MINUTES."""
+        try:
+            if not force:
+                if self.compact_every_minutes <= 0:
+                    return None
+                self.db_manager.cursor.execute(
+                    """SELECT 1 FROM settings WHERE key = 'rank_history_compacted_at'
+                       AND value > datetime('now', ?)""",
+                    (f'-{self.compact_every_minutes} minutes',),
+                )
+                if self.db_manager.cursor.fetchone():
+                    return None
+            started = time.perf_counter()
+            counts = self.db_manager.compact_rank_history(**self.history_retention)
+            with self.db_manager.conn:
+                self.db_manager.cursor.execute(
+                    """INSERT INTO settings (key, value, updated_at) VALUES ('rank_history_compacted_at', datetime('now'), CURRENT_TIMESTAMP)
+                       ON CONFLICT(key) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at"""
+                )
+            print(f"Rank history compacted in {time.perf_counter() - started:.1f}s: "
+                  f"{counts['raw']} raw points, {counts['hourly']} hourly and {counts['daily']} daily buckets rolled up")
+            return counts
+        except Exception as e:
+            print(f"Rank history compaction failed: {e}")
+            return None
+
+    def _record_response(self, url, product_data):
+        """Feed the host's answer to the rate limiter: captchas slow it down, clean pages speed it up."""
+        if not product_data:
+            return
+        kind = classify_error(product_data) if 'error' in product_data else None
+        if kind == TRANSIENT:
+            # Timeouts and connection errors say nothing about throttling
+            return
+        host = urlparse(url).netloc
+        old_rate = self.rate_limiter.rate(host)
+        rate = self.rate_limiter.record(host, kind == CAPTCHA)
+        if kind == CAPTCHA and rate is not None:
+            print(f"Captcha from {host}: rate {old_rate:.2f} -> {rate:.2f} req/s "
+                  f"(captcha ratio {self.rate_limiter.captcha_ratio(host):.1%})")
+
+    def _wait_for_token(self, url):
+        """Seconds to wait before fetching `url` (a token is reserved for it)."""
+        return self.rate_limiter.reserve(urlparse(url).netloc)
+
+    def _sleep(self, seconds, reason):
+        """Deliberate sleep, counted per reason (rate_limit, retry_wait) so profiles can tell it from work."""
+        if seconds > 0:
+            time.sleep(seconds)
+            self.metrics.inc('crawl_sleep_seconds_total', reason, seconds)
+
+    def _sleep_seconds(self):
+        with self.metrics.lock:
+            return dict(self.metrics.counters['crawl_sleep_seconds_total'])
+
+    def _handle_result(self, item, product_data, i, total_count, queue):
+        """Store a crawled product or requeue its URL. Returns True when the DB was updated."""
+        url = item['url']
+        attempts = item['attempts']
+        self._record_response(url, product_data)
+        self._record_metrics(product_data)
+        self._emit_fetch_events(item, i, product_data)
+        if product_data and product_data.get('unchanged'):
+            self.cache_stats[product_data['unchanged']] += 1
+            # Unchanged results only come from a page cache entry, which exists for product URLs alone
+            self.db_manager.queue_unchanged(canonicalize(url)[0], product_data['asin'], product_data['_cache'])
+            self.completed_urls.update(self._aliases(url))
+            self._mark_job(url, 'done', attempts)
+            self.pending_written.extend({'url': alias, 'asin': product_data['asin'], 'status': 'unchanged'}
+                                        for alias in self._aliases(url))
+            print(f"Product {i}/{total_count} unchanged ({product_data['unchanged']})")
+            self._print_progress(i, total_count, product_data, 'unchanged')
+            return True
+        if product_data:
+            if self.use_cache and 'error' not in product_data:
+                self.cache_stats['misses'] += 1
+            if 'error' in product_data:
+                print(f"Product {i}/{total_count} error: {product_data['error']}")
+                # Requeue on error if attempts remain
+                self._requeue(queue, url, attempts, product_data['error'], classify_error(product_data))
+            elif product_data['title'] not in ['Product Not Found', 'Error Processing']:
+                # Only update database if product was successfully crawled
+                if self.update_database(product_data):
+                    self.completed_urls.update(self._aliases(url))
+                    self._mark_job(url, 'done', attempts)
+                    self.pending_written.extend({'url': alias, 'asin': product_data.get('asin'), 'status': 'updated'}
+                                                for alias in self._aliases(url))
+                    print(f"Product {i}/{total_count} added to database successfully")
+                    self._print_progress(i, total_count, product_data, 'updated')
+                    return True
+                print(f"Failed to add product {i}/{total_count} to database")
+                self._requeue(queue, url, attempts, 'database write failed')
+            else:
+                print(f"Product {i}/{total_count} skipped - not found or error")
+                self._requeue(queue, url, attempts, kind=classify_error(product_data))
+        else:
+            print(f"Failed to crawl product {i}/{total_count}")
+            self._requeue(queue, url, attempts)
+        return False
+
     def crawl_urls(self, urls):
         """Crawl multiple URLs and update database immediately"""
         if not self.connect_db():
             return False
         
-        # Deduplicate while preserving order
-        seen = set()
-        unique_urls = []
-        for u in urls:
-            if u not in seen:
-                seen.add(u)
-                unique_urls.append(u)
-
-        # Build retry queue
-        queue = deque({ 'url': u, 'attempts': 0 } for u in unique_urls)
+        unique_urls = self._dedupe_urls(urls)
+        # Durable job table: every state change is checkpointed so the run can be resumed
+        self.run_id = self.db_manager.create_crawl_run(unique_urls)
+        print(f"Crawl run {self.run_id} created")
+        queue = RetryQueue({ 'url': u, 'attempts': 0 } for u in unique_urls)
+        return self._crawl_queue(queue, len(unique_urls))
+
+    def resume_run(self, run_id=None):
+        """Continue an interrupted run without re-fetching its completed URLs.
+
+        Returns None when there is nothing to resume.
+        """
+        if not self.connect_db():
+            return False
+        run = self.db_manager.get_resumable_run(run_id)
+        if not run:
+            print("No interrupted crawl run to resume")
+            return None
+        self.run_id, total_count, jobs, done_count = run
+        # The jobs hold canonical URLs; the submitted variants are not recorded
+        self.url_aliases = {}
+        print(f"Resuming crawl run {self.run_id}: {len(jobs)} of {total_count} URLs left")
+        queue = RetryQueue({ 'url': url, 'attempts': attempts } for url, attempts in jobs)
+        return self._crawl_queue(queue, total_count, done_count)
+
+    def _crawl_queue(self, queue, total_count, start_index=0):
+        # Per-run state; a daemon crawler runs many queues
+        self.completed_urls = set()
+        self.cache_stats = dict.fromkeys(self.cache_stats, 0)
+        self.run_started = time.perf_counter()
+        self.events.run_id = self.run_id
+        self.events.emit('started', total=total_count, pending=len(queue), engine=self.engine, workers=self.workers)
+        self.in_flight = 0
+        self.metrics.collect('crawl_queue_depth', lambda: {None: len(queue)})
+        self.metrics.collect('crawl_queue_delayed', lambda: {None: len(queue.delayed)})
+        if not self.profile:
+            return self._run_engine(queue, total_count, start_index)
+
+        from crawl_profile import RunProfiler
+        self.profiler = RunProfiler(self.profile_dir, top=self.profile_top)
+        self.profiler.start(self._sleep_seconds())
+        try:
+            return self._run_engine(queue, total_count, start_index)
+        finally:
+            profiler, self.profiler = self.profiler, None
+            print(profiler.stop(self.run_id, self._sleep_seconds()), end='', flush=True)
+
+    def _run_engine(self, queue, total_count, start_index):
+        if self.workers > 1:
+            return self.crawl_urls_multiprocess(queue, total_count, start_index)
+        if self.engine == 'async':
+            import asyncio
+            return asyncio.run(self.crawl_urls_async(queue, total_count, start_index))
+        return self.crawl_urls_sequential(queue, total_count, start_index)
+
+    def crawl_urls_sequential(self, queue, total_count, start_index=0):
+        """Crawl URLs one at a time on this thread."""
         success_count = 0
-        total_count = len(unique_urls)
-        
         print(f"Starting to crawl {total_count} Amazon URLs...")
         
-        i = 0
+        i = start_index
         while queue:
-            item = queue.popleft()
-            url = item['url']
-            attempts = item['attempts']
+            # Hosts without a token are skipped while another host can go
+            item = queue.pop_ready(self.rate_limiter.wait_time)
+            if item is None:
+                # Only delayed retries or rate-limited hosts are left; nothing else could run meanwhile
+                self._flush_writes()
+                self._sleep(queue.next_wait(), 'rate_limit' if queue.blocked else 'retry_wait')
+                continue
             i += 1
-            print(f"Progress: {i}/{total_count}")
+            self._start_item(item, i, total_count)
 
-            product_data = self.process_single_url(url)
-            if product_data:
-                if 'error' in product_data:
-                    print(f"Product {i}/{total_count} error: {product_data['error']}")
-                    # Requeue on error if attempts remain
-                    if attempts < self.max_url_retries:
-                        print(f"Requeue URL (attempt {attempts+1}/{self.max_url_retries}): {url}")
-                        queue.append({ 'url': url, 'attempts': attempts + 1 })
-                elif product_data['title'] not in ['Product Not Found', 'Error Processing']:
-                    # Only update database if product was successfully crawled
-                    if self.update_database(product_data):
-                        success_count += 1
-                        print(f"Product {i}/{total_count} added to database successfully")
-                        # Flush one-line JSON status to stdout so Node can stream it to UI
-                        try:
-                            print(json.dumps({
-                                'type': 'progress',
-                                'index': i,
-                                'total': total_count,
-                                'asin': product_data.get('asin'),
-                                'url': product_data.get('url'),
-                                'status': 'updated'
-                            }), flush=True)
-                        except Exception:
-                            pass
-                    else:
-                        print(f"Failed to add product {i}/{total_count} to database")
-                        if attempts < self.max_url_retries:
-                            print(f"Requeue URL (attempt {attempts+1}/{self.max_url_retries}): {url}")
-                            queue.append({ 'url': url, 'attempts': attempts + 1 })
-                else:
-                    print(f"Product {i}/{total_count} skipped - not found or error")
-                    if attempts < self.max_url_retries:
-                        print(f"Requeue URL (attempt {attempts+1}/{self.max_url_retries}): {url}")
-                        queue.append({ 'url': url, 'attempts': attempts + 1 })
-            else:
-                print(f"Failed to crawl product {i}/{total_count}")
-                if attempts < self.max_url_retries:
-                    print(f"Requeue URL (attempt {attempts+1}/{self.max_url_retries}): {url}")
-                    queue.append({ 'url': url, 'attempts': attempts + 1 })
+            # Politeness: wait for the host's token bucket
+            self._sleep(self._wait_for_token(item['url']), 'rate_limit')
+            product_data = self.process_single_url(item['url'], self._cache_entry_for(item['url']))
+            if self._handle_result(item, product_data, i, total_count, queue):
+                success_count += 1
             
-            # Small delay with configuration
-            if self.crawl_delay_ms > 0:
-                time.sleep(self.crawl_delay_ms / 1000.0)
+            self._flush_writes()
         
-        print(f"Crawling completed. Successfully processed {success_count}/{total_count} URLs.")
-        return success_count > 0
+        return self._finish_run(success_count, total_count)
+
+    async def crawl_urls_async(self, queue, total_count, start_index=0):
+        """Crawl URLs with up to `concurrency` fetches in flight.
+
+        Fetches run on a thread pool; results are handled on the event loop so
+        database writes and the retry queue stay single-threaded. Each host gets
+        at most `per_host_limit` concurrent requests, started at the pace of its
+        token bucket. A URL only takes a slot once its host has a token, so a
+        throttled marketplace leaves the slots to the others.
+        """
+        import asyncio
+
+        success_count = 0
+        loop = asyncio.get_running_loop()
+        host_in_flight = {}
+
+        def host_wait(host):
+            if host_in_flight.get(host, 0) >= self.per_host_limit:
+                return None
+            return self.rate_limiter.wait_time(host)
+
+        print(f"Starting to crawl {total_count} Amazon URLs (async, concurrency {self.concurrency})...")
+
+        # Fetch threads are profiled too in profile mode
+        process = self.profiler.wrap(self.process_single_url) if self.profiler else self.process_single_url
+
+        async def fetch(url, cache_entry, delay):
+            if delay > 0:
+                await asyncio.sleep(delay)
+                self.metrics.inc('crawl_sleep_seconds_total', 'rate_limit', delay)
+            return await loop.run_in_executor(executor, process, url, cache_entry)
+
+        i = start_index
+        in_flight = {}
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            while queue or in_flight:
+                while len(in_flight) < self.concurrency:
+                    item = queue.pop_ready(host_wait)
+                    if item is None:
+                        break
+                    i += 1
+                    self._start_item(item, i, total_count)
+                    host = urlparse(item['url']).netloc
+                    host_in_flight[host] = host_in_flight.get(host, 0) + 1
+                    # The token is taken now so the next host_wait() sees it gone
+                    task = asyncio.ensure_future(fetch(item['url'], self._cache_entry_for(item['url']),
+                                                       self._wait_for_token(item['url'])))
+                    in_flight[task] = (item, i)
+
+                if not in_flight:
+                    delay = queue.next_wait()
+                    await asyncio.sleep(delay)
+                    self.metrics.inc('crawl_sleep_seconds_total', 'rate_limit' if queue.blocked else 'retry_wait', delay)
+                    continue
+                # With free slots, wake up when the next delayed retry or host token becomes eligible
+                timeout = queue.next_wait() if len(in_flight) < self.concurrency else None
+                done, _ = await asyncio.wait(in_flight, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    item, index = in_flight.pop(task)
+                    host_in_flight[urlparse(item['url']).netloc] -= 1
+                    try:
+                        product_data = task.result()
+                    except Exception as e:
+                        print(f"Error processing URL {item['url']}: {e}")
+                        product_data = None
+                    if self._handle_result(item, product_data, index, total_count, queue):
+                        success_count += 1
+                self._flush_writes()
+
+        return self._finish_run(success_count, total_count)
+
+    def crawl_urls_multiprocess(self, queue, total_count, start_index=0):
+        """Crawl URLs on a pool of `workers` processes.
+
+        Workers pull URLs from the shared pool queue, fetch and parse them and
+        return the product data. This process owns the retry queue, the retry
+        counts, the progress lines and the only SQLite connection.
+        """
+        from concurrent.futures import ProcessPoolExecutor
+
+        success_count = 0
+
+        print(f"Starting to crawl {total_count} Amazon URLs ({self.workers} worker processes)...", flush=True)
+        if self.profiler:
+            print("Profile mode: only this process is profiled, not the fetch/parse workers (use --workers 1)")
+
+        i = start_index
+        in_flight = {}
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker) as pool:
+            while queue or in_flight:
+                # Keep one URL buffered per worker so no process idles between results
+                while len(in_flight) < self.workers * 2:
+                    # A rate-limited host does not hold a worker while another host can go
+                    item = queue.pop_ready(self.rate_limiter.wait_time)
+                    if item is None:
+                        break
+                    i += 1
+                    self._start_item(item, i, total_count)
+                    # The worker starts the fetch at the time its token becomes valid
+                    start_at = time.time() + self._wait_for_token(item['url'])
+                    in_flight[pool.submit(_crawl_in_worker, item['url'], self._cache_entry_for(item['url']), start_at)] = (item, i)
+
+                if not in_flight:
+                    self._sleep(queue.next_wait(), 'rate_limit' if queue.blocked else 'retry_wait')
+                    continue
+                timeout = queue.next_wait() if len(in_flight) < self.workers * 2 else None
+                done, _ = wait(in_flight, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    item, index = in_flight.pop(future)
+                    try:
+                        product_data = future.result()
+                    except Exception as e:
+                        print(f"Error processing URL {item['url']}: {e}", flush=True)
+                        product_data = None
+                    if self._handle_result(item, product_data, index, total_count, queue):
+                        success_count += 1
+                self._flush_writes()
+
+        return self._finish_run(success_count, total_count)
+
+
+# Per-process crawler used by crawl_urls_multiprocess workers (never touches the DB)
+_worker_crawler = None
+
+
+def _init_worker():
+    global _worker_crawler
+    # Line-buffer so worker output never splits a line written by the parent
+    try:
+        sys.stdout.reconfigure(line_buffering=True)
+    except Exception:
+        pass
+    # Events are written by the parent only
+    os.environ.pop('CRAWL_EVENTS_FD', None)
+    _worker_crawler = AmazonProductCrawler()
+
+
+def _crawl_in_worker(url, cache_entry=None, start_at=None):
+    # Rate limiting is decided by the parent process; the worker only honours the start time
+    delay = start_at - time.time() if start_at is not None else 0
+    if delay > 0:
+        time.sleep(delay)
+    data = _worker_crawler.process_single_url(url, cache_entry)
+    if delay > 0 and data:
+        # Reported back so the parent counts it as sleep
+        data['_timings'] = dict(data.get('_timings') or {}, wait_ms=delay * 1000)
+    return data
+
+
+def run_due_crawl(crawler, tick_minutes, select=None):
+    """One adaptive scheduler tick: crawl the due ASINs and reschedule them. Returns the exit code.
+
+    `select` may narrow the due URLs down (the daemon drops the ones another job already covers).
+    """
+    if not crawler.connect_db():
+        return 1
+    scheduler = CrawlScheduler(crawler.db_manager, tick_minutes=tick_minutes)
+    tracked = scheduler.sync_from_url_lists(canonicalize)
+    urls = scheduler.due_urls()
+    print(f"Scheduler: {len(urls)} of {tracked} tracked ASINs due (budget {scheduler.tick_budget()} per tick)")
+    if select is not None and urls:
+        urls = select(urls)
+    if not urls:
+        return 0
+
+    run_started_at = scheduler.now()
+    success = crawler.crawl_urls(urls)
+    scheduler.reschedule(urls, crawler.completed_urls, run_started_at, canonicalize)
+    print("Amazon crawling completed successfully!" if success else "Amazon crawling failed!")
+    return 0 if success else 1
+
 
 def main():
     """Main function to handle input and start crawling"""
@@ -675,6 +1053,81 @@ def main():
         except Exception:
             pass
 
+        parser = argparse.ArgumentParser(description='Crawl Amazon product URLs given as a JSON list on stdin')
+        parser.add_argument('--engine', choices=('requests', 'selenium', 'auto', 'async'), default=None,
+                            help='fetch engine (default: CRAWL_ENGINE or requests); async is thread-backed: '
+                                 'blocking requests fetches run on a ThreadPoolExecutor driven from an asyncio '
+                                 'event loop, up to CRAWL_CONCURRENCY at a time')
+        parser.add_argument('--workers', type=int, default=None,
+                            help='number of worker processes (default: CRAWL_WORKERS or 1)')
+        parser.add_argument('--due', action='store_true',
+                            help='crawl the ASINs due in crawl_schedule instead of reading stdin')
+        parser.add_argument('--tick-minutes', type=float, default=15,
+                            help='scheduler tick length used to size the --due budget')
+        parser.add_argument('--resume', nargs='?', const='latest', default=None, metavar='RUN_ID',
+                            help='continue an interrupted crawl run (default: the latest one)')
+        parser.add_argument('--daemon', action='store_true',
+                            help='keep running and take crawl jobs as JSON-RPC requests on stdin')
+        parser.add_argument('--compact-history', action='store_true',
+                            help='roll old rank history into hourly/daily buckets now and exit')
+        parser.add_argument('--profile', action='store_true',
+                            help='cProfile each crawl run and print a hot-function and sleep/work summary '
+                                 '(same as CRAWL_PROFILE=1)')
+        parser.add_argument('--profile-startup', action='store_true',
+                            help='print an import-time breakdown of the crawler startup and exit')
+        parser.add_argument('--import', dest='import_source', default=None, metavar='FILE',
+                            help="stream an ASIN list (FILE or '-' for stdin) into tracked_asins and exit")
+        parser.add_argument('--import-format', choices=('auto', 'lines', 'csv'), default='auto',
+                            help='--import input: one URL/ASIN per line, or asin,marketplace,tags CSV')
+        parser.add_argument('--marketplace', default='amazon.com',
+                            help='marketplace of bare ASINs in the --import input')
+        parser.add_argument('--tags', default=None, help='tags added to every --import entry')
+        args = parser.parse_args()
+
+        if args.profile_startup:
+            from startup_profile import print_startup_profile
+            sys.exit(print_startup_profile())
+
+        # Create crawler
+        crawler = AmazonProductCrawler()
+        if args.profile:
+            crawler.profile = True
+        if args.engine is not None:
+            crawler.engine = args.engine
+        if args.workers is not None:
+            crawler.workers = max(1, args.workers)
+
+        if args.daemon:
+            from crawl_daemon import serve
+            sys.exit(serve(crawler, run_due=run_due_crawl))
+
+        if args.due:
+            sys.exit(run_due_crawl(crawler, args.tick_minutes))
+
+        if args.compact_history:
+            if not crawler.connect_db():
+                sys.exit(1)
+            sys.exit(0 if crawler.compact_history(force=True) is not None else 1)
+
+        if args.import_source is not None:
+            if not crawler.connect_db():
+                sys.exit(1)
+            from asin_import import import_asins, open_source
+            with open_source(args.import_source) as stream:
+                summary = import_asins(crawler.db_manager, stream, fmt=args.import_format,
+                                       default_marketplace=args.marketplace, tags=args.tags,
+                                       log=lambda line: print(line, file=sys.stderr, flush=True))
+            # Last stdout line: the summary the server returns to the client
+            print(json.dumps(summary), flush=True)
+            sys.exit(0)
+
+        if args.resume is not None:
+            success = crawler.resume_run(None if args.resume == 'latest' else int(args.resume))
+            if success is None:
+                sys.exit(0)
+            print("Amazon crawling completed successfully!" if success else "Amazon crawling failed!")
+            sys.exit(0 if success else 1)
+
         # Read URLs from stdin (sent by Node.js)
         urls_json = sys.stdin.read()
         urls = json.loads(urls_json)
@@ -683,8 +1136,7 @@ def main():
             print("Error: Invalid URLs input")
             sys.exit(1)
         
-        # Create crawler and start crawling
-        crawler = AmazonProductCrawler()
+        # Start crawling
         success = crawler.crawl_urls(urls)
         
         if success:
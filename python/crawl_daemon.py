@@ -0,0 +1,269 @@
+"""
+Long-lived crawler process speaking JSON-RPC 2.0 over stdin/stdout.
+
+Started with `crawl_and_update_fixed.py --daemon`, one message per line. The
+crawler (HTTP connection pool, Selenium drivers, rate limiter, SQLite
+connection) is built once and reused by every job. Log lines go to stderr,
+stdout only carries JSON-RPC messages.
+
+Methods:
+
+- crawl {urls}: crawl a URL list; answered with the job result once done
+- crawl_due {tick_minutes}: one adaptive scheduler tick
+- resume {run_id}: continue an interrupted run (default: the latest one)
+- status: running and queued jobs
+- metrics: crawl metrics of this process in the Prometheus text format ({text})
+- ping
+- shutdown: finish the running job, drop the queued ones and exit
+
+Closing stdin works like shutdown. Jobs run one at a time, in the order they
+were received. An ASIN already covered by a queued or running job is not
+crawled again (URL variants of one product count as the same ASIN): the
+later job reports the earlier job's outcome for it.
+"""
+
+import json
+import os
+import sys
+import threading
+from collections import deque
+
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+INTERNAL_ERROR = -32603
+SHUTTING_DOWN = -32000
+
+JOB_METHODS = ('crawl', 'crawl_due', 'resume')
+
+
+class Job:
+    def __init__(self, job_id, request_id, method, params):
+        self.id = job_id
+        self.request_id = request_id
+        self.method = method
+        self.params = params
+        # URLs this job crawls, and (url, key, owner) for the ones an earlier job covers
+        self.urls = []
+        self.merged = []
+        # key -> True (crawled) / False (failed), filled in when the job finishes
+        self.outcomes = {}
+        self.state = 'queued'
+
+    def describe(self):
+        return {'job': self.id, 'method': self.method, 'state': self.state,
+                'urls': len(self.urls), 'merged': len(self.merged)}
+
+
+class CrawlDaemon:
+    def __init__(self, crawler, run_due=None, rpc_out=None):
+        self.crawler = crawler
+        self.run_due = run_due
+        self.out = rpc_out or sys.stdout
+        self.out_lock = threading.Lock()
+        self.lock = threading.Lock()
+        self.wakeup = threading.Condition(self.lock)
+        self.jobs = deque()
+        self.current = None
+        # (marketplace, ASIN) (or URL when it has none) -> job that crawls it, while that job is queued or running
+        self.claims = {}
+        self.next_job_id = 0
+        self.stopping = False
+
+    def key(self, url):
+        return self.crawler.url_key(url)
+
+    def _claim(self, job, urls):
+        """Split `urls` into the ones `job` crawls and the ones already claimed. Call with the lock held."""
+        own = []
+        for url in urls:
+            key = self.key(url)
+            owner = self.claims.get(key)
+            if owner is None:
+                self.claims[key] = job
+                own.append(url)
+            else:
+                job.merged.append((url, key, owner))
+        return own
+
+    def _release(self, job):
+        with self.lock:
+            for url in job.urls:
+                key = self.key(url)
+                if self.claims.get(key) is job:
+                    del self.claims[key]
+            self.current = None
+
+    def send(self, message):
+        line = json.dumps(message)
+        with self.out_lock:
+            try:
+                self.out.write(line + '\n')
+                self.out.flush()
+            except (OSError, ValueError):
+                # Node went away; the job results have nowhere to go
+                pass
+
+    def respond(self, request_id, result=None, error=None):
+        message = {'jsonrpc': '2.0', 'id': request_id}
+        if error is not None:
+            message['error'] = error
+        else:
+            message['result'] = result
+        self.send(message)
+
+    def submit(self, request_id, method, params):
+        with self.lock:
+            self.next_job_id += 1
+            job = Job(self.next_job_id, request_id, method, params)
+            if method == 'crawl':
+                job.urls = self._claim(job, params['urls'])
+            self.jobs.append(job)
+            self.wakeup.notify()
+        print(f"Job {job.id} queued: {method}, {len(job.urls)} URLs"
+              + (f", {len(job.merged)} already covered by earlier jobs" if job.merged else ''))
+        return job
+
+    def status(self):
+        with self.lock:
+            return {
+                'pid': os.getpid(),
+                'running': self.current.describe() if self.current else None,
+                'queued': [job.describe() for job in self.jobs],
+            }
+
+    def run_job(self, job):
+        crawler = self.crawler
+        crawler.run_id = None
+        if job.method == 'resume':
+            success = crawler.resume_run(job.params.get('run_id'))
+            return {'job': job.id, 'run_id': crawler.run_id, 'success': success}
+
+        if job.method == 'crawl_due':
+            def select(urls):
+                with self.lock:
+                    job.urls = self._claim(job, urls)
+                return job.urls
+
+            code = self.run_due(crawler, job.params.get('tick_minutes', 15), select=select)
+            for url in job.urls:
+                job.outcomes[self.key(url)] = url in crawler.completed_urls
+            return {'job': job.id, 'run_id': crawler.run_id, 'success': code == 0,
+                    'total': len(job.urls), 'merged': len(job.merged),
+                    'crawled': len(crawler.completed_urls) if job.urls else 0}
+
+        if job.urls:
+            crawler.crawl_urls(job.urls)
+        for url in job.urls:
+            job.outcomes[self.key(url)] = url in crawler.completed_urls
+        failed = [url for url in job.urls if not job.outcomes[self.key(url)]]
+        # Owners ran earlier (or are this job), so their outcomes are known
+        failed += [url for url, key, owner in job.merged if not owner.outcomes.get(key)]
+        total = len(job.urls) + len(job.merged)
+        return {'job': job.id, 'run_id': crawler.run_id, 'success': len(failed) < total,
+                'total': total, 'crawled': len(job.urls), 'merged': len(job.merged), 'failed': failed}
+
+    def work(self):
+        while True:
+            with self.lock:
+                while not self.jobs and not self.stopping:
+                    self.wakeup.wait()
+                if self.stopping:
+                    return
+                job = self.jobs.popleft()
+                job.state = 'running'
+                self.current = job
+            try:
+                result = self.run_job(job)
+                job.state = 'done'
+                if job.request_id is not None:
+                    self.respond(job.request_id, result=result)
+            except Exception as e:
+                job.state = 'failed'
+                print(f"Job {job.id} failed: {e}")
+                if job.request_id is not None:
+                    self.respond(job.request_id, error={'code': INTERNAL_ERROR, 'message': str(e)})
+            finally:
+                self._release(job)
+
+    def stop(self):
+        with self.lock:
+            self.stopping = True
+            dropped = list(self.jobs)
+            self.jobs.clear()
+            self.wakeup.notify()
+        for job in dropped:
+            if job.request_id is not None:
+                self.respond(job.request_id, error={'code': SHUTTING_DOWN, 'message': 'crawler daemon is shutting down'})
+
+    def handle_line(self, line):
+        try:
+            request = json.loads(line)
+        except ValueError:
+            self.respond(None, error={'code': PARSE_ERROR, 'message': 'invalid JSON'})
+            return
+        if not isinstance(request, dict) or not isinstance(request.get('method'), str):
+            self.respond(request.get('id') if isinstance(request, dict) else None,
+                         error={'code': INVALID_REQUEST, 'message': 'invalid request'})
+            return
+        request_id = request.get('id')
+        method = request['method']
+        params = request.get('params') or {}
+
+        if method == 'ping':
+            self.respond(request_id, result={'pid': os.getpid()})
+        elif method == 'status':
+            self.respond(request_id, result=self.status())
+        elif method == 'metrics':
+            self.respond(request_id, result={'text': self.crawler.metrics.render_prometheus()})
+        elif method == 'shutdown':
+            self.respond(request_id, result={'stopping': True})
+            self.stop()
+        elif method in JOB_METHODS:
+            if not isinstance(params, dict):
+                self.respond(request_id, error={'code': INVALID_PARAMS, 'message': 'params must be an object'})
+                return
+            urls = params.get('urls')
+            if method == 'crawl' and (not urls or not isinstance(urls, list)
+                                      or not all(isinstance(u, str) for u in urls)):
+                self.respond(request_id, error={'code': INVALID_PARAMS, 'message': 'urls must be a list of strings'})
+                return
+            if method == 'crawl_due' and self.run_due is None:
+                self.respond(request_id, error={'code': METHOD_NOT_FOUND, 'message': 'crawl_due is not available'})
+                return
+            if self.stopping:
+                self.respond(request_id, error={'code': SHUTTING_DOWN, 'message': 'crawler daemon is shutting down'})
+                return
+            self.submit(request_id, method, params)
+        else:
+            self.respond(request_id, error={'code': METHOD_NOT_FOUND, 'message': f'unknown method {method}'})
+
+    def serve(self, stdin=None):
+        """Read requests until stdin closes or shutdown is called, then finish the running job."""
+        stdin = stdin or sys.stdin
+        worker = threading.Thread(target=self.work, name='crawl-jobs', daemon=True)
+        worker.start()
+        self.send({'jsonrpc': '2.0', 'method': 'ready', 'params': {'pid': os.getpid()}})
+        for line in stdin:
+            line = line.strip()
+            if line:
+                self.handle_line(line)
+            if self.stopping:
+                break
+        self.stop()
+        worker.join()
+        return 0
+
+
+def serve(crawler, run_due=None):
+    """Run the daemon on this process's stdin/stdout. Returns the exit code."""
+    # JSON-RPC keeps the real stdout; every print (ours and the worker processes') goes to stderr
+    sys.stdout.flush()
+    rpc_out = os.fdopen(os.dup(sys.stdout.fileno()), 'w', buffering=1, encoding='utf-8')
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    try:
+        sys.stdout.reconfigure(line_buffering=True)
+    except Exception:
+        pass
+    return CrawlDaemon(crawler, run_due=run_due, rpc_out=rpc_out).serve()
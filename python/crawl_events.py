@@ -0,0 +1,64 @@
+"""
+NDJSON crawl event stream.
+
+One JSON object per line, written to the file descriptor named by
+CRAWL_EVENTS_FD (the Node server passes an extra pipe as fd 3), so events
+never mix with the free-form log lines on stdout. Without CRAWL_EVENTS_FD
+nothing is written.
+
+Events (all carry "event", "ts" and "run_id"):
+
+- started:  total, engine
+- fetched:  url, index, attempt, status (ok/unchanged/error), fetch_ms, bytes
+- parsed:   url, asin, kind (product/not_found/captcha), parse_ms
+- written:  url, asin, status (updated/unchanged), emitted once the batch is committed
+- retried:  url, attempt, kind, delay_ms, error
+- failed:   url, attempt, kind, error
+- metrics:  per-stage latency (count, mean/p50/p95/total ms) and counter changes
+            since the previous metrics event, queue depth, in-flight fetches and
+            per-host rate/captcha ratio; every CRAWL_METRICS_INTERVAL_MS and at
+            the end of a run
+- finished: success, total, elapsed_ms, cache
+"""
+
+import json
+import os
+import threading
+import time
+
+
+class EventStream:
+    def __init__(self, fd=None):
+        if fd is None:
+            fd = os.environ.get('CRAWL_EVENTS_FD')
+        self.run_id = None
+        self.lock = threading.Lock()
+        self.out = None
+        if fd not in (None, ''):
+            try:
+                self.out = os.fdopen(int(fd), 'w', buffering=1, encoding='utf-8')
+            except Exception as e:
+                print(f"Crawl event stream disabled (fd {fd}): {e}")
+
+    @property
+    def enabled(self):
+        return self.out is not None
+
+    def emit(self, event, **fields):
+        if self.out is None:
+            return
+        line = json.dumps(dict(event=event, ts=round(time.time(), 3), run_id=self.run_id, **fields))
+        with self.lock:
+            try:
+                self.out.write(line + '\n')
+            except (OSError, ValueError):
+                # Reader went away; keep crawling without events
+                self.out = None
+
+    def close(self):
+        if self.out is not None:
+            try:
+                self.out.close()
+            except OSError:
+                pass
+            self.out = None
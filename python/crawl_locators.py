@@ -9,6 +9,128 @@ STARS = 'span.a-icon-alt'
 IMAGE_WRAPPER_IMG = "#imgTagWrapperId img"
 DETAIL_BULLETS_ITEMS = '#detailBulletsWrapper_feature_div li'
 DETAILS_TABLE_ROWS = '#prodDetails table tr'
+LANDING_IMAGE = 'img#landingImage'
+OG_IMAGE = 'meta[property="og:image"], meta[name="og:image"]'
+PAGE_TITLE = 'title'
+
+# Keywords matched in detail bullets / details table rows (amazon.com wording)
+RANK_KEYWORDS = ['Best Sellers Rank']
+DATE_KEYWORDS = ['Date First Available', 'First Available', 'Date']
+
+# Marketplace the profiles below fall back to (also used for non-Amazon test hosts)
+DEFAULT_MARKETPLACE = 'amazon.com'
+
+# Per-marketplace request language, currency, number format and detail wording.
+# rank_pattern / stars_pattern capture the number; rank digits are read with any
+# grouping separator, stars with `decimal` as the decimal separator. Pages of a
+# marketplace are also matched against the amazon.com wording, which they use
+# when the visitor picked English.
+MARKETPLACE_PROFILES = {
+    'amazon.com': {
+        'accept_language': 'en-US,en;q=0.9',
+        'currency': 'USD',
+        'decimal': '.',
+        'rank_keywords': RANK_KEYWORDS,
+        'rank_pattern': r'#([\d,]+)',
+        'date_keywords': DATE_KEYWORDS,
+        'stars_pattern': r'([0-9.]+)\s+out of 5',
+    },
+    'amazon.ca': {
+        'accept_language': 'en-CA,en;q=0.9',
+        'currency': 'CAD',
+        'decimal': '.',
+        'rank_keywords': RANK_KEYWORDS,
+        'rank_pattern': r'#([\d,]+)',
+        'date_keywords': DATE_KEYWORDS,
+        'stars_pattern': r'([0-9.]+)\s+out of 5',
+    },
+    'amazon.co.uk': {
+        'accept_language': 'en-GB,en;q=0.9',
+        'currency': 'GBP',
+        'decimal': '.',
+        'rank_keywords': RANK_KEYWORDS,
+        # "Best Sellers Rank: 2,131 in Home & Kitchen" (no '#')
+        'rank_pattern': r'#?(\d[\d,]*)\s+in\s',
+        'date_keywords': DATE_KEYWORDS,
+        'stars_pattern': r'([0-9.]+)\s+out of 5',
+    },
+    'amazon.in': {
+        'accept_language': 'en-IN,en;q=0.9',
+        'currency': 'INR',
+        'decimal': '.',
+        'rank_keywords': RANK_KEYWORDS,
+        'rank_pattern': r'#?(\d[\d,]*)\s+in\s',
+        'date_keywords': DATE_KEYWORDS,
+        'stars_pattern': r'([0-9.]+)\s+out of 5',
+    },
+    'amazon.de': {
+        'accept_language': 'de-DE,de;q=0.9,en;q=0.5',
+        'currency': 'EUR',
+        'decimal': ',',
+        'rank_keywords': ['Amazon Bestseller-Rang', 'Bestseller-Rang'],
+        'rank_pattern': r'Nr\.\s*(\d[\d.]*)',
+        'date_keywords': ['Im Angebot von Amazon.de seit', 'Erscheinungsdatum'],
+        'stars_pattern': r'([0-9,]+)\s+von 5',
+    },
+    'amazon.fr': {
+        'accept_language': 'fr-FR,fr;q=0.9,en;q=0.5',
+        'currency': 'EUR',
+        'decimal': ',',
+        'rank_keywords': ['Classement des meilleures ventes'],
+        # Thousands are grouped with (narrow) no-break spaces: "1 234 en Cuisine"
+        'rank_pattern': r'(\d[\d\s\u00a0\u202f.]*)\s+en\s',
+        'date_keywords': ['Date de mise en ligne sur Amazon.fr'],
+        'stars_pattern': r'([0-9,]+)\s+sur 5',
+    },
+    'amazon.it': {
+        'accept_language': 'it-IT,it;q=0.9,en;q=0.5',
+        'currency': 'EUR',
+        'decimal': ',',
+        'rank_keywords': ['Posizione nella classifica Bestseller di Amazon'],
+        'rank_pattern': r'n\.\s*(\d[\d.]*)',
+        'date_keywords': ['Disponibile su Amazon.it a partire dal'],
+        'stars_pattern': r'([0-9,]+)\s+su 5',
+    },
+    'amazon.es': {
+        'accept_language': 'es-ES,es;q=0.9,en;q=0.5',
+        'currency': 'EUR',
+        'decimal': ',',
+        'rank_keywords': ['Clasificación en los más vendidos de Amazon'],
+        'rank_pattern': r'n\.?º\s*(\d[\d.]*)',
+        'date_keywords': ['Producto en Amazon.es desde'],
+        'stars_pattern': r'([0-9,]+)\s+de 5',
+    },
+    'amazon.co.jp': {
+        'accept_language': 'ja-JP,ja;q=0.9,en;q=0.5',
+        'currency': 'JPY',
+        'decimal': '.',
+        'rank_keywords': ['Amazon 売れ筋ランキング', '売れ筋ランキング'],
+        'rank_pattern': r'(\d[\d,]*)\s*位',
+        'date_keywords': ['Amazon.co.jp での取り扱い開始日', '発売日'],
+        'stars_pattern': r'5つ星のうち\s*([0-9.]+)',
+    },
+}
+
+# Currency symbols and codes found in price texts, matched as whole tokens (longest first, so
+# "US$" is not read as "S$"); '$' alone is left to the marketplace's currency
+CURRENCY_SYMBOLS = [
+    ('US$', 'USD'), ('CDN$', 'CAD'), ('C$', 'CAD'), ('AU$', 'AUD'), ('A$', 'AUD'), ('R$', 'BRL'),
+    ('S$', 'SGD'), ('MX$', 'MXN'),
+    ('£', 'GBP'), ('€', 'EUR'), ('￥', 'JPY'), ('¥', 'JPY'), ('₹', 'INR'), ('zł', 'PLN'),
+    ('kr', 'SEK'), ('TL', 'TRY'), ('AED', 'AED'), ('SAR', 'SAR'), ('EGP', 'EGP'),
+    ('USD', 'USD'), ('EUR', 'EUR'), ('GBP', 'GBP'), ('JPY', 'JPY'), ('CAD', 'CAD'), ('INR', 'INR'),
+]
+
+# "Page not found" detection keywords (matched against lower-cased page text, every marketplace)
+NOT_FOUND_KEYWORDS = [
+    "sorry! we couldn't find that page",
+    'page not found',
+    'seite wurde nicht gefunden',
+    'page introuvable',
+    'pagina non trovata',
+    'página no encontrada',
+    'ページが見つかりません',
+]
 
 # Captcha detection keywords
 CAPTCHA_KEYWORDS = [
@@ -22,6 +144,14 @@ CAPTCHA_KEYWORDS = [
     'sorry there was a problem with your request',
     'continue shopping',
     'click the button below to continue shopping',
+    'geben sie die zeichen unten ein',
+    'saisissez les caractères',
+    'inserisci i caratteri',
+    'introduce los caracteres',
+    '表示されている文字を入力してください',
 ]
 
-
+# Streamed downloads: stop once these regions (element ids) have been received in full,
+# or once a section that follows them on the page (end marker) arrives
+STREAM_REGIONS = ['prodDetails', 'detailBulletsWrapper_feature_div']
+STREAM_END_MARKERS = ['id="reviewsMedley"', 'id="customerReviews"']
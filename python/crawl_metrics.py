@@ -0,0 +1,213 @@
+"""
+In-process crawl metrics: histograms, counters and gauges.
+
+The crawler records into one CrawlMetrics registry on its hot paths; an
+observation is a bisect and a few additions under a lock. The registry can
+be read two ways:
+
+- summary(): what changed since the previous summary (count, mean, p50 and
+  p95 estimated from the buckets per stage, counter deltas, current gauges),
+  sent periodically as a `metrics` crawl event
+- render_prometheus(): the cumulative state in the Prometheus text exposition
+  format (version 0.0.4), served by the daemon's `metrics` method and the
+  server's /metrics endpoint
+
+Stage histograms (seconds, label `stage`): dns, connect, tls, ttfb, download
+(one HTTP request; dns/connect/tls only for new connections), fetch (a whole
+fetch including user-agent retries), parse and db_write (one committed batch).
+Parse time is also broken down per field group (label `group`).
+"""
+
+import threading
+from bisect import bisect_left
+
+# Upper bounds in seconds; parse groups take well under a millisecond, page fetches seconds
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+           1.0, 2.5, 5.0, 10.0, 30.0)
+
+HISTOGRAMS = {
+    'crawl_stage_seconds': ('stage', 'Time spent per crawl stage'),
+    'crawl_parse_group_seconds': ('group', 'Parse time per product field group'),
+}
+COUNTERS = {
+    'crawl_pages_total': ('result', 'Fetched pages by result (product, unchanged, not_found, captcha, error)'),
+    'crawl_retries_total': ('kind', 'URLs scheduled for a retry, by failure class'),
+    'crawl_failures_total': ('kind', 'URLs given up on, by failure class'),
+    'crawl_downloaded_bytes_total': (None, 'Response body bytes downloaded'),
+    'crawl_db_rows_total': (None, 'Product and job rows committed'),
+    'crawl_sleep_seconds_total': ('reason', 'Deliberate sleeps: token bucket waits (rate_limit) and retry backoff (retry_wait)'),
+}
+GAUGES = {
+    'crawl_queue_depth': (None, 'URLs waiting in the crawl queue, delayed retries included'),
+    'crawl_queue_delayed': (None, 'URLs waiting for a retry backoff or a captcha cooldown'),
+    'crawl_in_flight': (None, 'Fetches in progress'),
+    'crawl_host_rate': ('host', 'Current token bucket rate per host (requests/second)'),
+    'crawl_host_captcha_ratio': ('host', 'Share of captcha answers among the recent responses per host'),
+}
+
+
+class Histogram:
+    """Bucket counts for one label value; `counts[i]` holds observations <= BUCKETS[i] (the last slot is +Inf)."""
+
+    __slots__ = ('counts', 'sum')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect_left(BUCKETS, seconds)] += 1
+        self.sum += seconds
+
+    def copy(self):
+        other = Histogram()
+        other.counts = list(self.counts)
+        other.sum = self.sum
+        return other
+
+    def minus(self, earlier):
+        other = Histogram()
+        other.counts = [a - b for a, b in zip(self.counts, earlier.counts)]
+        other.sum = self.sum - earlier.sum
+        return other
+
+    @property
+    def count(self):
+        return sum(self.counts)
+
+    def quantile(self, q):
+        """Estimate of the q-quantile, interpolated linearly inside its bucket (seconds)."""
+        total = self.count
+        if not total:
+            return None
+        rank = q * total
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                lower = BUCKETS[i - 1] if i else 0.0
+                upper = BUCKETS[i] if i < len(BUCKETS) else BUCKETS[-1]
+                return lower + (upper - lower) * (rank - seen) / n
+            seen += n
+        return BUCKETS[-1]
+
+
+class CrawlMetrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {name: {} for name in HISTOGRAMS}
+        self.counters = {name: {} for name in COUNTERS}
+        self.gauges = {name: {} for name in GAUGES}
+        # Collected on read: callables returning {label value or None: value} per gauge name
+        self.collectors = {}
+        self._previous = ({}, {})
+
+    def observe(self, name, label, seconds):
+        with self.lock:
+            histogram = self.histograms[name].get(label)
+            if histogram is None:
+                histogram = self.histograms[name][label] = Histogram()
+            histogram.observe(seconds)
+
+    def observe_ms(self, name, label, ms):
+        if ms is not None:
+            self.observe(name, label, ms / 1000.0)
+
+    def inc(self, name, label=None, amount=1):
+        with self.lock:
+            values = self.counters[name]
+            values[label] = values.get(label, 0) + amount
+
+    def set(self, name, value, label=None):
+        with self.lock:
+            self.gauges[name][label] = value
+
+    def collect(self, name, collector):
+        """Read gauge `name` from `collector()` whenever the metrics are read."""
+        self.collectors[name] = collector
+
+    def _gauges(self):
+        gauges = {name: dict(values) for name, values in self.gauges.items()}
+        for name, collector in self.collectors.items():
+            try:
+                gauges[name] = dict(collector())
+            except Exception:
+                pass
+        return gauges
+
+    def summary(self):
+        """Per-stage latency and counter changes since the previous call, plus current gauges (ms)."""
+        with self.lock:
+            histograms = {name: {label: h.copy() for label, h in values.items()}
+                          for name, values in self.histograms.items()}
+            counters = {name: dict(values) for name, values in self.counters.items()}
+            previous_histograms, previous_counters = self._previous
+            self._previous = (histograms, counters)
+        result = {}
+        for name, values in histograms.items():
+            stages = {}
+            for label, histogram in sorted(values.items()):
+                earlier = previous_histograms.get(name, {}).get(label)
+                delta = histogram.minus(earlier) if earlier else histogram
+                if delta.count:
+                    stages[label] = {
+                        'count': delta.count,
+                        'mean_ms': round(delta.sum * 1000 / delta.count, 2),
+                        'p50_ms': round(delta.quantile(0.5) * 1000, 2),
+                        'p95_ms': round(delta.quantile(0.95) * 1000, 2),
+                        'total_ms': round(delta.sum * 1000, 1),
+                    }
+            result[name.replace('crawl_', '').replace('_seconds', '')] = stages
+        for name, values in counters.items():
+            earlier = previous_counters.get(name, {})
+            changes = {}
+            for label, value in values.items():
+                if value != earlier.get(label, 0):
+                    delta = value - earlier.get(label, 0)
+                    changes[label or 'total'] = round(delta, 3) if isinstance(delta, float) else delta
+            result[name.replace('crawl_', '').replace('_total', '')] = changes
+        for name, values in self._gauges().items():
+            key = name.replace('crawl_', '')
+            if set(values) <= {None}:
+                result[key] = values.get(None)
+            else:
+                result[key] = {label: round(value, 3) for label, value in values.items() if value is not None}
+        return result
+
+    def render_prometheus(self):
+        """Cumulative metrics in the Prometheus text exposition format."""
+        with self.lock:
+            histograms = {name: {label: h.copy() for label, h in values.items()}
+                          for name, values in self.histograms.items()}
+            counters = {name: dict(values) for name, values in self.counters.items()}
+        lines = []
+        for name, (label_name, help_text) in HISTOGRAMS.items():
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+            for label, histogram in sorted(histograms[name].items()):
+                labels = f'{label_name}="{_escape(label)}"'
+                cumulative = 0
+                for bound, n in zip(BUCKETS, histogram.counts):
+                    cumulative += n
+                    lines.append(f'{name}_bucket{{{labels},le="{bound:g}"}} {cumulative}')
+                lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+                lines.append(f'{name}_sum{{{labels}}} {histogram.sum:.6f}')
+                lines.append(f'{name}_count{{{labels}}} {histogram.count}')
+        for name, (label_name, help_text) in COUNTERS.items():
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+            values = (counters[name] or {None: 0}) if label_name is None else counters[name]
+            for label, value in sorted(values.items(), key=lambda kv: kv[0] or ''):
+                lines.append(f'{name}{_labels(label_name, label)} {value}')
+        gauges = self._gauges()
+        for name, (label_name, help_text) in GAUGES.items():
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} gauge']
+            for label, value in sorted(gauges.get(name, {}).items(), key=lambda kv: kv[0] or ''):
+                if value is not None:
+                    lines.append(f'{name}{_labels(label_name, label)} {value:g}')
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(label_name, label):
+    return f'{{{label_name}="{_escape(label)}"}}' if label_name and label is not None else ''
@@ -0,0 +1,127 @@
+"""
+Per-run CPU profile for `crawl_and_update_fixed.py --profile` (or CRAWL_PROFILE=1).
+
+Every crawl run (a CLI crawl, a --due tick, a resume or a daemon job) is
+profiled with cProfile from its first queued URL to the final flush. The
+async engine's fetch threads get a profile each, merged into the run's when
+it ends; multi-process workers are not profiled (use --workers 1).
+
+Per run, CRAWL_PROFILE_DIR (default data/profiles) receives:
+
+- crawl-run<id>-<time>.prof: pstats data, for `python -m pstats`, snakeviz or
+  flameprof (flame graph SVG)
+- crawl-run<id>-<time>.txt: the summary printed at the end of the run
+
+The summary splits the run's wall time into CPU time, deliberate sleeps
+(token bucket waits and retry backoff, from the crawl_sleep_seconds_total
+counter) and the rest, which is mostly waiting on the network and SQLite,
+then lists the top CRAWL_PROFILE_TOP functions by own time and by
+cumulative time. With concurrent fetches sleeps overlap, so their sum can
+exceed the wall time.
+"""
+
+import cProfile
+import io
+import os
+import pstats
+import threading
+import time
+
+
+class RunProfiler:
+    def __init__(self, out_dir, top=25):
+        self.out_dir = out_dir
+        self.top = top
+        self.lock = threading.Lock()
+        self.profile = None
+        self.thread_profiles = []
+        self.local = threading.local()
+        self.started = None
+        self.cpu_started = None
+        self.sleep_started = {}
+
+    def start(self, sleep_seconds=None):
+        """Profile the calling thread from now on. `sleep_seconds` are the sleep counters at the start."""
+        self.sleep_started = dict(sleep_seconds or {})
+        self.started = time.perf_counter()
+        self.cpu_started = time.process_time()
+        self.profile = cProfile.Profile()
+        self.profile.enable()
+
+    def wrap(self, fn):
+        """`fn` profiled on whatever thread runs it (one profile per thread, merged at the end)."""
+        def profiled(*args, **kwargs):
+            profile = getattr(self.local, 'profile', None)
+            if profile is None:
+                profile = self.local.profile = cProfile.Profile()
+                with self.lock:
+                    self.thread_profiles.append(profile)
+            try:
+                profile.enable()
+            except ValueError:
+                # Another profiler is active on this thread (or, on 3.12+, in the process)
+                return fn(*args, **kwargs)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                profile.disable()
+        return profiled
+
+    def stop(self, run_id=None, sleep_seconds=None):
+        """Stop profiling, write the .prof and summary files and return the summary text."""
+        self.profile.disable()
+        wall = time.perf_counter() - self.started
+        cpu = time.process_time() - self.cpu_started
+        sleeps = {reason: seconds - self.sleep_started.get(reason, 0.0)
+                  for reason, seconds in (sleep_seconds or {}).items()}
+        sleeps = {reason: seconds for reason, seconds in sleeps.items() if seconds > 0}
+
+        stats = pstats.Stats(self.profile)
+        with self.lock:
+            thread_profiles, self.thread_profiles = self.thread_profiles, []
+        for profile in thread_profiles:
+            try:
+                stats.add(profile)
+            except TypeError:
+                # A thread that never got to run a profiled call has no data
+                pass
+        self.local = threading.local()
+
+        base = os.path.join(self.out_dir, f"crawl-run{run_id if run_id is not None else ''}-"
+                                          f"{time.strftime('%Y%m%d-%H%M%S')}")
+        summary = self.summary(stats, wall, cpu, sleeps)
+        try:
+            os.makedirs(self.out_dir, exist_ok=True)
+            stats.dump_stats(base + '.prof')
+            with open(base + '.txt', 'w', encoding='utf-8') as f:
+                f.write(summary)
+            summary += f"Profile written to {base}.prof\n"
+        except OSError as e:
+            summary += f"Profile not written ({self.out_dir}): {e}\n"
+        return summary
+
+    def summary(self, stats, wall, cpu, sleeps):
+        slept = sum(sleeps.values())
+        lines = [
+            f"Crawl profile: {wall:.2f} s wall, {cpu:.2f} s CPU ({_share(cpu, wall)}), "
+            f"{slept:.2f} s deliberate sleep ({_share(slept, wall)})",
+        ]
+        if sleeps:
+            lines.append('  Sleeps: ' + ', '.join(f"{reason} {seconds:.2f} s"
+                                                 for reason, seconds in sorted(sleeps.items())))
+        if slept <= wall:
+            lines.append(f"  Other waiting (network, SQLite, idle): {max(0.0, wall - cpu - slept):.2f} s")
+        for sort, title in (('tottime', 'own time'), ('cumtime', 'cumulative time')):
+            out = io.StringIO()
+            stats.stream = out
+            stats.sort_stats(sort).print_stats(self.top)
+            # Drop pstats' preamble; keep the column header and the rows
+            body = out.getvalue().splitlines()
+            start = next((n for n, line in enumerate(body) if line.lstrip().startswith('ncalls')), 0)
+            lines.append(f"  Top {self.top} functions by {title}:")
+            lines.extend('  ' + line for line in body[start:] if line.strip())
+        return '\n'.join(lines) + '\n'
+
+
+def _share(part, whole):
+    return f"{part / whole:.0%}" if whole > 0 else 'n/a'
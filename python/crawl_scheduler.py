@@ -0,0 +1,187 @@
+"""
+Adaptive per-ASIN crawl scheduling.
+
+Each tracked product, a (marketplace, ASIN) pair, has a row in
+`crawl_schedule` with its own interval and `next_due_at`. A tick crawls only
+the products that are due, most overdue first, capped by the hourly crawl
+budget. After a crawl the interval is recomputed from the product's recent
+rank_history volatility:
+
+- volatile ASINs are re-crawled sooner, down to SCHEDULE_MIN_MINUTES
+- ASINs whose rank did not move back off by 1.5x, up to SCHEDULE_MAX_MINUTES
+"""
+
+import json
+import os
+
+
+class CrawlScheduler:
+    # Relative rank change that halves the base interval
+    VOLATILITY_WEIGHT = 10.0
+    BACKOFF = 1.5
+    HISTORY_POINTS = 6
+    LOOKBACK = '-7 days'
+
+    def __init__(self, db_manager, tick_minutes: float = 15):
+        self.db = db_manager
+        self.tick_minutes = tick_minutes
+        try:
+            self.budget_per_hour = max(1, int(os.environ.get('CRAWL_BUDGET_PER_HOUR', '600')))
+        except Exception:
+            self.budget_per_hour = 600
+        try:
+            self.min_minutes = max(1.0, float(os.environ.get('SCHEDULE_MIN_MINUTES', '30')))
+        except Exception:
+            self.min_minutes = 30.0
+        try:
+            self.max_minutes = max(self.min_minutes, float(os.environ.get('SCHEDULE_MAX_MINUTES', str(7 * 24 * 60))))
+        except Exception:
+            self.max_minutes = 7 * 24 * 60.0
+
+    def base_minutes(self):
+        """The configured crawl interval (settings.crawl_interval, hours) is the starting interval."""
+        self.db.connect()
+        self.db.cursor.execute("SELECT value FROM settings WHERE key = 'crawl_interval'")
+        row = self.db.cursor.fetchone()
+        try:
+            return self._clamp(float(row[0]) * 60)
+        except Exception:
+            return self._clamp(120.0)
+
+    def tick_budget(self):
+        return max(1, int(self.budget_per_hour * self.tick_minutes / 60.0))
+
+    def now(self):
+        self.db.connect()
+        self.db.cursor.execute("SELECT datetime('now')")
+        return self.db.cursor.fetchone()[0]
+
+    def sync_from_url_lists(self, url_key):
+        """Track exactly the products of the latest url_lists row and of tracked_asins; new ones are due immediately.
+
+        `url_key` maps a URL to its (marketplace, ASIN) key, or None.
+
+        Imported lists can be very large, so tracked_asins is synced in SQL
+        and never loaded into memory, and the sync is skipped while neither
+        source has changed since the last one.
+        """
+        self.db.connect()
+        self.db.cursor.execute('SELECT id, urls FROM url_lists ORDER BY created_at DESC, id DESC LIMIT 1')
+        row = self.db.cursor.fetchone()
+        self.db.cursor.execute('SELECT MAX(id), COUNT(*) FROM tracked_asins')
+        signature = json.dumps([row[0] if row else None, *self.db.cursor.fetchone()])
+        self.db.cursor.execute("SELECT value FROM settings WHERE key = 'schedule_synced'")
+        synced = self.db.cursor.fetchone()
+        if synced and synced[0] == signature:
+            self.db.cursor.execute('SELECT COUNT(*) FROM crawl_schedule')
+            return self.db.cursor.fetchone()[0]
+
+        urls = json.loads(row[1]) if row else []
+        listed = {}
+        for url in urls:
+            key = url_key(url)
+            if key and key not in listed:
+                listed[key] = url
+
+        base = self.base_minutes()
+        with self.db.conn:
+            self.db.cursor.execute(
+                '''CREATE TEMP TABLE IF NOT EXISTS listed_products (
+                       marketplace TEXT NOT NULL, asin TEXT NOT NULL, url TEXT NOT NULL, PRIMARY KEY (marketplace, asin))'''
+            )
+            self.db.cursor.execute('DELETE FROM listed_products')
+            self.db.cursor.executemany('INSERT INTO listed_products (marketplace, asin, url) VALUES (?, ?, ?)',
+                                       [(market, asin, url) for (market, asin), url in listed.items()])
+            self.db.cursor.execute(
+                '''INSERT OR IGNORE INTO crawl_schedule (marketplace, asin, url, interval_minutes)
+                   SELECT marketplace, asin, url, ? FROM listed_products''',
+                (base,),
+            )
+            self.db.cursor.execute(
+                '''INSERT OR IGNORE INTO crawl_schedule (marketplace, asin, url, interval_minutes)
+                   SELECT marketplace, asin, url, ? FROM tracked_asins t
+                   WHERE NOT EXISTS (SELECT 1 FROM crawl_schedule s WHERE s.marketplace = t.marketplace AND s.asin = t.asin)''',
+                (base,),
+            )
+            self.db.cursor.execute(
+                '''DELETE FROM crawl_schedule
+                   WHERE (marketplace, asin) NOT IN (SELECT marketplace, asin FROM listed_products)
+                     AND (marketplace, asin) NOT IN (SELECT marketplace, asin FROM tracked_asins)'''
+            )
+            self.db.cursor.execute(
+                "INSERT OR REPLACE INTO settings (key, value, updated_at) VALUES ('schedule_synced', ?, CURRENT_TIMESTAMP)",
+                (signature,),
+            )
+            self.db.cursor.execute('SELECT COUNT(*) FROM crawl_schedule')
+            return self.db.cursor.fetchone()[0]
+
+    def due_urls(self, limit=None):
+        """URLs due now, most overdue first, at most one tick's budget."""
+        self.db.connect()
+        self.db.cursor.execute(
+            "SELECT url FROM crawl_schedule WHERE next_due_at <= datetime('now') ORDER BY next_due_at LIMIT ?",
+            (limit or self.tick_budget(),),
+        )
+        return [r[0] for r in self.db.cursor.fetchall()]
+
+    def volatility(self, marketplace: str, asin: str):
+        """Mean relative rank change between consecutive recent history points."""
+        self.db.cursor.execute(
+            '''SELECT rank FROM rank_history
+               WHERE marketplace = ? AND asin = ? AND recorded_at >= datetime('now', ?)
+               ORDER BY recorded_at DESC, id DESC LIMIT ?''',
+            (marketplace, asin, self.LOOKBACK, self.HISTORY_POINTS),
+        )
+        ranks = [r[0] for r in self.db.cursor.fetchall() if r[0]]
+        if len(ranks) < 2:
+            return 0.0
+        changes = [abs(a - b) / float(b) for a, b in zip(ranks, ranks[1:])]
+        return sum(changes) / len(changes)
+
+    def reschedule(self, urls, succeeded, run_started_at, url_key):
+        """Set the next due time of every crawled URL.
+
+        `succeeded` holds URLs that were crawled (updated or unchanged); the
+        rest are retried after the minimum interval.
+        """
+        self.db.connect()
+        base = self.base_minutes()
+        updates = []
+        for url in urls:
+            key = url_key(url)
+            if not key:
+                continue
+            self.db.cursor.execute('SELECT interval_minutes FROM crawl_schedule WHERE marketplace = ? AND asin = ?', key)
+            row = self.db.cursor.fetchone()
+            if not row:
+                continue
+            if url not in succeeded:
+                updates.append((row[0], None, self.min_minutes, *key))
+                continue
+            volatility = self.volatility(*key)
+            target = base / (1.0 + self.VOLATILITY_WEIGHT * volatility)
+            # Rank moved in this run (the first point of a new product does not count)
+            self.db.cursor.execute(
+                'SELECT SUM(recorded_at >= ?), COUNT(*) FROM rank_history WHERE marketplace = ? AND asin = ?',
+                (run_started_at, *key),
+            )
+            new_points, all_points = self.db.cursor.fetchone()
+            if new_points and all_points > 1:
+                interval = min(target, row[0] / self.BACKOFF)
+            else:
+                interval = max(target, row[0] * self.BACKOFF)
+            interval = self._clamp(interval)
+            updates.append((interval, volatility, interval, *key))
+
+        with self.db.conn:
+            self.db.cursor.executemany(
+                '''UPDATE crawl_schedule SET interval_minutes = ?, volatility = COALESCE(?, volatility),
+                       next_due_at = datetime('now', '+' || CAST(? AS INTEGER) || ' minutes'),
+                       last_crawled_at = CURRENT_TIMESTAMP
+                   WHERE marketplace = ? AND asin = ?''',
+                updates,
+            )
+        return len(updates)
+
+    def _clamp(self, minutes):
+        return max(self.min_minutes, min(self.max_minutes, minutes))
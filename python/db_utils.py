@@ -1,58 +1,228 @@
 import os
+import socket
 import sqlite3
+import time
+
+from amazon_urls import canonicalize
+from crawl_locators import DEFAULT_MARKETPLACE
 
 
 class DatabaseManager:
-    def __init__(self, db_path: str):
+    """SQLite access for the crawler over one long-lived connection.
+
+    Product writes can be queued with `queue_product_write` and are committed
+    in a single transaction once `batch_size` products are pending or
+    `flush_interval` seconds have passed since the last flush.
+    """
+
+    def __init__(self, db_path: str, batch_size: int = 1, flush_interval: float = 2.0):
         self.db_path = db_path
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.conn = None
+        self.cursor = None
+        self._pending = []
+        self._last_flush = time.monotonic()
         os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
 
     def connect(self):
-        self.conn = sqlite3.connect(self.db_path)
+        if self.conn is None:
+            self.conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+            # WAL lets the Node app read while the crawler writes; NORMAL sync is safe under WAL
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.execute('PRAGMA synchronous=NORMAL')
+            self.conn.execute('PRAGMA temp_store=MEMORY')
+            self.conn.execute('PRAGMA cache_size=-16000')
+            self.conn.execute('PRAGMA busy_timeout=30000')
         self.cursor = self.conn.cursor()
+        return self.conn
 
     def close(self):
         try:
-            if hasattr(self, 'conn'):
+            self.flush()
+        except Exception:
+            pass
+        try:
+            if self.conn is not None:
                 self.conn.close()
         except Exception:
             pass
+        self.conn = None
+        self.cursor = None
 
-    def init_tables(self):
-        self.connect()
-        # products
-        self.cursor.execute(
-            """
-            CREATE TABLE IF NOT EXISTS products (
+    # Tables keyed by (marketplace, asin): an ASIN is a separate product, rank and page on every
+    # marketplace. `{table}` is filled in so _rekey_by_marketplace can build a table next to the old one.
+    _KEYED_SCHEMAS = {
+        'products': """
+            CREATE TABLE IF NOT EXISTS {table} (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 name TEXT NOT NULL,
                 price REAL,
                 rank INTEGER,
-                asin TEXT UNIQUE,
+                asin TEXT,
                 brand TEXT,
                 ratings TEXT,
                 stars TEXT,
                 image_url TEXT,
                 date TEXT,
                 url TEXT,
+                prev_rank INTEGER,
+                crawl_count INTEGER DEFAULT 1,
                 created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                marketplace TEXT NOT NULL DEFAULT 'amazon.com',
+                currency TEXT,
+                UNIQUE (marketplace, asin)
             )
-            """
-        )
-
-        # rank_history
-        self.cursor.execute(
-            """
-            CREATE TABLE IF NOT EXISTS rank_history (
+            """,
+        'rank_history': """
+            CREATE TABLE IF NOT EXISTS {table} (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
+                marketplace TEXT NOT NULL DEFAULT 'amazon.com',
                 asin TEXT NOT NULL,
                 rank INTEGER NOT NULL,
                 price REAL,
                 recorded_at DATETIME DEFAULT CURRENT_TIMESTAMP
             )
+            """,
+        # Rollups of raw history past its retention (see compact_rank_history)
+        **{
+            rollup: """
+                CREATE TABLE IF NOT EXISTS {table} (
+                    marketplace TEXT NOT NULL DEFAULT 'amazon.com',
+                    asin TEXT NOT NULL,
+                    bucket_start DATETIME NOT NULL,
+                    min_rank INTEGER,
+                    max_rank INTEGER,
+                    avg_rank REAL,
+                    samples INTEGER NOT NULL,
+                    min_price REAL,
+                    max_price REAL,
+                    avg_price REAL,
+                    price_samples INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (marketplace, asin, bucket_start)
+                )
+                """
+            for rollup in ('rank_history_hourly', 'rank_history_daily')
+        },
+        # product_trends: latest ranks and trend per product, updated with every history point
+        'product_trends': """
+            CREATE TABLE IF NOT EXISTS {table} (
+                marketplace TEXT NOT NULL DEFAULT 'amazon.com',
+                asin TEXT NOT NULL,
+                last_rank INTEGER NOT NULL,
+                prev_rank INTEGER,
+                rank_change_percent REAL,
+                rank_trend TEXT NOT NULL DEFAULT 'new',
+                rank_history TEXT,
+                updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (marketplace, asin)
+            ) WITHOUT ROWID
+            """,
+        # page_cache: change-detection validators and fingerprints per product
+        'page_cache': """
+            CREATE TABLE IF NOT EXISTS {table} (
+                marketplace TEXT NOT NULL DEFAULT 'amazon.com',
+                asin TEXT NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                body_hash TEXT,
+                fields_hash TEXT,
+                checked_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (marketplace, asin)
+            )
+            """,
+        # crawl_schedule: adaptive per-product crawl intervals (see crawl_scheduler.py)
+        'crawl_schedule': """
+            CREATE TABLE IF NOT EXISTS {table} (
+                marketplace TEXT NOT NULL DEFAULT 'amazon.com',
+                asin TEXT NOT NULL,
+                url TEXT NOT NULL,
+                interval_minutes REAL NOT NULL,
+                volatility REAL DEFAULT 0,
+                next_due_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                last_crawled_at DATETIME,
+                PRIMARY KEY (marketplace, asin)
+            )
+            """,
+    }
+
+    def init_tables(self):
+        self.connect()
+        # products
+        self.cursor.execute(self._KEYED_SCHEMAS['products'].format(table='products'))
+        # Columns used by upsert_product on databases created before they existed
+        self._ensure_column('products', 'prev_rank', 'INTEGER')
+        self._ensure_column('products', 'crawl_count', 'INTEGER DEFAULT 1')
+        # Marketplace of the product URL; with asin it is the product's key
+        self._ensure_column('products', 'marketplace', 'TEXT')
+        self.cursor.execute('SELECT id, url FROM products WHERE marketplace IS NULL AND url IS NOT NULL')
+        backfill = [(self._marketplace(url), product_id) for product_id, url in self.cursor.fetchall()]
+        self.cursor.executemany('UPDATE products SET marketplace = ? WHERE id = ?', backfill)
+        # ISO code of the price, which is stored as a plain decimal in the marketplace's currency
+        self._ensure_column('products', 'currency', 'TEXT')
+        self.conn.commit()
+        self._rekey_by_marketplace()
+
+        for table in ('rank_history', 'rank_history_hourly', 'rank_history_daily', 'product_trends', 'page_cache',
+                      'crawl_schedule'):
+            self.cursor.execute(self._KEYED_SCHEMAS[table].format(table=table))
+        # Range queries per product are served from this index alone
+        self.cursor.execute(
+            'CREATE INDEX IF NOT EXISTS idx_rank_history_key_time '
+            'ON rank_history(marketplace, asin, recorded_at, rank, price)'
+        )
+
+        # Product listing orders (the API's keyset pagination walks these indexes)
+        for index in (
+            'idx_products_rank_name ON products(rank, name)',
+            'idx_products_name ON products(name)',
+            'idx_products_updated ON products(updated_at)',
+            'idx_products_brand_rank ON products(brand, rank, name)',
+            'idx_product_trends_change ON product_trends(rank_change_percent)',
+            'idx_crawl_schedule_due ON crawl_schedule(next_due_at)',
+        ):
+            self.cursor.execute(f'CREATE INDEX IF NOT EXISTS {index}')
+        self.cursor.execute(
+            'SELECT EXISTS(SELECT 1 FROM product_trends), EXISTS(SELECT 1 FROM rank_history)'
+        )
+        if self.cursor.fetchone() == (0, 1):
+            # History recorded before the table existed
+            self._rebuild_product_trends(self.cursor)
+
+        # crawl_runs / crawl_jobs: durable crawl queue with checkpoints (resumable)
+        self.cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS crawl_runs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                status TEXT NOT NULL DEFAULT 'running',
+                total INTEGER NOT NULL,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                heartbeat_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                finished_at DATETIME,
+                owner_host TEXT,
+                owner_pid INTEGER
+            )
             """
         )
+        # Process crawling the run, so a restarted server can tell an orphaned run from a live one
+        self._ensure_column('crawl_runs', 'owner_host', 'TEXT')
+        self._ensure_column('crawl_runs', 'owner_pid', 'INTEGER')
+        self.cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS crawl_jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                run_id INTEGER NOT NULL,
+                url TEXT NOT NULL,
+                state TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT,
+                updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                UNIQUE (run_id, url)
+            )
+            """
+        )
+        self.cursor.execute('CREATE INDEX IF NOT EXISTS idx_crawl_jobs_run_state ON crawl_jobs(run_id, state)')
 
         # url_lists
         self.cursor.execute(
@@ -65,6 +235,22 @@ class DatabaseManager:
             """
         )
 
+        # tracked_asins: bulk-imported ASIN lists, one row per (marketplace, ASIN) (see asin_import.py)
+        self.cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS tracked_asins (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                marketplace TEXT NOT NULL,
+                asin TEXT NOT NULL,
+                url TEXT NOT NULL,
+                tags TEXT,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                UNIQUE (marketplace, asin)
+            )
+            """
+        )
+
         # settings
         self.cursor.execute(
             """
@@ -83,89 +269,544 @@ class DatabaseManager:
             INSERT OR IGNORE INTO settings (key, value) VALUES ('crawl_interval', '2')
             """
         )
+        # Bumped with every product write; the API's listing caches key on it
+        self.cursor.execute("INSERT OR IGNORE INTO settings (key, value) VALUES ('data_version', '0')")
 
         self.conn.commit()
-        self.close()
+
+    def _ensure_column(self, table: str, column: str, decl: str):
+        self.cursor.execute(f'PRAGMA table_info({table})')
+        if column not in [row[1] for row in self.cursor.fetchall()]:
+            self.cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {decl}')
+
+    def _columns(self, table: str):
+        self.cursor.execute(f'PRAGMA table_info({table})')
+        return [row[1] for row in self.cursor.fetchall()]
+
+    def _rekey_by_marketplace(self):
+        """Move the tables of older databases, keyed by ASIN alone, to (marketplace, asin) keys.
+
+        Products keep the marketplace of their URL; history, trend and cache
+        rows take their product's, or amazon.com without one. Runs in one
+        transaction; the server (src/config/database.js) does the same for the
+        tables it reads, whichever of the two opens the database first.
+        """
+        self.conn.create_function('url_marketplace', 1, self._marketplace, deterministic=True)
+        self.cursor.execute('BEGIN IMMEDIATE')
+        try:
+            stale = [table for table in self._KEYED_SCHEMAS
+                     if self._columns(table) and 'marketplace' not in self._columns(table)]
+            self.cursor.execute('PRAGMA index_list(products)')
+            if any(unique and self._index_columns(index) == ['asin'] for _, index, unique, *_ in self.cursor.fetchall()):
+                stale.insert(0, 'products')
+            if stale:
+                # Old products are unique by ASIN: one marketplace per ASIN, looked up through the primary key
+                self.cursor.execute(
+                    'CREATE TEMP TABLE rekey_marketplaces (asin TEXT PRIMARY KEY, marketplace TEXT NOT NULL)'
+                )
+                self.cursor.execute(
+                    """INSERT OR IGNORE INTO rekey_marketplaces (asin, marketplace)
+                       SELECT asin, COALESCE(marketplace, url_marketplace(url), 'amazon.com') FROM products
+                       WHERE asin IS NOT NULL"""
+                )
+                product_marketplace = ("COALESCE((SELECT m.marketplace FROM temp.rekey_marketplaces m "
+                                       "WHERE m.asin = o.asin), 'amazon.com')")
+                for table in stale:
+                    if table == 'products':
+                        marketplace_sql = "COALESCE(marketplace, url_marketplace(url), 'amazon.com')"
+                    elif table == 'crawl_schedule':
+                        marketplace_sql = "COALESCE(url_marketplace(url), 'amazon.com')"
+                    else:
+                        marketplace_sql = product_marketplace
+                    self._rebuild_keyed(table, marketplace_sql)
+                self.cursor.execute('DROP TABLE temp.rekey_marketplaces')
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+
+    def _index_columns(self, index: str):
+        self.cursor.execute(f'PRAGMA index_info({index})')
+        return [row[2] for row in self.cursor.fetchall()]
+
+    def _rebuild_keyed(self, table: str, marketplace_sql: str):
+        """Copy `table` into its _KEYED_SCHEMAS form; `marketplace_sql` (over the old rows, alias o) fills the key."""
+        old_columns = [column for column in self._columns(table) if column != 'marketplace']
+        self.cursor.execute(self._KEYED_SCHEMAS[table].format(table=f'{table}_rekeyed'))
+        new_columns = set(self._columns(f'{table}_rekeyed'))
+        columns = ', '.join(column for column in old_columns if column in new_columns)
+        self.cursor.execute(
+            f'''INSERT OR IGNORE INTO {table}_rekeyed (marketplace, {columns})
+                SELECT {marketplace_sql}, {columns} FROM {table} o'''
+        )
+        self.cursor.execute(f'DROP TABLE {table}')
+        self.cursor.execute(f'ALTER TABLE {table}_rekeyed RENAME TO {table}')
 
     # Query helpers
-    def get_product_by_asin(self, asin: str):
+    def get_product_by_asin(self, asin: str, marketplace: str = DEFAULT_MARKETPLACE):
         self.connect()
-        self.cursor.execute('SELECT id, rank FROM products WHERE asin = ?', (asin,))
-        row = self.cursor.fetchone()
-        self.close()
-        return row
+        self.cursor.execute('SELECT id, rank FROM products WHERE marketplace = ? AND asin = ?', (marketplace, asin))
+        return self.cursor.fetchone()
+
+    def rank_series(self, marketplace: str, asin: str, start=None, end=None):
+        """History of `asin` on `marketplace` between `start` and `end` (inclusive), oldest first, across all tiers.
+
+        Returns (recorded_at, min_rank, max_rank, avg_rank, samples, tier) tuples;
+        raw points have min = max = avg and one sample.
+        """
+        self.connect()
+        bounds = (marketplace, asin, start or '0000-00-00', end or '9999-12-31')
+        self.cursor.execute(
+            """SELECT bucket_start, min_rank, max_rank, avg_rank, samples, 'daily' FROM rank_history_daily
+                   WHERE marketplace = ? AND asin = ? AND bucket_start BETWEEN ? AND ?
+               UNION ALL
+               SELECT bucket_start, min_rank, max_rank, avg_rank, samples, 'hourly' FROM rank_history_hourly
+                   WHERE marketplace = ? AND asin = ? AND bucket_start BETWEEN ? AND ?
+               UNION ALL
+               SELECT recorded_at, rank, rank, rank, 1, 'raw' FROM rank_history
+                   WHERE marketplace = ? AND asin = ? AND recorded_at BETWEEN ? AND ?
+               ORDER BY 1""",
+            bounds * 3,
+        )
+        return self.cursor.fetchall()
+
+    def rebuild_product_trends(self):
+        """Recompute product_trends from rank_history. Returns the number of products."""
+        self.flush()
+        self.connect()
+        with self.conn:
+            self._bump_data_version(self.cursor)
+            return self._rebuild_product_trends(self.cursor)
+
+    @classmethod
+    def _rebuild_product_trends(cls, cursor):
+        cursor.execute('DELETE FROM product_trends')
+        cursor.execute(
+            f"""SELECT marketplace, asin, rank FROM (
+                   SELECT marketplace, asin, rank, ROW_NUMBER() OVER (
+                       PARTITION BY marketplace, asin ORDER BY recorded_at DESC, id DESC) AS n
+                   FROM rank_history)
+               WHERE n <= {cls.TREND_POINTS} ORDER BY marketplace, asin, n"""
+        )
+        rows = []
+        key, ranks = None, []
+        for row_marketplace, row_asin, rank in cursor.fetchall():
+            if (row_marketplace, row_asin) != key:
+                if ranks:
+                    rows.append(cls._trend_row(*key, ranks))
+                key, ranks = (row_marketplace, row_asin), []
+            ranks.append(rank)
+        if ranks:
+            rows.append(cls._trend_row(*key, ranks))
+        cursor.executemany(cls._TREND_UPSERT, rows)
+        return len(rows)
+
+    # Rank history retention
+    def compact_rank_history(self, raw_days: float = 7, hourly_days: float = 90, daily_days: float = 0,
+                             keep_points: int = 5, batch_size: int = 5000, cache_mb: int = 256):
+        """Roll old history into coarser tiers, `batch_size` rows per transaction.
 
-    def create_product(self, product):
+        Raw points older than `raw_days` become hourly min/max/avg buckets,
+        hourly buckets older than `hourly_days` become daily ones, and daily
+        buckets older than `daily_days` are dropped (0 keeps them forever).
+        The newest `keep_points` raw points of every product stay raw whatever
+        their age, so rank trends survive long quiet periods.
+        The rollups touch the history indexes all over, so the page cache is
+        raised to `cache_mb` while compacting.
+        Returns the number of rows compacted per tier.
+        """
+        self.flush()
         self.connect()
+        self.cursor.execute('PRAGMA cache_size')
+        cache_size = self.cursor.fetchone()[0]
+        self.cursor.execute(f'PRAGMA cache_size=-{int(cache_mb) * 1024}')
         try:
-            self.cursor.execute(
-                '''INSERT INTO products (name, price, rank, asin, brand, ratings, stars, image_url, date, url)
-                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-                (
-                    product['title'],
-                    None if product['price'] in ['Not found', 'N/A'] else product['price'],
-                    None if product['rank'] in ['Not found', 'N/A'] else product['rank'],
-                    product['asin'],
-                    product['brand'],
-                    product['ratings'],
-                    product['stars'],
-                    product['image_url'],
-                    product['date'],
-                    product['url'],
-                ),
-            )
-            self.conn.commit()
-        except Exception as e:
-            # Likely UNIQUE constraint on asin -> perform UPDATE instead
-            try:
+            return self._compact_rank_history(raw_days, hourly_days, daily_days, keep_points, batch_size)
+        finally:
+            self.cursor.execute(f'PRAGMA cache_size={int(cache_size)}')
+
+    def _compact_rank_history(self, raw_days, hourly_days, daily_days, keep_points, batch_size):
+        self.cursor.execute('CREATE TEMP TABLE IF NOT EXISTS compact_batch (id INTEGER PRIMARY KEY)')
+        counts = {'raw': 0, 'hourly': 0, 'daily': 0}
+
+        keep_clause = ''
+        if keep_points > 0:
+            # Read from the (marketplace, asin, recorded_at) index; points tied with the Nth newest are kept too
+            keep_clause = f"""AND recorded_at < (
+                SELECT recorded_at FROM rank_history k WHERE k.marketplace = r.marketplace AND k.asin = r.asin
+                ORDER BY recorded_at DESC LIMIT 1 OFFSET {int(keep_points) - 1})"""
+        counts['raw'] = self._roll_up(
+            select_batch=f"""SELECT id FROM rank_history r WHERE id > ? AND recorded_at < ? {keep_clause}
+                             ORDER BY id LIMIT ?""",
+            source='rank_history', target='rank_history_hourly',
+            bucket="strftime('%Y-%m-%d %H:00:00', recorded_at)",
+            aggregates='MIN(rank), MAX(rank), AVG(rank), COUNT(*), MIN(price), MAX(price), AVG(price), COUNT(price)',
+            cutoff=self._cutoff(raw_days), batch_size=batch_size,
+        )
+        counts['hourly'] = self._roll_up(
+            select_batch="""SELECT rowid FROM rank_history_hourly WHERE rowid > ? AND bucket_start < ?
+                            ORDER BY rowid LIMIT ?""",
+            source='rank_history_hourly', target='rank_history_daily',
+            bucket="strftime('%Y-%m-%d 00:00:00', bucket_start)",
+            aggregates="""MIN(min_rank), MAX(max_rank), SUM(avg_rank * samples) / SUM(samples), SUM(samples),
+                          MIN(min_price), MAX(max_price),
+                          SUM(avg_price * price_samples) / NULLIF(SUM(price_samples), 0), SUM(price_samples)""",
+            cutoff=self._cutoff(hourly_days), batch_size=batch_size,
+        )
+        if daily_days > 0:
+            cutoff = self._cutoff(daily_days)
+            while True:
+                with self.conn:
+                    self.cursor.execute(
+                        """DELETE FROM rank_history_daily WHERE rowid IN (
+                               SELECT rowid FROM rank_history_daily WHERE bucket_start < ? LIMIT ?)""",
+                        (cutoff, batch_size),
+                    )
+                if self.cursor.rowcount <= 0:
+                    break
+                counts['daily'] += self.cursor.rowcount
+        return counts
+
+    def _cutoff(self, days: float):
+        self.cursor.execute("SELECT datetime('now', ?)", (f'-{float(days)} days',))
+        return self.cursor.fetchone()[0]
+
+    def _roll_up(self, select_batch, source, target, bucket, aggregates, cutoff, batch_size):
+        """Move batches of `source` rows selected by `select_batch` into `target` buckets."""
+        moved = 0
+        last_id = 0
+        while True:
+            with self.conn:
+                self.cursor.execute('DELETE FROM temp.compact_batch')
+                self.cursor.execute(f'INSERT INTO temp.compact_batch (id) {select_batch}',
+                                    (last_id, cutoff, batch_size))
+                if self.cursor.rowcount <= 0:
+                    break
                 self.cursor.execute(
-                    '''UPDATE products SET name=?, price=?, rank=?, brand=?, ratings=?, stars=?, image_url=?, date=?, url=?, updated_at=CURRENT_TIMESTAMP
-                       WHERE asin=?''',
-                    (
-                        product['title'],
-                        None if product['price'] in ['Not found', 'N/A'] else product['price'],
-                        None if product['rank'] in ['Not found', 'N/A'] else product['rank'],
-                        product['brand'],
-                        product['ratings'],
-                        product['stars'],
-                        product['image_url'],
-                        product['date'],
-                        product['url'],
-                        product['asin'],
-                    ),
+                    f"""INSERT INTO {target} (marketplace, asin, bucket_start, min_rank, max_rank, avg_rank, samples,
+                                              min_price, max_price, avg_price, price_samples)
+                        SELECT marketplace, asin, {bucket}, {aggregates}
+                        FROM temp.compact_batch b CROSS JOIN {source} s ON s.rowid = b.id
+                        WHERE true
+                        GROUP BY 1, 2, 3
+                        ON CONFLICT(marketplace, asin, bucket_start) DO UPDATE SET
+                            min_rank = MIN(min_rank, excluded.min_rank),
+                            max_rank = MAX(max_rank, excluded.max_rank),
+                            avg_rank = (avg_rank * samples + excluded.avg_rank * excluded.samples)
+                                       / (samples + excluded.samples),
+                            samples = samples + excluded.samples,
+                            min_price = COALESCE(MIN(min_price, excluded.min_price), min_price, excluded.min_price),
+                            max_price = COALESCE(MAX(max_price, excluded.max_price), max_price, excluded.max_price),
+                            avg_price = (COALESCE(avg_price * price_samples, 0)
+                                         + COALESCE(excluded.avg_price * excluded.price_samples, 0))
+                                        / NULLIF(price_samples + excluded.price_samples, 0),
+                            price_samples = price_samples + excluded.price_samples"""
                 )
-                self.conn.commit()
-            finally:
-                pass
-        finally:
-            self.close()
+                # Row by row through the primary key; an IN (subquery) delete may be planned as a full scan
+                self.cursor.execute('SELECT id FROM temp.compact_batch ORDER BY id')
+                ids = self.cursor.fetchall()
+                self.cursor.executemany(f'DELETE FROM {source} WHERE rowid = ?', ids)
+                moved += len(ids)
+                last_id = ids[-1][0]
+        return moved
+
+    # Batched writes
+    def queue_product_write(self, product):
+        """Queue a product upsert (plus rank history) and flush if a threshold is reached."""
+        self._queue(self.write_product, product)
+
+    def queue_unchanged(self, marketplace: str, asin: str, cache: dict):
+        """Queue a refresh for a product whose page did not change: only updated_at is touched."""
+        self._queue(self._touch_product, marketplace, asin, cache)
+
+    def _queue(self, write, *args):
+        self._pending.append((write, args))
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+        else:
+            self.flush_if_due()
+
+    @property
+    def pending_count(self):
+        """Number of queued writes not committed yet."""
+        return len(self._pending)
+
+    def flush_if_due(self):
+        """Flush when the batch interval has elapsed. Returns the number of writes applied."""
+        if self._pending and time.monotonic() - self._last_flush >= self.flush_interval:
+            return self.flush()
+        return 0
+
+    def flush(self):
+        """Apply all queued writes in one transaction. Returns the number applied."""
+        self._last_flush = time.monotonic()
+        if not self._pending:
+            return 0
+        batch, self._pending = self._pending, []
+        self.connect()
+        try:
+            with self.conn:
+                for write, args in batch:
+                    write(self.cursor, *args)
+            return len(batch)
+        except sqlite3.Error as e:
+            # One bad row must not drop the whole batch: retry row by row
+            print(f"Batch write failed ({e}), retrying {len(batch)} writes individually")
+            written = 0
+            for write, args in batch:
+                try:
+                    with self.conn:
+                        write(self.cursor, *args)
+                    written += 1
+                except sqlite3.Error as row_error:
+                    print(f"Database error for {args[0]}: {row_error}")
+            return written
+
+    # Durable crawl jobs
+    def create_crawl_run(self, urls):
+        """Record a new run with one pending job per URL. Returns the run id."""
+        self.connect()
+        with self.conn:
+            # Finished runs are only kept for a week
+            self.cursor.execute(
+                """DELETE FROM crawl_jobs WHERE run_id IN (
+                       SELECT id FROM crawl_runs WHERE status = 'finished' AND finished_at < datetime('now', '-7 days'))"""
+            )
+            self.cursor.execute(
+                "DELETE FROM crawl_runs WHERE status = 'finished' AND finished_at < datetime('now', '-7 days')"
+            )
+            self.cursor.execute(
+                'INSERT INTO crawl_runs (total, owner_host, owner_pid) VALUES (?, ?, ?)',
+                (len(urls), socket.gethostname(), os.getpid()),
+            )
+            run_id = self.cursor.lastrowid
+            self.cursor.executemany(
+                'INSERT OR IGNORE INTO crawl_jobs (run_id, url) VALUES (?, ?)',
+                [(run_id, url) for url in urls],
+            )
+        return run_id
 
-    def update_product(self, asin: str, product):
+    def get_resumable_run(self, run_id=None, stale_seconds: int = 120):
+        """Find an interrupted run, claim it for this process and return its unfinished jobs.
+
+        Without `run_id`, picks the newest run still marked 'running' that no
+        live process is crawling: its owner process on this host has exited
+        (or is this process, which only resumes between runs), or, for runs
+        of another host or without an owner, its heartbeat is older than
+        `stale_seconds`. Jobs left in flight are treated as pending.
+        Returns (run_id, total, [(url, attempts), ...], done_count) or None.
+        """
         self.connect()
+        if run_id is None:
+            self.cursor.execute(
+                """SELECT id, total, heartbeat_at <= datetime('now', ?), owner_host, owner_pid FROM crawl_runs
+                   WHERE status = 'running' ORDER BY id DESC""",
+                (f'-{int(stale_seconds)} seconds',),
+            )
+            row = next(((run, total) for run, total, stale, host, pid in self.cursor.fetchall()
+                        if self._run_orphaned(stale, host, pid)), None)
+        else:
+            self.cursor.execute("SELECT id, total FROM crawl_runs WHERE id = ? AND status = 'running'", (run_id,))
+            row = self.cursor.fetchone()
+        if not row:
+            return None
+        run_id, total = row
+        with self.conn:
+            self.cursor.execute(
+                """UPDATE crawl_runs SET owner_host = ?, owner_pid = ?, heartbeat_at = CURRENT_TIMESTAMP
+                   WHERE id = ?""",
+                (socket.gethostname(), os.getpid(), run_id),
+            )
         self.cursor.execute(
-            '''UPDATE products SET name=?, price=?, rank=?, brand=?, ratings=?, stars=?, image_url=?, date=?, updated_at=CURRENT_TIMESTAMP WHERE asin=?''',
-            (
-                product['title'],
-                product['price'] if product['price'] not in ['Not found', 'N/A'] else None,
-                product['rank'] if product['rank'] not in ['Not found', 'N/A'] else None,
-                product['brand'],
-                product['ratings'],
-                product['stars'],
-                product['image_url'],
-                product['date'],
-                asin,
-            ),
+            "SELECT url, attempts FROM crawl_jobs WHERE run_id = ? AND state IN ('pending', 'in_flight') ORDER BY id",
+            (run_id,),
         )
-        self.conn.commit()
-        self.close()
+        jobs = self.cursor.fetchall()
+        self.cursor.execute("SELECT COUNT(*) FROM crawl_jobs WHERE run_id = ? AND state = 'done'", (run_id,))
+        return run_id, total, jobs, self.cursor.fetchone()[0]
 
-    def add_rank_history(self, asin: str, rank, price):
-        # Require a numeric rank; otherwise skip to respect NOT NULL constraint
+    @staticmethod
+    def _run_orphaned(stale, host, pid):
+        """Whether no process is crawling a 'running' run: see get_resumable_run."""
+        if pid is None or host != socket.gethostname() or os.name == 'nt':
+            # Another machine's processes can't be checked, and os.kill would end the process on Windows
+            return bool(stale)
+        if pid == os.getpid():
+            return True
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return True
+        except PermissionError:
+            # Alive, under another user
+            return False
+        return False
+
+    def queue_job_state(self, run_id: int, url: str, state: str, attempts: int, error=None):
+        """Checkpoint a job; written with the next batch so it commits together with product data."""
+        self._queue(self._set_job_state, run_id, url, state, attempts, error)
+
+    def finish_crawl_run(self, run_id: int):
+        self._queue(self._finish_run, run_id)
+        self.flush()
+
+    @staticmethod
+    def _set_job_state(cursor, run_id, url, state, attempts, error):
+        cursor.execute(
+            '''UPDATE crawl_jobs SET state = ?, attempts = ?, last_error = COALESCE(?, last_error),
+                   updated_at = CURRENT_TIMESTAMP
+               WHERE run_id = ? AND url = ?''',
+            (state, attempts, error, run_id, url),
+        )
+        cursor.execute('UPDATE crawl_runs SET heartbeat_at = CURRENT_TIMESTAMP WHERE id = ?', (run_id,))
+
+    @staticmethod
+    def _finish_run(cursor, run_id):
+        cursor.execute(
+            "UPDATE crawl_runs SET status = 'finished', finished_at = CURRENT_TIMESTAMP WHERE id = ?",
+            (run_id,),
+        )
+
+    # Change-detection cache
+    def get_page_cache(self, marketplace: str, asin: str):
+        """Return the cached validators/fingerprints for `asin` on `marketplace`, or None.
+
+        Entries whose product row no longer exists are ignored so a deleted
+        product is always re-crawled in full.
+        """
+        self.connect()
+        self.cursor.execute(
+            '''SELECT c.etag, c.last_modified, c.body_hash, c.fields_hash
+               FROM page_cache c JOIN products p ON p.marketplace = c.marketplace AND p.asin = c.asin
+               WHERE c.marketplace = ? AND c.asin = ?''',
+            (marketplace, asin),
+        )
+        row = self.cursor.fetchone()
+        if not row:
+            return None
+        return {'etag': row[0], 'last_modified': row[1], 'body_hash': row[2], 'fields_hash': row[3]}
+
+    @staticmethod
+    def _save_page_cache(cursor, marketplace: str, asin: str, cache: dict):
+        cursor.execute(
+            '''INSERT INTO page_cache (marketplace, asin, etag, last_modified, body_hash, fields_hash, checked_at)
+               VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+               ON CONFLICT(marketplace, asin) DO UPDATE SET
+                   etag=excluded.etag, last_modified=excluded.last_modified, body_hash=excluded.body_hash,
+                   fields_hash=excluded.fields_hash, checked_at=CURRENT_TIMESTAMP''',
+            (marketplace, asin, cache.get('etag'), cache.get('last_modified'), cache.get('body_hash'), cache.get('fields_hash')),
+        )
+
+    @classmethod
+    def _touch_product(cls, cursor, marketplace: str, asin: str, cache: dict):
+        cursor.execute('UPDATE products SET updated_at=CURRENT_TIMESTAMP WHERE marketplace=? AND asin=?',
+                       (marketplace, asin))
+        cls._save_page_cache(cursor, marketplace, asin, cache)
+        cls._bump_data_version(cursor)
+
+    def upsert_product(self, product):
+        """Insert or update a product and its rank history in one transaction.
+
+        Returns (created, old_rank, rank_changed).
+        """
+        self.connect()
+        with self.conn:
+            return self.write_product(self.cursor, product)
+
+    def write_product(self, cursor, product):
+        """Upsert one product and its rank history using `cursor` (no commit).
+
+        The product's key is its ASIN and the marketplace of its URL, so the same
+        ASIN crawled on two marketplaces is two rows with their own history.
+        A single INSERT ... ON CONFLICT(marketplace, asin) DO UPDATE ... RETURNING statement
+        reports whether the row was created and the rank it had before. `url` is
+        only set on insert, so the first submitted URL variant is kept. A history
+        point is added for a new product with a rank, or when an existing rank
+        changed; product_trends follows every point.
+        Returns (created, old_rank, rank_changed).
+        """
+        asin = product['asin']
+        marketplace = self._product_marketplace(product)
+        current_price = None if product['price'] in ['Not found', 'N/A'] else product['price']
+
+        cursor.execute(
+            '''INSERT INTO products (name, price, rank, asin, brand, ratings, stars, image_url, date, url, marketplace, currency)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+               ON CONFLICT(marketplace, asin) DO UPDATE SET
+                   name=excluded.name, price=excluded.price, rank=excluded.rank, brand=excluded.brand,
+                   ratings=excluded.ratings, stars=excluded.stars, image_url=excluded.image_url,
+                   date=excluded.date, currency=excluded.currency, prev_rank=products.rank, crawl_count=products.crawl_count + 1,
+                   updated_at=CURRENT_TIMESTAMP
+               RETURNING crawl_count, prev_rank, rank''',
+            self._product_params(product),
+        )
+        crawl_count, old_rank, new_rank = cursor.fetchone()
+        created = crawl_count == 1
+        new_rank = self._rank_int(new_rank)
+
+        if created:
+            rank_changed = new_rank is not None
+        else:
+            old_rank = self._rank_int(old_rank)
+            rank_changed = new_rank is not None and old_rank is not None and new_rank != old_rank
+
+        if rank_changed:
+            self._insert_rank_history(cursor, marketplace, asin, new_rank, current_price)
+        if product.get('_cache') and asin not in ['Not found', 'N/A']:
+            self._save_page_cache(cursor, marketplace, asin, product['_cache'])
+        self._bump_data_version(cursor)
+        return created, old_rank, rank_changed
+
+    @staticmethod
+    def _bump_data_version(cursor):
+        # Tells the API that its cached product listings are stale
+        cursor.execute(
+            """UPDATE settings SET value = CAST(value AS INTEGER) + 1, updated_at = CURRENT_TIMESTAMP
+               WHERE key = 'data_version'"""
+        )
+
+    # SQL statements shared by the per-call and batched paths
+    @staticmethod
+    def _product_params(product):
+        return (
+            product['title'],
+            None if product['price'] in ['Not found', 'N/A'] else product['price'],
+            None if product['rank'] in ['Not found', 'N/A'] else product['rank'],
+            product['asin'],
+            product['brand'],
+            product['ratings'],
+            product['stars'],
+            product['image_url'],
+            product['date'],
+            product['url'],
+            DatabaseManager._product_marketplace(product),
+            None if product.get('currency') in [None, 'Not found', 'N/A'] else product['currency'],
+        )
+
+    @staticmethod
+    def _marketplace(url):
+        key = canonicalize(url)
+        return key[0] if key else None
+
+    @staticmethod
+    def _product_marketplace(product):
+        """Marketplace half of a product's key: its URL's, or the default one for a product without a URL."""
+        return DatabaseManager._marketplace(product.get('url')) or DEFAULT_MARKETPLACE
+
+    @staticmethod
+    def _rank_int(rank):
         try:
             if rank in ['Not found', 'N/A', None]:
-                return
-            rank_int = int(str(rank).replace(',', ''))
+                return None
+            return int(str(rank).replace(',', ''))
         except Exception:
+            return None
+
+    @classmethod
+    def _insert_rank_history(cls, cursor, marketplace: str, asin: str, rank, price):
+        # Require a numeric rank; otherwise skip to respect NOT NULL constraint
+        rank_int = cls._rank_int(rank)
+        if rank_int is None:
             return
 
         price_val = None
@@ -175,23 +816,46 @@ class DatabaseManager:
         except Exception:
             price_val = None
 
-        self.connect()
-        self.cursor.execute(
-            'INSERT INTO rank_history (asin, rank, price, recorded_at) VALUES (?, ?, ?, CURRENT_TIMESTAMP)',
-            (asin, rank_int, price_val),
+        cursor.execute(
+            '''INSERT INTO rank_history (marketplace, asin, rank, price, recorded_at)
+               VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)''',
+            (marketplace, asin, rank_int, price_val),
         )
-        self.conn.commit()
-        self.close()
+        cls._update_trend(cursor, marketplace, asin, rank_int)
 
-    def cleanup_rank_history(self, asin: str):
-        self.connect()
-        self.cursor.execute(
-            '''DELETE FROM rank_history WHERE asin = ? AND id NOT IN (
-                   SELECT id FROM rank_history WHERE asin = ? ORDER BY recorded_at DESC LIMIT 5
-               )''',
-            (asin, asin),
-        )
-        self.conn.commit()
-        self.close()
+    # Newest history points kept in product_trends.rank_history
+    TREND_POINTS = 5
+
+    _TREND_UPSERT = '''INSERT INTO product_trends
+                           (marketplace, asin, last_rank, prev_rank, rank_change_percent, rank_trend, rank_history,
+                            updated_at)
+                       VALUES (?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+                       ON CONFLICT(marketplace, asin) DO UPDATE SET
+                           last_rank=excluded.last_rank, prev_rank=excluded.prev_rank,
+                           rank_change_percent=excluded.rank_change_percent, rank_trend=excluded.rank_trend,
+                           rank_history=excluded.rank_history, updated_at=CURRENT_TIMESTAMP'''
 
+    @classmethod
+    def _update_trend(cls, cursor, marketplace: str, asin: str, rank: int):
+        """Shift `rank` into the trend row of `asin` on `marketplace`, in the caller's transaction."""
+        cursor.execute('SELECT rank_history FROM product_trends WHERE marketplace = ? AND asin = ?',
+                       (marketplace, asin))
+        row = cursor.fetchone()
+        ranks = [rank]
+        if row and row[0]:
+            ranks += [int(r) for r in row[0].split(',')[:cls.TREND_POINTS - 1]]
+        cursor.execute(cls._TREND_UPSERT, cls._trend_row(marketplace, asin, ranks))
 
+    @staticmethod
+    def _trend_row(marketplace: str, asin: str, ranks):
+        """product_trends values for `ranks` (newest first), as the dashboard reports them."""
+        last = ranks[0]
+        prev = ranks[1] if len(ranks) > 1 else None
+        change = None
+        if prev is None:
+            trend = 'new'
+        else:
+            # Positive when the rank number went down, i.e. the product climbed
+            change = round((prev - last) * 100 / last, 2) if last else None
+            trend = 'up' if last < prev else 'down' if last > prev else 'stable'
+        return marketplace, asin, last, prev, change, trend, ','.join(str(r) for r in ranks)
@@ -0,0 +1,196 @@
+"""
+Pool of reusable headless Chrome drivers for the Selenium engine.
+
+Starting Chrome costs seconds, so drivers are created lazily (at most
+`size` of them), handed out one page at a time and kept warm between pages.
+A driver is quit and replaced after `max_pages` pages or when the caller
+asks for it (captcha, broken session). The user agent is switched per page
+through the DevTools protocol instead of relaunching the browser, and the
+chromedriver binary path is resolved once per process.
+
+The lean profile (default) loads pages with the 'eager' strategy, i.e. up
+to DOMContentLoaded, and blocks images, media, fonts and stylesheets: only
+the HTML is parsed, so none of them are needed.
+"""
+
+import threading
+from multiprocessing import util
+
+from selenium import webdriver
+from selenium.common.exceptions import WebDriverException
+from selenium.webdriver.chrome.service import Service
+from webdriver_manager.chrome import ChromeDriverManager
+
+_driver_path = None
+_driver_path_resolved = False
+_driver_path_lock = threading.Lock()
+
+# Resources the lean profile never downloads, by file extension
+LEAN_BLOCKED_EXTENSIONS = (
+    'css', 'woff', 'woff2', 'ttf', 'otf', 'eot',
+    'jpg', 'jpeg', 'png', 'gif', 'webp', 'svg', 'ico',
+    'mp4', 'webm', 'm3u8', 'mp3',
+)
+# Network.setBlockedURLs patterns ('*' any run of characters, '?' one character) match the whole URL, and
+# Amazon serves most assets with a query string ("...css_.css?AUIClients/..."): each extension is blocked
+# at the end of the URL and followed by anything
+LEAN_BLOCKED_URLS = [pattern for extension in LEAN_BLOCKED_EXTENSIONS
+                     for pattern in (f'*.{extension}', f'*.{extension}?*')]
+
+
+def resolve_driver_path():
+    """Path of the chromedriver binary, downloaded/resolved once per process.
+
+    Returns None when webdriver-manager cannot provide it; Selenium then
+    falls back to its own driver lookup.
+    """
+    global _driver_path, _driver_path_resolved
+    with _driver_path_lock:
+        if not _driver_path_resolved:
+            try:
+                _driver_path = ChromeDriverManager().install()
+            except Exception as e:
+                print(f"Chrome WebDriver error: {e}")
+                _driver_path = None
+            _driver_path_resolved = True
+        return _driver_path
+
+
+def build_chrome_options(user_agent=None, lean=False):
+    options = webdriver.ChromeOptions()
+    if user_agent:
+        options.add_argument(f"--user-agent={user_agent}")
+    if lean:
+        # Return from driver.get() at DOMContentLoaded instead of the full load event
+        options.page_load_strategy = 'eager'
+        options.add_argument("--blink-settings=imagesEnabled=false")
+        options.add_experimental_option('prefs', {
+            'profile.managed_default_content_settings.images': 2,
+            'profile.managed_default_content_settings.fonts': 2,
+        })
+    options.add_argument("--headless=new")  # headless
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-dev-shm-usage")
+    options.add_argument("--disable-blink-features=AutomationControlled")
+    options.add_argument("--log-level=3")
+    options.add_experimental_option("excludeSwitches", ["enable-automation", "enable-logging"])
+    options.add_experimental_option('useAutomationExtension', False)
+    return options
+
+
+def new_chrome_driver(user_agent=None, lean=False):
+    """Launch one headless Chrome (with the lean profile when `lean`)."""
+    options = build_chrome_options(user_agent, lean)
+    driver = None
+    driver_path = resolve_driver_path()
+    if driver_path:
+        try:
+            driver = webdriver.Chrome(service=Service(driver_path), options=options)
+        except Exception as e:
+            print(f"Chrome WebDriver error: {e}")
+    if driver is None:
+        driver = webdriver.Chrome(options=options)
+    if lean:
+        block_resources(driver, LEAN_BLOCKED_URLS)
+    return driver
+
+
+def block_resources(driver, patterns):
+    """Stop Chrome from requesting URLs matching `patterns` for the whole session."""
+    try:
+        driver.execute_cdp_cmd('Network.enable', {})
+        driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': patterns})
+        return True
+    except Exception:
+        return False
+
+
+def is_driver_failure(error):
+    """Whether `error` came from the browser or its session (crashed Chrome, invalid session id, ...)
+    rather than from the page, i.e. the driver should not be reused."""
+    return isinstance(error, WebDriverException)
+
+
+def set_user_agent(driver, user_agent):
+    """Switch the user agent of a running Chrome without restarting it."""
+    try:
+        driver.execute_cdp_cmd('Network.setUserAgentOverride', {'userAgent': user_agent})
+        return True
+    except Exception:
+        return False
+
+
+class DriverPool:
+    def __init__(self, size: int = 2, max_pages: int = 50, factory=new_chrome_driver):
+        self.size = max(1, size)
+        self.max_pages = max(1, max_pages)
+        self.factory = factory
+        self.idle = []
+        self.pages = {}
+        self.launching = 0
+        self.created = 0
+        self.recycled = 0
+        self.closed = False
+        self.cond = threading.Condition()
+        # Quit browsers on interpreter exit, including pool worker processes
+        self._finalizer = util.Finalize(self, self.close, exitpriority=10)
+
+    def acquire(self, user_agent=None):
+        """Borrow a driver (blocking while all `size` drivers are in use)."""
+        with self.cond:
+            while not self.idle and len(self.pages) + self.launching >= self.size:
+                self.cond.wait()
+            if self.idle:
+                driver = self.idle.pop()
+            else:
+                # Reserve the slot before the slow launch so the pool stays bounded
+                driver = None
+                self.launching += 1
+        if driver is None:
+            try:
+                driver = self.factory(user_agent)
+            except Exception:
+                with self.cond:
+                    self.launching -= 1
+                    self.cond.notify()
+                raise
+            with self.cond:
+                self.launching -= 1
+                self.pages[driver] = 0
+                self.created += 1
+            return driver
+        if user_agent:
+            set_user_agent(driver, user_agent)
+        return driver
+
+    def release(self, driver, recycle: bool = False):
+        """Return a driver after one page; quit it when `recycle` or it reached max_pages."""
+        with self.cond:
+            self.pages[driver] = self.pages.get(driver, 0) + 1
+            if self.closed or recycle or self.pages[driver] >= self.max_pages:
+                del self.pages[driver]
+                self.recycled += 1
+                retire = True
+            else:
+                self.idle.append(driver)
+                retire = False
+            self.cond.notify()
+        if retire:
+            self._quit(driver)
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            drivers, self.idle = self.idle, []
+            for driver in drivers:
+                self.pages.pop(driver, None)
+            self.cond.notify_all()
+        for driver in drivers:
+            self._quit(driver)
+
+    @staticmethod
+    def _quit(driver):
+        try:
+            driver.quit()
+        except Exception:
+            pass
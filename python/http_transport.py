@@ -0,0 +1,340 @@
+"""
+HTTP transport for the requests engine.
+
+Uses httpx with HTTP/2 multiplexing when it is installed (`pip install
+httpx[http2]`), otherwise a pooled requests.Session. Bodies are streamed:
+
+- captcha and "page not found" pages are recognised from the first
+  PROBE_BYTES and the download stops there
+- product pages stop downloading once every region in STREAM_REGIONS has been
+  received (or an end marker that follows them arrived); the parser only
+  needs the top of the page
+
+Brotli is advertised in Accept-Encoding only when a brotli decoder is
+installed.
+
+Every marketplace (amazon.com, amazon.de, ...; other hosts by host) gets its
+own client or session with its own connection pool of `pool_size`, so a slow
+or throttled marketplace never holds the connections another one needs, and
+cookies and locale preferences stay with their marketplace.
+
+With a `timings` dict, get() adds the milliseconds spent per stage:
+ttfb_ms (request sent until response headers) and download_ms (body), plus
+dns_ms, connect_ms and tls_ms when a new connection was opened; ttfb_ms leaves
+those out, so the stages add up to the fetch. On the
+requests session the connection resolves the host itself so DNS and TCP
+connect are timed apart; httpx reports DNS inside connect_ms.
+"""
+
+import re
+import socket
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+
+from amazon_urls import marketplace
+from crawl_locators import CAPTCHA_KEYWORDS, STREAM_REGIONS, STREAM_END_MARKERS
+from product_parser import is_not_found_page
+
+try:
+    import httpx  # type: ignore
+except Exception:
+    httpx = None
+
+try:
+    import h2  # type: ignore  # noqa: F401
+    HAS_HTTP2 = httpx is not None
+except Exception:
+    HAS_HTTP2 = False
+
+try:
+    import brotli  # type: ignore  # noqa: F401
+    HAS_BROTLI = True
+except Exception:
+    try:
+        import brotlicffi  # type: ignore  # noqa: F401
+        HAS_BROTLI = True
+    except Exception:
+        HAS_BROTLI = False
+
+ACCEPT_ENCODING = 'gzip, deflate, br' if HAS_BROTLI else 'gzip, deflate'
+
+# Captcha / not-found pages are recognised from this much of the body
+PROBE_BYTES = 64 * 1024
+CHUNK_BYTES = 16 * 1024
+
+
+# Timings dict of the request running on this thread; new connections add dns/connect/tls to it
+_request = threading.local()
+
+
+def _add_ms(timings, key, started, ended):
+    timings[key] = timings.get(key, 0.0) + (ended - started) * 1000
+
+
+# Stages a new connection adds to the wait for response headers
+_CONNECTION_STAGES = ('dns_ms', 'connect_ms', 'tls_ms')
+
+
+def _connection_ms(timings):
+    return sum(timings.get(key, 0.0) for key in _CONNECTION_STAGES)
+
+
+def _add_ttfb(timings, started, headers_at, connection_ms):
+    """ttfb_ms of a request sent at `started`, less the connection setup timed since (`connection_ms` before)."""
+    _add_ms(timings, 'ttfb_ms', started, headers_at)
+    timings['ttfb_ms'] -= _connection_ms(timings) - connection_ms
+
+
+class _TimedConnectionMixin:
+    _tcp_done = None
+
+    def _new_conn(self):
+        timings = getattr(_request, 'timings', None)
+        if timings is None:
+            return super()._new_conn()
+        host = self._dns_host
+        started = time.perf_counter()
+        try:
+            addresses = list(dict.fromkeys(
+                info[4][0] for info in socket.getaddrinfo(host, self.port, 0, socket.SOCK_STREAM)))
+        except OSError:
+            # urllib3 resolves again and reports the failure its usual way
+            return super()._new_conn()
+        resolved = time.perf_counter()
+        _add_ms(timings, 'dns_ms', started, resolved)
+        # Connect to the resolved addresses in order, as urllib3 would; certificates and SNI still use self.host
+        error = None
+        try:
+            for address in addresses:
+                self._dns_host = address
+                try:
+                    return super()._new_conn()
+                except (ConnectTimeoutError, NewConnectionError) as e:
+                    error = e
+            raise error
+        finally:
+            self._dns_host = host
+            self._tcp_done = time.perf_counter()
+            _add_ms(timings, 'connect_ms', resolved, self._tcp_done)
+
+
+class _TimedHTTPConnection(_TimedConnectionMixin, HTTPConnection):
+    pass
+
+
+class _TimedHTTPSConnection(_TimedConnectionMixin, HTTPSConnection):
+    def connect(self):
+        self._tcp_done = None
+        super().connect()
+        timings = getattr(_request, 'timings', None)
+        if timings is not None and self._tcp_done is not None:
+            _add_ms(timings, 'tls_ms', self._tcp_done, time.perf_counter())
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class _TimedAdapter(requests.adapters.HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {'http': _TimedHTTPConnectionPool,
+                                                   'https': _TimedHTTPSConnectionPool}
+
+
+def _httpx_trace(timings):
+    """httpx `trace` extension callback adding connect/TLS times to `timings`."""
+    keys = {'connection.connect_tcp': 'connect_ms', 'connection.start_tls': 'tls_ms'}
+    started = {}
+
+    def trace(event_name, info):
+        stage, _, phase = event_name.rpartition('.')
+        if stage not in keys:
+            return
+        if phase == 'started':
+            started[stage] = time.perf_counter()
+        elif stage in started:
+            _add_ms(timings, keys[stage], started.pop(stage), time.perf_counter())
+
+    return trace
+
+
+class FetchResult:
+    """The parts of a response the crawler uses; `truncated` when the download stopped early."""
+
+    def __init__(self, status_code, headers, content, encoding, truncated=False, elapsed=0.0):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        self.encoding = encoding or 'utf-8'
+        self.truncated = truncated
+        self.elapsed = elapsed
+
+    @property
+    def text(self):
+        return self.content.decode(self.encoding, errors='replace')
+
+
+class RegionWatcher:
+    """Tells from a growing page prefix when all needed regions have been received.
+
+    A region is complete once the element with its id is closed again
+    (matching open/close tags of the same name are counted). Scanning is
+    incremental, so each byte is looked at about once.
+    """
+
+    def __init__(self, regions=STREAM_REGIONS, end_markers=STREAM_END_MARKERS):
+        self.regions = {}
+        for region in regions:
+            self.regions[region] = {
+                'start': re.compile(rb'<(\w+)[^<>]*?\bid=["\']' + re.escape(region.encode()) + rb'["\']', re.I),
+                'tag': None,
+                'depth': 0,
+                'pos': 0,
+                'done': False,
+            }
+        self.end_markers = [m.encode() for m in end_markers]
+        self.marker_pos = 0
+        self.marker_seen = False
+
+    def feed(self, data):
+        """Scan `data` (the whole prefix received so far). Returns True when the rest can be skipped."""
+        for state in self.regions.values():
+            if not state['done']:
+                self._scan(state, data)
+        started = [s for s in self.regions.values() if s['tag'] is not None]
+        if self.regions and all(s['done'] for s in self.regions.values()):
+            return True
+        if not self.marker_seen:
+            overlap = max((len(m) for m in self.end_markers), default=0)
+            self.marker_seen = any(data.find(m, max(0, self.marker_pos - overlap)) != -1 for m in self.end_markers)
+            self.marker_pos = len(data)
+        # A region still open at the marker (the marker inside it) is waited for
+        return self.marker_seen and all(s['done'] for s in started)
+
+    @staticmethod
+    def _scan(state, data):
+        if state['tag'] is None:
+            m = state['start'].search(data, max(0, state['pos'] - 512))
+            if not m:
+                state['pos'] = len(data)
+                return
+            tag = m.group(1)
+            state.update(tag=tag, depth=1, pos=m.end(),
+                         tags=re.compile(rb'<(/?)' + re.escape(tag) + rb'[\s>/]', re.I))
+        last_end = state['pos']
+        for t in state['tags'].finditer(data, state['pos']):
+            state['depth'] += -1 if t.group(1) else 1
+            last_end = t.end()
+            if state['depth'] == 0:
+                state['done'] = True
+                break
+        # Rescan the tail next time: a tag may be cut at the chunk boundary
+        state['pos'] = max(last_end, len(data) - len(state['tag']) - 3)
+
+
+def probe_stops_download(lower_text):
+    """True for captcha and "page not found" pages; nothing after the probe is needed."""
+    return is_not_found_page(lower_text) or any(kw in lower_text for kw in CAPTCHA_KEYWORDS)
+
+
+class HttpTransport:
+    def __init__(self, pool_size=10, client='auto', stream=True, timeout=10):
+        self.pool_size = max(1, pool_size)
+        self.stream = stream
+        self.timeout = timeout
+        self.use_httpx = client in ('auto', 'httpx') and httpx is not None
+        if self.use_httpx:
+            self.name = 'httpx/h2' if HAS_HTTP2 else 'httpx'
+        else:
+            self.name = 'requests'
+        # marketplace -> httpx.Client or requests.Session
+        self.clients = {}
+        self.lock = threading.Lock()
+
+    def _new_client(self):
+        if self.use_httpx:
+            limits = httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size)
+            return httpx.Client(http2=HAS_HTTP2, limits=limits, timeout=self.timeout, follow_redirects=True)
+        session = requests.Session()
+        # A marketplace has a few hosts (www, m., images redirects); each gets a pool of pool_size
+        adapter = _TimedAdapter(pool_connections=4, pool_maxsize=self.pool_size)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    def client_for(self, url):
+        """The client or session of `url`'s marketplace, created on first use."""
+        key = marketplace(urlsplit(url).netloc)
+        client = self.clients.get(key)
+        if client is None:
+            with self.lock:
+                client = self.clients.get(key)
+                if client is None:
+                    client = self.clients[key] = self._new_client()
+        return client
+
+    def get(self, url, headers=None, timeout=None, timings=None):
+        """GET `url`, stopping the download early when the rest of the body is not needed."""
+        headers = dict(headers or {})
+        headers['Accept-Encoding'] = ACCEPT_ENCODING
+        timeout = timeout or self.timeout
+        timings = {} if timings is None else timings
+        client = self.client_for(url)
+        connection_ms = _connection_ms(timings)
+        started = time.perf_counter()
+        if self.use_httpx:
+            with client.stream('GET', url, headers=headers, timeout=timeout,
+                                    extensions={'trace': _httpx_trace(timings)}) as response:
+                headers_at = time.perf_counter()
+                _add_ttfb(timings, started, headers_at, connection_ms)
+                content, truncated = self._read(response.status_code, response.iter_bytes(CHUNK_BYTES))
+                _add_ms(timings, 'download_ms', headers_at, time.perf_counter())
+                return FetchResult(response.status_code, response.headers, content, response.encoding,
+                                   truncated, time.perf_counter() - started)
+        _request.timings = timings
+        try:
+            response = client.get(url, headers=headers, timeout=timeout, stream=True)
+        finally:
+            _request.timings = None
+        headers_at = time.perf_counter()
+        _add_ttfb(timings, started, headers_at, connection_ms)
+        try:
+            content, truncated = self._read(response.status_code, response.iter_content(CHUNK_BYTES))
+            _add_ms(timings, 'download_ms', headers_at, time.perf_counter())
+            return FetchResult(response.status_code, response.headers, content, response.encoding,
+                               truncated, time.perf_counter() - started)
+        finally:
+            response.close()
+
+    def _read(self, status_code, chunks):
+        body = bytearray()
+        watcher = RegionWatcher() if self.stream and status_code == 200 else None
+        probed = False
+        for chunk in chunks:
+            body += chunk
+            if watcher is None:
+                continue
+            if not probed and len(body) >= PROBE_BYTES:
+                probed = True
+                if probe_stops_download(bytes(body[:PROBE_BYTES]).decode('utf-8', errors='replace').lower()):
+                    return bytes(body), True
+            if watcher.feed(body):
+                return bytes(body), True
+        return bytes(body), False
+
+    def close(self):
+        with self.lock:
+            clients, self.clients = list(self.clients.values()), {}
+        for client in clients:
+            client.close()
@@ -0,0 +1,444 @@
+"""
+Product page parsing with pluggable HTML backends.
+
+Backends, fastest first: selectolax, lxml (with cssselect) and BeautifulSoup's
+html.parser, which is always available. CRAWL_PARSER picks one explicitly;
+the default `auto` uses the fastest installed backend.
+
+Locators from crawl_locators are compiled once at import. Fields are then
+read in one pass over the page regions they live in (title, price block,
+image, detail bullets, prodDetails). The html.parser backend only builds a
+tree for those regions; bs4 is imported the first time it is used.
+
+Wording and number formats follow the URL's marketplace
+(crawl_locators.MARKETPLACE_PROFILES): rank and date keywords, the rank and
+star patterns, and the decimal separator of star ratings. Prices are read in
+whichever format they come in and stored as plain decimals ("1234.56") with
+their currency code.
+"""
+
+import json
+import os
+import re
+import time
+from urllib.parse import urlsplit
+
+from amazon_urls import canonicalize, marketplace
+from crawl_locators import (
+    TITLE,
+    PRICE_PRIMARY,
+    PRICE_FALLBACK,
+    BRAND,
+    RATINGS,
+    STARS,
+    IMAGE_WRAPPER_IMG,
+    DETAIL_BULLETS_ITEMS,
+    DETAILS_TABLE_ROWS,
+    LANDING_IMAGE,
+    OG_IMAGE,
+    PAGE_TITLE,
+    NOT_FOUND_KEYWORDS,
+    DEFAULT_MARKETPLACE,
+    MARKETPLACE_PROFILES,
+    CURRENCY_SYMBOLS,
+)
+
+try:
+    from selectolax.lexbor import LexborHTMLParser as _SelectolaxParser  # type: ignore
+except Exception:
+    _SelectolaxParser = None
+
+try:
+    import lxml.html  # type: ignore
+    from lxml import etree  # type: ignore
+    from cssselect import GenericTranslator  # type: ignore
+except Exception:
+    lxml = None
+
+SELECTORS = {
+    'title': TITLE,
+    'page_title': PAGE_TITLE,
+    'price_primary': PRICE_PRIMARY,
+    'price_fallback': PRICE_FALLBACK,
+    'brand': BRAND,
+    'ratings': RATINGS,
+    'stars': STARS,
+    'image_wrapper': IMAGE_WRAPPER_IMG,
+    'og_image': OG_IMAGE,
+    'landing_image': LANDING_IMAGE,
+    'detail_bullets': DETAIL_BULLETS_ITEMS,
+    'details_rows': DETAILS_TABLE_ROWS,
+}
+
+# A number with any grouping: "12,345", "1.234", "1 234" (no-break spaces included)
+_NUMBER_RE = re.compile(r'\d[\d,.\s\u00a0\u202f\']*')
+_NON_DIGITS_RE = re.compile(r'\D')
+_CURRENCY_BY_SYMBOL = dict(CURRENCY_SYMBOLS)
+# Symbols not inside a word ("S$" in "US$", "kr" in "Marke"); longest first at a position
+_CURRENCY_RE = re.compile(
+    r'(?<![^\W\d_])('
+    + '|'.join(re.escape(symbol) for symbol in sorted(_CURRENCY_BY_SYMBOL, key=len, reverse=True))
+    + r')(?![^\W\d_])'
+)
+# The decimal separator is the number's last '.' or ',' followed by one or two digits
+_FRACTION_RE = re.compile(r'[.,](\d{1,2})$')
+# Currencies without minor units: their separators only group thousands
+_WHOLE_CURRENCIES = {'JPY'}
+
+
+def _compile_profile(profile, fallback):
+    """Keywords and patterns of a marketplace profile, followed by the fallback (English) ones."""
+    profiles = [profile] if profile is fallback else [profile, fallback]
+    return {
+        'accept_language': profile['accept_language'],
+        'currency': profile['currency'],
+        'decimal': profile['decimal'],
+        'rank_keywords': list(dict.fromkeys(k for p in profiles for k in p['rank_keywords'])),
+        'rank_patterns': [re.compile(p['rank_pattern']) for p in profiles],
+        'date_keywords': list(dict.fromkeys(k for p in profiles for k in p['date_keywords'])),
+        'stars_patterns': [(re.compile(p['stars_pattern']), p['decimal']) for p in profiles],
+    }
+
+
+_PROFILES = {
+    market: _compile_profile(profile, MARKETPLACE_PROFILES[DEFAULT_MARKETPLACE])
+    for market, profile in MARKETPLACE_PROFILES.items()
+}
+
+
+def marketplace_profile(url):
+    """Compiled parsing profile for `url`'s marketplace (the default marketplace's for other hosts)."""
+    try:
+        market = marketplace(urlsplit(url or '').netloc)
+    except ValueError:
+        market = DEFAULT_MARKETPLACE
+    return _PROFILES.get(market, _PROFILES[DEFAULT_MARKETPLACE])
+
+
+def parse_price(text, currency=None):
+    """(amount, currency) of a price text such as "$1,234.56", "1.234,56 €" or "￥1,280".
+
+    `amount` is a plain decimal string ("1234.56") or None; `currency` is the
+    marketplace's default currency, used when the text only carries '$' or no
+    symbol at all. The decimal separator is read from the number itself, so a
+    page in another locale than its marketplace's ("12,99 €" on .com) still
+    parses.
+    """
+    number = _NUMBER_RE.search(text or '')
+    if not number:
+        return None, currency
+    symbol = _CURRENCY_RE.search(text)
+    if symbol:
+        currency = _CURRENCY_BY_SYMBOL[symbol.group(1)]
+    raw = number.group(0).rstrip(' .,\u00a0\u202f\'\t\n')
+    fraction = None if currency in _WHOLE_CURRENCIES else _FRACTION_RE.search(raw)
+    if fraction:
+        raw = _NON_DIGITS_RE.sub('', raw[:fraction.start()]) + '.' + fraction.group(1)
+    else:
+        raw = _NON_DIGITS_RE.sub('', raw)
+    return (raw or None), currency
+
+
+def parse_count(text):
+    """Integer string of the first number in `text` whatever its grouping ("1.234" -> "1234"), or None."""
+    number = _NUMBER_RE.search(text or '')
+    if not number:
+        return None
+    return _NON_DIGITS_RE.sub('', number.group(0)) or None
+
+
+def _region_roots(selectors):
+    """Ids, classes and tag names of the outermost element of each locator."""
+    ids, classes, tags = set(), set(), set()
+    for selector in selectors:
+        for alternative in selector.split(','):
+            head = alternative.split()[0]
+            match = re.match(r'^([a-zA-Z]*)(?:#([\w-]+))?(?:\.([\w-]+))?', head)
+            tag, id_, class_ = match.groups()
+            if id_:
+                ids.add(id_)
+            elif class_:
+                classes.add(class_)
+            else:
+                tags.add(tag)
+    return ids, classes, tags
+
+
+_REGION_IDS, _REGION_CLASSES, _REGION_TAGS = _region_roots(SELECTORS.values())
+
+
+def _in_region(name, attrs):
+    if name in _REGION_TAGS or attrs.get('id') in _REGION_IDS:
+        return True
+    classes = attrs.get('class')
+    if classes:
+        if isinstance(classes, str):
+            classes = classes.split()
+        return any(c in _REGION_CLASSES for c in classes)
+    return False
+
+
+_SOUP = None
+
+
+def _soup():
+    """BeautifulSoup, the region strainer and the compiled selectors, imported on first use."""
+    global _SOUP
+    if _SOUP is None:
+        from bs4 import BeautifulSoup, SoupStrainer
+        import soupsieve
+
+        _SOUP = (BeautifulSoup, SoupStrainer(_in_region),
+                 {key: soupsieve.compile(css) for key, css in SELECTORS.items()})
+    return _SOUP
+
+
+_LXML_SELECTORS = {}
+if lxml is not None:
+    _LXML_SELECTORS = {key: etree.XPath(GenericTranslator().css_to_xpath(css)) for key, css in SELECTORS.items()}
+    _LXML_TEXT = etree.XPath('.//text()[not(ancestor::script) and not(ancestor::style)]')
+
+
+class _SoupDocument:
+    """html.parser backend; only the page regions are kept in the tree."""
+
+    def __init__(self, html, strain=True):
+        beautiful_soup, strainer, self.selectors = _soup()
+        self.root = beautiful_soup(html, 'html.parser', parse_only=strainer if strain else None)
+
+    def first(self, key):
+        return self.selectors[key].select_one(self.root)
+
+    def all(self, key):
+        return self.selectors[key].select(self.root)
+
+    @staticmethod
+    def text(node, sep=''):
+        return node.get_text(sep, strip=True)
+
+    @staticmethod
+    def attr(node, name):
+        return node.get(name)
+
+    @staticmethod
+    def child(node, tag):
+        return node.find(tag)
+
+
+class _LxmlDocument:
+    def __init__(self, html):
+        self.root = lxml.html.fromstring(html)
+
+    def first(self, key):
+        found = _LXML_SELECTORS[key](self.root)
+        return found[0] if found else None
+
+    def all(self, key):
+        return _LXML_SELECTORS[key](self.root)
+
+    @staticmethod
+    def text(node, sep=''):
+        return sep.join(s.strip() for s in _LXML_TEXT(node) if s.strip())
+
+    @staticmethod
+    def attr(node, name):
+        return node.get(name)
+
+    @staticmethod
+    def child(node, tag):
+        return node.find(f'.//{tag}')
+
+
+class _SelectolaxDocument:
+    def __init__(self, html):
+        self.root = _SelectolaxParser(html)
+
+    def first(self, key):
+        return self.root.css_first(SELECTORS[key])
+
+    def all(self, key):
+        return self.root.css(SELECTORS[key])
+
+    @staticmethod
+    def text(node, sep=''):
+        return node.text(separator=sep, strip=True)
+
+    @staticmethod
+    def attr(node, name):
+        return node.attributes.get(name)
+
+    @staticmethod
+    def child(node, tag):
+        return node.css_first(tag)
+
+
+BACKENDS = {'html.parser': _SoupDocument}
+if lxml is not None:
+    BACKENDS['lxml'] = _LxmlDocument
+if _SelectolaxParser is not None:
+    BACKENDS['selectolax'] = _SelectolaxDocument
+
+
+def resolve_backend(name=None):
+    """Return the backend for `name` (or CRAWL_PARSER), falling back to the fastest installed."""
+    name = (name or os.environ.get('CRAWL_PARSER', 'auto') or 'auto').lower()
+    if name in BACKENDS:
+        return name
+    for candidate in ('selectolax', 'lxml', 'html.parser'):
+        if candidate in BACKENDS:
+            return candidate
+
+
+def is_not_found_page(lower_text: str) -> bool:
+    """Detect Amazon's "page not found" page from lower-cased HTML."""
+    return any(kw in lower_text for kw in NOT_FOUND_KEYWORDS)
+
+
+def _best_dynamic_image(raw):
+    try:
+        images_map = json.loads(raw.replace('&quot;', '"'))
+    except Exception:
+        return None
+    best_url = None
+    best_area = -1
+    for u, size in images_map.items():
+        try:
+            area = int(size[0]) * int(size[1])
+        except Exception:
+            area = 0
+        if area > best_area:
+            best_area = area
+            best_url = u
+    return best_url
+
+
+def _group_clock(group_ms):
+    """lap(group) adds the milliseconds since the previous lap to group_ms[group]; a no-op without group_ms."""
+    if group_ms is None:
+        return lambda group: None
+    last = [time.perf_counter()]
+
+    def lap(group):
+        now = time.perf_counter()
+        group_ms[group] = group_ms.get(group, 0.0) + (now - last[0]) * 1000
+        last[0] = now
+
+    return lap
+
+
+def parse_product_page(html, url, backend=None, group_ms=None):
+    """Extract product fields from a product page.
+
+    Returns the same dict shape as the requests engine, with the price's
+    `currency` code; fields that are missing on the page are left as
+    'Not found'. With a `group_ms` dict the
+    time spent per field group (document, title, price, brand, reviews,
+    image, details) is added to it.
+    """
+    lap = _group_clock(group_ms)
+    doc = BACKENDS[resolve_backend(backend)](html)
+    text, attr = doc.text, doc.attr
+    lap('document')
+
+    key = canonicalize(url)
+    asin = key[1] if key else 'Not found'
+    profile = marketplace_profile(url)
+    product_data = {
+        'asin': asin,
+        'date': 'Not found',
+        'rank': 'Not found',
+        'title': 'Product from Amazon',
+        'image_url': 'Not found',
+        'price': 'Not found',
+        'currency': 'Not found',
+        'brand': 'Amazon',
+        'ratings': 'Not found',
+        'stars': 'Not found',
+        'url': url,
+    }
+
+    # Title (prefer explicit span, then the document title)
+    t = doc.first('title')
+    if t is None:
+        t = doc.first('page_title')
+    if t is not None:
+        product_data['title'] = text(t)
+    lap('title')
+
+    # Price (primary then fallback), in the marketplace's number format
+    p = doc.first('price_primary')
+    price_text = text(p) if p is not None else ''
+    if not price_text:
+        p2 = doc.first('price_fallback')
+        price_text = text(p2) if p2 is not None else ''
+    amount, currency = parse_price(price_text, profile['currency'])
+    if amount:
+        product_data['price'] = amount
+        product_data['currency'] = currency
+    lap('price')
+
+    b = doc.first('brand')
+    if b is not None:
+        product_data['brand'] = text(b)
+    lap('brand')
+
+    rc = doc.first('ratings')
+    if rc is not None:
+        product_data['ratings'] = parse_count(text(rc)) or 'Not found'
+
+    st = doc.first('stars')
+    if st is not None:
+        stars_text = text(st)
+        for pattern, decimal in profile['stars_patterns']:
+            m = pattern.search(stars_text)
+            if m:
+                product_data['stars'] = m.group(1).replace(decimal, '.')
+                break
+    lap('reviews')
+
+    # Image (wrapper img, og:image, landingImage, or dynamic JSON)
+    img = doc.first('image_wrapper')
+    og_img = doc.first('og_image')
+    landing_img = doc.first('landing_image')
+    if img is not None and attr(img, 'src'):
+        product_data['image_url'] = attr(img, 'src')
+    elif og_img is not None and attr(og_img, 'content'):
+        product_data['image_url'] = attr(og_img, 'content')
+    elif landing_img is not None and attr(landing_img, 'src'):
+        product_data['image_url'] = attr(landing_img, 'src')
+    elif landing_img is not None and attr(landing_img, 'data-a-dynamic-image'):
+        best_url = _best_dynamic_image(attr(landing_img, 'data-a-dynamic-image'))
+        if best_url:
+            product_data['image_url'] = best_url
+    lap('image')
+
+    # Date First Available (details table)
+    for tr in doc.all('details_rows'):
+        th = doc.child(tr, 'th')
+        td = doc.child(tr, 'td')
+        if th is not None and td is not None and any(k in text(th) for k in profile['date_keywords']):
+            product_data['date'] = text(td)
+            break
+
+    # Rank and date fallback share one walk over the detail bullets
+    need_date = product_data['date'] == 'Not found'
+    for li in doc.all('detail_bullets'):
+        line = text(li, ' ')
+        if product_data['rank'] == 'Not found' and any(k in line for k in profile['rank_keywords']):
+            for pattern in profile['rank_patterns']:
+                m = pattern.search(line)
+                if m:
+                    product_data['rank'] = _NON_DIGITS_RE.sub('', m.group(1))
+                    break
+        if need_date and any(k in line for k in profile['date_keywords']):
+            # Japanese pages use a full-width colon
+            parts = line.replace('：', ':').split(':', 1)
+            if len(parts) == 2:
+                # Amazon wraps the separator in &rlm;/&lrm; marks
+                product_data['date'] = parts[1].strip(' \u200e\u200f\xa0')
+                need_date = False
+        if not need_date and product_data['rank'] != 'Not found':
+            break
+    lap('details')
+
+    return product_data
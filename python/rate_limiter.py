@@ -0,0 +1,138 @@
+"""
+Per-host token-bucket rate limiting with captcha-driven AIMD.
+
+Every host has a bucket refilled at `rate` requests/second, holding at most
+`burst` tokens. Callers reserve a token and get back how long to wait before
+sending; the limiter itself never sleeps, so the same instance serves the
+sequential loop (time.sleep), the async engine (asyncio.sleep) and the
+multi-process mode (the parent reserves, the worker waits until the returned
+start time).
+
+The rate adapts to how the host answers (additive increase, multiplicative
+decrease): every clean response adds `increase / rate` req/s, i.e. about
+`increase` req/s per second of clean traffic, and every captcha multiplies
+the rate by `decrease`. The rate stays within [min_rate, max_rate].
+
+An unlimited host (rate=None) is sent requests without waiting until it
+answers with a captcha; it then counts as having run at `max_rate` and gets a
+bucket at `max_rate * decrease`, adapting like the others from there on.
+
+`host_rates` sets the starting rate of particular hosts or domains
+({'amazon.co.jp': 0.5} applies to www.amazon.co.jp too); other hosts start
+at `rate`. Each host throttles on its own, and wait_time() lets the crawl
+loops pick a URL of a host that has a token instead of sleeping on one that
+has none.
+"""
+
+import threading
+import time
+from collections import deque
+
+
+class HostRateLimiter:
+    def __init__(self, rate=None, min_rate: float = 0.2, max_rate: float = 20.0, burst: float = 2,
+                 increase: float = 0.5, decrease: float = 0.5, window: int = 100, clock=time.time,
+                 host_rates=None):
+        # rate=None: no limit until the host's first captcha
+        self.initial_rate = rate
+        self.host_rates = dict(host_rates or {})
+        self.min_rate = min_rate
+        self.max_rate = max(min_rate, max_rate)
+        self.burst = max(1.0, burst)
+        self.increase = increase
+        self.decrease = decrease
+        self.window = window
+        self.clock = clock
+        self.hosts = {}
+        self.lock = threading.Lock()
+
+    def _bucket(self, host):
+        bucket = self.hosts.get(host)
+        if bucket is None:
+            rate = None
+            initial_rate = self._initial_rate(host)
+            if initial_rate:
+                rate = min(self.max_rate, max(self.min_rate, initial_rate))
+            bucket = {'rate': rate, 'tokens': self.burst, 'updated': self.clock(),
+                      'outcomes': deque(maxlen=self.window)}
+            self.hosts[host] = bucket
+        return bucket
+
+    def _initial_rate(self, host):
+        name = host.split(':')[0].lower()
+        for domain, rate in self.host_rates.items():
+            if name == domain or name.endswith('.' + domain):
+                return rate
+        return self.initial_rate
+
+    def wait_time(self, host):
+        """Seconds until `host` has a whole token again (0 when a request could go now); reserves nothing."""
+        with self.lock:
+            bucket = self._bucket(host)
+            if bucket['rate'] is None:
+                return 0.0
+            tokens = min(self.burst, bucket['tokens'] + (self.clock() - bucket['updated']) * bucket['rate'])
+            return 0.0 if tokens >= 1 else (1 - tokens) / bucket['rate']
+
+    def reserve(self, host):
+        """Take a token for one request to `host`. Returns the seconds to wait before sending it."""
+        with self.lock:
+            bucket = self._bucket(host)
+            if bucket['rate'] is None:
+                return 0.0
+            now = self.clock()
+            bucket['tokens'] = min(self.burst, bucket['tokens'] + (now - bucket['updated']) * bucket['rate'])
+            bucket['updated'] = now
+            bucket['tokens'] -= 1
+            if bucket['tokens'] >= 0:
+                return 0.0
+            # In debt: this request goes out once the deficit has been refilled
+            return -bucket['tokens'] / bucket['rate']
+
+    def record(self, host, captcha: bool):
+        """Feed back one response from `host`. Returns the new rate (None when unlimited)."""
+        with self.lock:
+            bucket = self._bucket(host)
+            bucket['outcomes'].append(bool(captcha))
+            rate = bucket['rate']
+            if rate is None and captcha:
+                # First captcha of an unlimited host: throttle it from here on
+                bucket['rate'] = self.max_rate
+                bucket['tokens'] = 0.0
+                bucket['updated'] = self.clock()
+                rate = self.max_rate
+            if rate is not None:
+                if captcha:
+                    rate = max(self.min_rate, rate * self.decrease)
+                else:
+                    rate = min(self.max_rate, rate + self.increase / rate)
+                # Settle the bucket at the old rate before switching
+                now = self.clock()
+                bucket['tokens'] = min(self.burst, bucket['tokens'] + (now - bucket['updated']) * bucket['rate'])
+                bucket['updated'] = now
+                bucket['rate'] = rate
+            return rate
+
+    def rate(self, host):
+        with self.lock:
+            return self._bucket(host)['rate']
+
+    def captcha_ratio(self, host=None):
+        """Share of captcha answers among the last `window` responses (of `host`, or of all hosts)."""
+        with self.lock:
+            if host is not None:
+                outcomes = list(self._bucket(host)['outcomes'])
+            else:
+                outcomes = [o for b in self.hosts.values() for o in b['outcomes']]
+            return sum(outcomes) / len(outcomes) if outcomes else 0.0
+
+    def stats(self):
+        """{host: {'rate', 'captcha_ratio'}} for every host seen so far."""
+        with self.lock:
+            return {
+                host: {
+                    'rate': bucket['rate'],
+                    'captcha_ratio': sum(bucket['outcomes']) / len(bucket['outcomes']) if bucket['outcomes'] else 0.0,
+                }
+                for host, bucket in self.hosts.items()
+            }
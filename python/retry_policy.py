@@ -0,0 +1,180 @@
+"""
+Retry scheduling for failed crawl URLs.
+
+Failed URLs are not pushed straight back onto the work queue. Each failure is
+classified first:
+
+- permanent (404/410, "product not found"): never retried
+- captcha (captcha page, 403/429/503): the whole host cools down for
+  CAPTCHA_COOLDOWN_MS and the URL is retried after that
+- transient (timeouts, connection errors, incomplete pages): retried after an
+  exponential backoff with jitter, RETRY_BASE_MS * 2^attempt capped at
+  RETRY_MAX_MS
+
+Delayed URLs wait in a min-heap keyed by the time they become eligible, so the
+crawl loops keep working on ready URLs instead of sleeping.
+"""
+
+import heapq
+import itertools
+import os
+import random
+import time
+from collections import deque
+from urllib.parse import urlparse
+
+PERMANENT = 'permanent'
+CAPTCHA = 'captcha'
+TRANSIENT = 'transient'
+
+# HTTP statuses that mean the page will never exist / that the host is throttling us
+PERMANENT_STATUSES = (404, 410)
+THROTTLE_STATUSES = (403, 429, 503)
+
+
+def classify_error(product_data):
+    """Return PERMANENT, CAPTCHA or TRANSIENT for a failed crawl result."""
+    if not product_data:
+        return TRANSIENT
+    kind = product_data.get('error_kind')
+    if kind in (PERMANENT, CAPTCHA, TRANSIENT):
+        return kind
+    error = str(product_data.get('error', '')).lower()
+    if 'not found' in error or product_data.get('title') == 'Product Not Found':
+        return PERMANENT
+    if 'captcha' in error:
+        return CAPTCHA
+    return TRANSIENT
+
+
+def classify_status(status_code):
+    if status_code in PERMANENT_STATUSES:
+        return PERMANENT
+    if status_code in THROTTLE_STATUSES:
+        return CAPTCHA
+    return TRANSIENT
+
+
+class RetryQueue:
+    """Work queue of crawl items ({'url', 'attempts'}) with delayed retries.
+
+    `pop_ready()` returns the next URL that may be fetched now, or None when
+    every remaining URL is waiting for its backoff or for its host's captcha
+    cooldown; `next_wait()` says how long until one becomes eligible.
+
+    Ready URLs wait in one FIFO lane per host and hosts take turns, so a run
+    over several marketplaces interleaves them. With a `wait(host)` callback
+    pop_ready() also skips hosts that cannot take a request yet (no rate
+    limit token, or too many fetches in flight) and serves the others.
+    """
+
+    def __init__(self, items=(), clock=time.monotonic):
+        self.clock = clock
+        # host -> deque of ready items; dict order is the round-robin order
+        self.lanes = {}
+        self.ready_count = 0
+        self.delayed = []
+        self.host_cooldown = {}
+        # Set by pop_ready() when it returned None although URLs were ready
+        self.blocked = False
+        self.blocked_wait = None
+        self._seq = itertools.count()
+        for item in items:
+            self.append(item)
+        try:
+            self.base_delay = max(0, int(os.environ.get('RETRY_BASE_MS', '1000'))) / 1000.0
+        except Exception:
+            self.base_delay = 1.0
+        try:
+            self.max_delay = max(self.base_delay, int(os.environ.get('RETRY_MAX_MS', '60000')) / 1000.0)
+        except Exception:
+            self.max_delay = max(self.base_delay, 60.0)
+        try:
+            self.captcha_cooldown = max(0, int(os.environ.get('CAPTCHA_COOLDOWN_MS', '60000'))) / 1000.0
+        except Exception:
+            self.captcha_cooldown = 60.0
+
+    def __len__(self):
+        return self.ready_count + len(self.delayed)
+
+    def append(self, item):
+        host = urlparse(item['url']).netloc
+        lane = self.lanes.get(host)
+        if lane is None:
+            lane = self.lanes[host] = deque()
+        lane.append(item)
+        self.ready_count += 1
+
+    def backoff(self, attempts):
+        """Exponential backoff with jitter: half fixed, half random."""
+        delay = min(self.max_delay, self.base_delay * (2 ** max(0, attempts - 1)))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def retry(self, item, kind):
+        """Schedule `item` (attempts already incremented) after a failure of class `kind`.
+
+        Returns the delay in seconds.
+        """
+        now = self.clock()
+        eligible_at = now + self.backoff(item['attempts'])
+        if kind == CAPTCHA:
+            host = urlparse(item['url']).netloc
+            cooldown_until = max(self.host_cooldown.get(host, 0), now + self.captcha_cooldown)
+            self.host_cooldown[host] = cooldown_until
+            eligible_at = max(eligible_at, cooldown_until)
+        heapq.heappush(self.delayed, (eligible_at, next(self._seq), item))
+        return eligible_at - now
+
+    def pop_ready(self, wait=None):
+        """Next URL to fetch, taking hosts in turn, or None.
+
+        `wait(host)` returns the seconds until `host` may get another request
+        (0: now, None: not before one of its fetches finishes); hosts that
+        have to wait are skipped.
+        """
+        now = self.clock()
+        while self.delayed and self.delayed[0][0] <= now:
+            self.append(heapq.heappop(self.delayed)[2])
+        self.blocked = False
+        self.blocked_wait = None
+        for host in list(self.lanes):
+            lane = self.lanes[host]
+            cooldown_until = self.host_cooldown.get(host, 0)
+            if cooldown_until > now:
+                # Host is cooling down after a captcha: park its URLs until it ends
+                for item in lane:
+                    heapq.heappush(self.delayed, (cooldown_until, next(self._seq), item))
+                self.ready_count -= len(lane)
+                del self.lanes[host]
+                continue
+            if wait is not None:
+                seconds = wait(host)
+                if seconds is None or seconds > 0:
+                    if seconds is not None and (self.blocked_wait is None or seconds < self.blocked_wait):
+                        self.blocked_wait = seconds
+                    continue
+            item = lane.popleft()
+            self.ready_count -= 1
+            # The host goes to the back of the round
+            del self.lanes[host]
+            if lane:
+                self.lanes[host] = lane
+            return item
+        self.blocked = bool(self.lanes)
+        return None
+
+    def next_wait(self):
+        """Seconds until a URL becomes eligible (0 if one is ready now), None if only in-flight fetches can free one.
+
+        After pop_ready() skipped every ready host, that is the shortest host
+        wait it was given, or a delayed URL's eligibility if that comes first.
+        """
+        waits = []
+        if self.lanes:
+            if not self.blocked:
+                return 0.0
+            if self.blocked_wait is not None:
+                waits.append(self.blocked_wait)
+        if self.delayed:
+            waits.append(max(0.0, self.delayed[0][0] - self.clock()))
+        return min(waits) if waits else None
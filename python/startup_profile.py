@@ -0,0 +1,87 @@
+"""
+Startup-time breakdown for `crawl_and_update_fixed.py --profile-startup`.
+
+Starts a fresh interpreter with `-X importtime`, imports the crawler and
+builds an AmazonProductCrawler, i.e. everything that happens before the
+first request can be sent. Prints the wall time of that process, the crawler
+import and construction times, and the slowest imports (cumulative, the
+crawler's own imports and anything imported at interpreter startup or
+during construction).
+"""
+
+import json
+import os
+import subprocess
+import sys
+import time
+
+CHILD_SCRIPT = """
+import json, time
+started = time.perf_counter()
+import crawl_and_update_fixed
+imported = time.perf_counter()
+crawl_and_update_fixed.AmazonProductCrawler()
+ready = time.perf_counter()
+print(json.dumps({'import_ms': (imported - started) * 1000, 'init_ms': (ready - imported) * 1000}))
+"""
+
+
+def parse_importtime(lines):
+    """(depth, self_us, cumulative_us, module) for each `-X importtime` line."""
+    entries = []
+    for line in lines:
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+            self_us, cumulative_us = int(self_us), int(cumulative_us)
+        except ValueError:
+            continue
+        name = name.rstrip()
+        # One space after the bar, then two per nesting level
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        entries.append((depth, self_us, cumulative_us, name.strip()))
+    return entries
+
+
+def slowest_imports(entries, module='crawl_and_update_fixed'):
+    """Top-level imports, with `module` replaced by its direct imports."""
+    rows = []
+    # importtime prints children before their parent
+    children = []
+    for depth, self_us, cumulative_us, name in entries:
+        if depth == 1:
+            children.append((cumulative_us, name))
+        elif depth == 0:
+            if name == module:
+                rows.extend(children)
+                rows.append((self_us, f'{name} (module body)'))
+            else:
+                rows.append((cumulative_us, name))
+            children = []
+    return sorted(rows, reverse=True)
+
+
+def print_startup_profile(top=15):
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ)
+    # The profiled crawler must not write into a live event stream
+    env.pop('CRAWL_EVENTS_FD', None)
+    started = time.perf_counter()
+    child = subprocess.run([sys.executable, '-X', 'importtime', '-c', CHILD_SCRIPT],
+                           cwd=script_dir, env=env, capture_output=True, text=True)
+    wall_ms = (time.perf_counter() - started) * 1000
+    if child.returncode != 0:
+        print(f"Startup profile failed:\n{child.stderr[-2000:]}")
+        return 1
+    timings = json.loads(child.stdout.strip().splitlines()[-1])
+    entries = parse_importtime(child.stderr.splitlines())
+
+    print(f"Startup profile (Python {sys.version.split()[0]})")
+    print(f"  {'interpreter start -> crawler ready':<40} {wall_ms:>9.1f} ms")
+    print(f"  {'import crawl_and_update_fixed':<40} {timings['import_ms']:>9.1f} ms")
+    print(f"  {'AmazonProductCrawler()':<40} {timings['init_ms']:>9.1f} ms")
+    print("  Slowest imports (cumulative):")
+    for cumulative_us, name in slowest_imports(entries)[:top]:
+        print(f"  {name:<40} {cumulative_us / 1000:>9.1f} ms")
+    return 0
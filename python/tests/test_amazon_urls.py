@@ -0,0 +1,28 @@
+import json
+import os
+
+import pytest
+
+from amazon_urls import canonical_url, canonicalize
+
+# Shared with src/utils/amazonUrl.js (tests/check_amazon_urls.js)
+CASES_PATH = os.path.join(os.path.dirname(__file__), '..', '..', 'tests', 'amazon_url_cases.json')
+
+with open(CASES_PATH, encoding='utf-8') as cases_file:
+    CASES = json.load(cases_file)
+
+
+@pytest.mark.parametrize('case', CASES, ids=[case['url'] or '<empty>' for case in CASES])
+def test_canonicalize(case):
+    expected = (case['marketplace'], case['asin']) if case['asin'] else None
+    assert canonicalize(case['url']) == expected
+
+
+@pytest.mark.parametrize('url, canonical', [
+    ('https://www.amazon.de/Widget/dp/b000000001/ref=sr_1_1?th=1', 'https://www.amazon.de/dp/B000000001'),
+    ('https://smile.amazon.com/gp/product/B000000001', 'https://www.amazon.com/dp/B000000001'),
+    ('http://127.0.0.1:8000/Widget/dp/B000000001?x=1', 'http://127.0.0.1:8000/dp/B000000001'),
+    ('https://www.amazon.com/s?k=widget', 'https://www.amazon.com/s?k=widget'),
+])
+def test_canonical_url(url, canonical):
+    assert canonical_url(url) == canonical
@@ -0,0 +1,119 @@
+import io
+
+import pytest
+
+from asin_import import import_asins, iter_rows, parse_entry, parse_tags
+from db_utils import DatabaseManager
+
+
+@pytest.fixture
+def db(tmp_path):
+    manager = DatabaseManager(str(tmp_path / 'database' / 'database.db'))
+    manager.init_tables()
+    yield manager
+    manager.close()
+
+
+def _tracked(db):
+    db.cursor.execute('SELECT marketplace, asin, url, tags FROM tracked_asins ORDER BY marketplace, asin')
+    return db.cursor.fetchall()
+
+
+def _import(db, text, **kwargs):
+    return import_asins(db, io.StringIO(text), **kwargs)
+
+
+@pytest.mark.parametrize('value, market, entry', [
+    ('b000000001', None, ('amazon.com', 'B000000001', 'https://www.amazon.com/dp/B000000001')),
+    ('B000000001', 'www.amazon.de', ('amazon.de', 'B000000001', 'https://www.amazon.de/dp/B000000001')),
+    ('https://www.amazon.co.uk/Widget/dp/B000000001?th=1', 'amazon.de',
+     ('amazon.co.uk', 'B000000001', 'https://www.amazon.co.uk/dp/B000000001')),
+    ('http://127.0.0.1:8000/dp/B000000001', None, ('127.0.0.1:8000', 'B000000001', 'http://127.0.0.1:8000/dp/B000000001')),
+    ('B000000001', 'example.com', None),
+    ('B00000001', None, None),
+    ('https://www.amazon.com/s?k=widget', None, None),
+])
+def test_parse_entry(value, market, entry):
+    assert parse_entry(value, market) == entry
+
+
+def test_parse_tags_merges_and_dedupes():
+    assert parse_tags('toys,kids', 'kids;summer|sale', None) == 'toys,kids,summer,sale'
+    assert parse_tags(None, ' ; ') is None
+
+
+def test_lines_skip_blanks_and_comments():
+    stream = io.StringIO('# my list\n\nB000000001\n  https://www.amazon.de/dp/B000000002  \n#B000000003\n')
+    assert list(iter_rows(stream)) == [
+        (3, 'B000000001', None, None),
+        (4, 'https://www.amazon.de/dp/B000000002', None, None),
+    ]
+
+
+def test_csv_is_detected_from_a_header():
+    stream = io.StringIO('\nTags,ASIN,Marketplace\n"toys,kids",B000000001,amazon.de\n,B000000002,\n')
+    assert list(iter_rows(stream)) == [
+        (3, 'B000000001', 'amazon.de', 'toys,kids'),
+        (4, 'B000000002', '', ''),
+    ]
+
+
+def test_csv_is_detected_from_a_bare_asin_and_a_comma():
+    stream = io.StringIO('B000000001,amazon.co.jp,toys\nB000000002\n')
+    assert list(iter_rows(stream)) == [(1, 'B000000001', 'amazon.co.jp', 'toys'), (2, 'B000000002', None, None)]
+
+
+def test_url_with_commas_stays_one_line_entry():
+    url = 'https://www.amazon.com/Widget-Red,Blue/dp/B000000001'
+    assert list(iter_rows(io.StringIO(url + '\n'))) == [(1, url, None, None)]
+
+
+def test_import_summary_and_rows(db):
+    text = '\n'.join([
+        'asin,marketplace,tags',
+        'B000000001,,toys',
+        'https://www.amazon.com/Widget/dp/B000000001?th=1,,kids',
+        'B000000001,amazon.de,',
+        'not an asin,,',
+        'B000000002,example.com,',
+    ])
+    summary = _import(db, text, tags='q3')
+    assert summary == {
+        'read': 5, 'imported': 2, 'duplicates': 1, 'rejected': 2, 'tracked': 2,
+        'rejected_samples': [{'line': 5, 'value': 'not an asin'}, {'line': 6, 'value': 'B000000002'}],
+    }
+    assert _tracked(db) == [
+        ('amazon.com', 'B000000001', 'https://www.amazon.com/dp/B000000001', 'toys,q3,kids'),
+        ('amazon.de', 'B000000001', 'https://www.amazon.de/dp/B000000001', 'q3'),
+    ]
+
+
+def test_repeats_across_batches_and_imports_merge_tags(db):
+    _import(db, 'B000000001,,a\nB000000002,,a\nB000000001,,b\n', batch_size=1)
+    summary = _import(db, 'B000000001,,c\nB000000003,,c\n', batch_size=1)
+    assert (summary['imported'], summary['duplicates'], summary['tracked']) == (1, 1, 3)
+    assert [row[3] for row in _tracked(db)] == ['a,b,c', 'a', 'c']
+
+
+def test_batches_are_written_while_the_stream_is_read(db):
+    counts = []
+
+    def lines():
+        for n in range(1, 8):
+            yield f'B00000000{n}\n'
+            db.cursor.execute('SELECT COUNT(*) FROM tracked_asins')
+            counts.append(db.cursor.fetchone()[0])
+
+    summary = import_asins(db, lines(), batch_size=3)
+    assert summary['imported'] == 7
+    # Only the current batch is held in memory
+    assert counts == [0, 0, 3, 3, 3, 6, 6]
+
+
+def test_page_cache_is_restored(db):
+    db.connect()
+    db.cursor.execute('PRAGMA cache_size')
+    cache_size = db.cursor.fetchone()[0]
+    _import(db, 'B000000001\n', cache_mb=64)
+    db.cursor.execute('PRAGMA cache_size')
+    assert db.cursor.fetchone()[0] == cache_size
@@ -0,0 +1,158 @@
+import json
+import threading
+import time
+
+import pytest
+
+from amazon_urls import canonicalize
+from crawl_daemon import INTERNAL_ERROR, INVALID_PARAMS, METHOD_NOT_FOUND, PARSE_ERROR, SHUTTING_DOWN, CrawlDaemon
+
+URL_1 = 'https://www.amazon.com/dp/B000000001'
+URL_1_VARIANT = 'https://www.amazon.com/Widget/dp/B000000001?th=1'
+URL_2 = 'https://www.amazon.com/dp/B000000002'
+URL_3 = 'https://www.amazon.com/dp/B000000003'
+
+
+class FakeCrawler:
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.calls = []
+        self.completed_urls = set()
+        self.run_id = None
+
+    def url_key(self, url):
+        return canonicalize(url) or url
+
+    def crawl_urls(self, urls):
+        if 'boom' in urls[0]:
+            raise RuntimeError('driver crashed')
+        self.calls.append(list(urls))
+        self.run_id = len(self.calls)
+        self.completed_urls = set(urls) - self.failing
+
+
+class Output:
+    def __init__(self):
+        self.messages = []
+
+    def write(self, text):
+        self.messages.append(json.loads(text))
+
+    def flush(self):
+        pass
+
+
+@pytest.fixture
+def out():
+    return Output()
+
+
+def _request(daemon, method, params=None, request_id=None):
+    message = {'jsonrpc': '2.0', 'id': request_id, 'method': method}
+    if params is not None:
+        message['params'] = params
+    daemon.handle_line(json.dumps(message))
+
+
+def _run(daemon, out, responses):
+    """Work off the queued jobs until `responses` messages were sent, then stop the worker."""
+    worker = threading.Thread(target=daemon.work, daemon=True)
+    worker.start()
+    deadline = time.monotonic() + 5
+    while len(out.messages) < responses and time.monotonic() < deadline:
+        time.sleep(0.01)
+    daemon.stop()
+    worker.join(5)
+    return {message['id']: message for message in out.messages}
+
+
+def test_urls_of_a_queued_job_are_merged_into_it(out):
+    crawler = FakeCrawler(failing={URL_1})
+    daemon = CrawlDaemon(crawler, rpc_out=out)
+    _request(daemon, 'crawl', {'urls': [URL_1, URL_2]}, 1)
+    _request(daemon, 'crawl', {'urls': [URL_1_VARIANT, URL_3]}, 2)
+    assert daemon.status()['queued'] == [
+        {'job': 1, 'method': 'crawl', 'state': 'queued', 'urls': 2, 'merged': 0},
+        {'job': 2, 'method': 'crawl', 'state': 'queued', 'urls': 1, 'merged': 1},
+    ]
+    responses = _run(daemon, out, 2)
+    assert crawler.calls == [[URL_1, URL_2], [URL_3]]
+    assert responses[1]['result'] == {'job': 1, 'run_id': 1, 'success': True, 'total': 2, 'crawled': 2,
+                                      'merged': 0, 'failed': [URL_1]}
+    # The merged URL reports the outcome of the job that crawled it
+    assert responses[2]['result'] == {'job': 2, 'run_id': 2, 'success': True, 'total': 2, 'crawled': 1,
+                                      'merged': 1, 'failed': [URL_1_VARIANT]}
+    assert daemon.claims == {}
+
+
+def test_repeats_within_a_job_are_crawled_once(out):
+    crawler = FakeCrawler()
+    daemon = CrawlDaemon(crawler, rpc_out=out)
+    _request(daemon, 'crawl', {'urls': [URL_1, URL_1_VARIANT]}, 1)
+    responses = _run(daemon, out, 1)
+    assert crawler.calls == [[URL_1]]
+    assert responses[1]['result']['failed'] == []
+    assert (responses[1]['result']['crawled'], responses[1]['result']['merged']) == (1, 1)
+
+
+def test_claims_are_released_when_a_job_finishes(out):
+    crawler = FakeCrawler()
+    daemon = CrawlDaemon(crawler, rpc_out=out)
+    _request(daemon, 'crawl', {'urls': [URL_1]}, 1)
+    _run(daemon, out, 1)
+    daemon.stopping = False
+    _request(daemon, 'crawl', {'urls': [URL_1_VARIANT]}, 2)
+    _run(daemon, out, 2)
+    assert crawler.calls == [[URL_1], [URL_1_VARIANT]]
+
+
+def test_failed_job_reports_an_error_and_releases_its_claims(out):
+    daemon = CrawlDaemon(FakeCrawler(), rpc_out=out)
+    _request(daemon, 'crawl', {'urls': ['https://www.amazon.com/boom/dp/B000000001', URL_2]}, 1)
+    responses = _run(daemon, out, 1)
+    assert responses[1]['error'] == {'code': INTERNAL_ERROR, 'message': 'driver crashed'}
+    assert daemon.claims == {}
+
+
+def test_scheduler_tick_skips_urls_claimed_by_queued_jobs(out):
+    crawler = FakeCrawler()
+    due = []
+
+    def run_due(crawler, tick_minutes, select):
+        due.append(tick_minutes)
+        urls = select([URL_1, URL_2])
+        crawler.crawl_urls(urls)
+        return 0
+
+    daemon = CrawlDaemon(crawler, run_due=run_due, rpc_out=out)
+    _request(daemon, 'crawl_due', {'tick_minutes': 5}, 1)
+    _request(daemon, 'crawl', {'urls': [URL_1_VARIANT]}, 2)
+    responses = _run(daemon, out, 2)
+    assert due == [5]
+    assert crawler.calls == [[URL_2], [URL_1_VARIANT]]
+    assert responses[1]['result'] == {'job': 1, 'run_id': 1, 'success': True, 'total': 1, 'merged': 1, 'crawled': 1}
+
+
+@pytest.mark.parametrize('line, code', [
+    ('{not json', PARSE_ERROR),
+    ('{"jsonrpc": "2.0", "id": 1, "method": "crawl", "params": {"urls": []}}', INVALID_PARAMS),
+    ('{"jsonrpc": "2.0", "id": 1, "method": "crawl", "params": {"urls": [1]}}', INVALID_PARAMS),
+    ('{"jsonrpc": "2.0", "id": 1, "method": "crawl", "params": [1]}', INVALID_PARAMS),
+    ('{"jsonrpc": "2.0", "id": 1, "method": "crawl_due"}', METHOD_NOT_FOUND),
+    ('{"jsonrpc": "2.0", "id": 1, "method": "fly"}', METHOD_NOT_FOUND),
+])
+def test_bad_requests_are_answered_with_errors(out, line, code):
+    daemon = CrawlDaemon(FakeCrawler(), rpc_out=out)
+    daemon.handle_line(line)
+    assert out.messages[0]['error']['code'] == code
+    assert not daemon.jobs
+
+
+def test_shutdown_drops_queued_jobs(out):
+    daemon = CrawlDaemon(FakeCrawler(), rpc_out=out)
+    _request(daemon, 'crawl', {'urls': [URL_1]}, 1)
+    _request(daemon, 'shutdown', request_id=2)
+    _request(daemon, 'crawl', {'urls': [URL_2]}, 3)
+    assert [(message['id'], message.get('result') or message['error']['code']) for message in out.messages] == [
+        (2, {'stopping': True}), (1, SHUTTING_DOWN), (3, SHUTTING_DOWN),
+    ]
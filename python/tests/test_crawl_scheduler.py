@@ -0,0 +1,183 @@
+import json
+
+import pytest
+
+from amazon_urls import canonicalize
+from crawl_scheduler import CrawlScheduler
+from db_utils import DatabaseManager
+
+URL_1 = 'https://www.amazon.com/dp/B000000001'
+URL_2 = 'https://www.amazon.com/dp/B000000002'
+URL_DE = 'https://www.amazon.de/dp/B000000001'
+
+
+@pytest.fixture
+def db(tmp_path):
+    manager = DatabaseManager(str(tmp_path / 'database' / 'database.db'))
+    manager.init_tables()
+    yield manager
+    manager.close()
+
+
+@pytest.fixture
+def scheduler(db, monkeypatch):
+    monkeypatch.setenv('CRAWL_BUDGET_PER_HOUR', '8')
+    monkeypatch.setenv('SCHEDULE_MIN_MINUTES', '30')
+    monkeypatch.setenv('SCHEDULE_MAX_MINUTES', '600')
+    # settings.crawl_interval defaults to 2 hours: a 120 minute base interval
+    return CrawlScheduler(db, tick_minutes=15)
+
+
+def _list_urls(db, urls):
+    db.cursor.execute('INSERT INTO url_lists (urls) VALUES (?)', (json.dumps(urls),))
+    db.conn.commit()
+
+
+def _schedule(db):
+    db.cursor.execute(
+        '''SELECT marketplace, asin, interval_minutes, volatility,
+                  ROUND((julianday(next_due_at) - julianday('now')) * 1440)
+           FROM crawl_schedule ORDER BY marketplace, asin'''
+    )
+    return db.cursor.fetchall()
+
+
+def _history(db, asin, *ranks, minutes_ago=60):
+    """History points, newest first, one minute apart from `minutes_ago` minutes ago."""
+    for offset, rank in enumerate(ranks):
+        db.cursor.execute(
+            "INSERT INTO rank_history (asin, rank, recorded_at) VALUES (?, ?, datetime('now', ?))",
+            (asin, rank, f'-{minutes_ago + offset} minutes'),
+        )
+    db.conn.commit()
+
+
+def _run_started(db):
+    db.cursor.execute("SELECT datetime('now', '-5 minutes')")
+    return db.cursor.fetchone()[0]
+
+
+def test_listed_and_imported_products_are_due_at_once(db, scheduler):
+    _list_urls(db, [URL_1, URL_1 + '?th=1', URL_DE, 'https://www.amazon.com/s?k=widget'])
+    db.cursor.execute("INSERT INTO tracked_asins (marketplace, asin, url) VALUES ('amazon.com', 'B000000002', ?)", (URL_2,))
+    db.conn.commit()
+    assert scheduler.sync_from_url_lists(canonicalize) == 3
+    assert _schedule(db) == [
+        ('amazon.com', 'B000000001', 120.0, 0.0, 0.0),
+        ('amazon.com', 'B000000002', 120.0, 0.0, 0.0),
+        ('amazon.de', 'B000000001', 120.0, 0.0, 0.0),
+    ]
+
+
+def test_products_dropped_from_both_lists_are_unscheduled(db, scheduler):
+    _list_urls(db, [URL_1, URL_2])
+    scheduler.sync_from_url_lists(canonicalize)
+    _list_urls(db, [URL_2, URL_DE])
+    assert scheduler.sync_from_url_lists(canonicalize) == 2
+    assert [row[:2] for row in _schedule(db)] == [('amazon.com', 'B000000002'), ('amazon.de', 'B000000001')]
+
+
+def test_sync_is_skipped_while_the_lists_are_unchanged(db, scheduler):
+    _list_urls(db, [URL_1])
+    scheduler.sync_from_url_lists(canonicalize)
+    db.cursor.execute('DELETE FROM crawl_schedule')
+    db.conn.commit()
+    assert scheduler.sync_from_url_lists(canonicalize) == 0
+    _list_urls(db, [URL_1])
+    assert scheduler.sync_from_url_lists(canonicalize) == 1
+
+
+def test_due_urls_most_overdue_first_within_the_tick_budget(db, scheduler):
+    urls = [f'https://www.amazon.com/dp/B00000000{n}' for n in range(1, 6)]
+    _list_urls(db, urls)
+    scheduler.sync_from_url_lists(canonicalize)
+    for n, url in enumerate(urls):
+        db.cursor.execute("UPDATE crawl_schedule SET next_due_at = datetime('now', ?) WHERE url = ?", (f'-{n} hours', url))
+    db.cursor.execute("UPDATE crawl_schedule SET next_due_at = datetime('now', '+1 hour') WHERE url = ?", (urls[4],))
+    db.conn.commit()
+    # 8 per hour, 15 minute ticks: 2 per tick
+    assert scheduler.due_urls() == [urls[3], urls[2]]
+    assert scheduler.due_urls(limit=10) == [urls[3], urls[2], urls[1], urls[0]]
+
+
+@pytest.mark.parametrize('ranks, volatility', [
+    ((), 0.0),
+    ((100,), 0.0),
+    ((100, 100, 100), 0.0),
+    # Newest first: 121 -> 110 -> 100 moves by 10% each time
+    ((121, 110, 100), 0.1),
+    ((100, 50), 1.0),
+])
+def test_volatility(db, scheduler, ranks, volatility):
+    _history(db, 'B000000001', *ranks)
+    assert scheduler.volatility('amazon.com', 'B000000001') == pytest.approx(volatility)
+
+
+def test_volatility_only_looks_at_recent_points(db, scheduler):
+    _history(db, 'B000000001', 100, 200, 400, minutes_ago=8 * 24 * 60)
+    _history(db, 'B000000001', 100, 100)
+    assert scheduler.volatility('amazon.com', 'B000000001') == 0.0
+
+
+def _synced(db, scheduler, *urls):
+    _list_urls(db, list(urls))
+    scheduler.sync_from_url_lists(canonicalize)
+
+
+def test_volatile_product_is_crawled_sooner(db, scheduler):
+    _synced(db, scheduler, URL_1)
+    _history(db, 'B000000001', 110, 100)
+    _history(db, 'B000000001', 121, minutes_ago=0)
+    assert scheduler.reschedule([URL_1], {URL_1}, _run_started(db), canonicalize) == 1
+    # base / (1 + 10 * 0.1) = 60, below 120 / 1.5
+    assert _schedule(db) == [('amazon.com', 'B000000001', 60.0, pytest.approx(0.1), 60.0)]
+
+
+def test_moved_rank_shortens_at_least_by_the_backoff_factor(db, scheduler):
+    _synced(db, scheduler, URL_1)
+    _history(db, 'B000000001', 100)
+    _history(db, 'B000000001', 101, minutes_ago=0)
+    scheduler.reschedule([URL_1], {URL_1}, _run_started(db), canonicalize)
+    assert _schedule(db)[0][2] == 80.0
+
+
+def test_stable_product_backs_off(db, scheduler):
+    _synced(db, scheduler, URL_1)
+    _history(db, 'B000000001', 100, 100)
+    run_started = _run_started(db)
+    scheduler.reschedule([URL_1], {URL_1}, run_started, canonicalize)
+    assert _schedule(db)[0][2:] == (180.0, 0.0, 180.0)
+    scheduler.reschedule([URL_1], {URL_1}, run_started, canonicalize)
+    scheduler.reschedule([URL_1], {URL_1}, run_started, canonicalize)
+    # Capped at SCHEDULE_MAX_MINUTES
+    assert _schedule(db)[0][2] == 405.0
+    scheduler.reschedule([URL_1], {URL_1}, run_started, canonicalize)
+    assert _schedule(db)[0][2] == 600.0
+
+
+def test_first_point_of_a_new_product_is_not_a_move(db, scheduler):
+    _synced(db, scheduler, URL_1)
+    _history(db, 'B000000001', 100, minutes_ago=0)
+    scheduler.reschedule([URL_1], {URL_1}, _run_started(db), canonicalize)
+    assert _schedule(db)[0][2] == 180.0
+
+
+def test_failed_crawl_is_retried_after_the_minimum_interval(db, scheduler):
+    _synced(db, scheduler, URL_1, URL_2)
+    db.cursor.execute("UPDATE crawl_schedule SET volatility = 0.3 WHERE asin = 'B000000002'")
+    db.conn.commit()
+    scheduler.reschedule([URL_2, 'https://www.amazon.com/s?k=widget', URL_DE], set(), _run_started(db), canonicalize)
+    # Interval and volatility are kept; unknown and unscheduled URLs are ignored
+    assert _schedule(db) == [
+        ('amazon.com', 'B000000001', 120.0, 0.0, 0.0),
+        ('amazon.com', 'B000000002', 120.0, 0.3, 30.0),
+    ]
+
+
+def test_base_interval_follows_the_crawl_interval_setting(db, scheduler):
+    db.cursor.execute("UPDATE settings SET value = '0.25' WHERE key = 'crawl_interval'")
+    db.conn.commit()
+    assert scheduler.base_minutes() == 30.0
+    db.cursor.execute("UPDATE settings SET value = 'often' WHERE key = 'crawl_interval'")
+    db.conn.commit()
+    assert scheduler.base_minutes() == 120.0
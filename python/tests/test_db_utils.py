@@ -0,0 +1,152 @@
+import os
+import socket
+import subprocess
+import sys
+
+import pytest
+
+from db_utils import DatabaseManager
+
+
+def _product(**fields):
+    product = {
+        'title': 'Widget',
+        'price': '19.99',
+        'rank': '1234',
+        'asin': 'B000000001',
+        'brand': 'Acme',
+        'ratings': '120',
+        'stars': '4.5',
+        'image_url': 'https://m.media-amazon.com/images/I/widget.jpg',
+        'date': 'January 1, 2024',
+        'url': 'https://www.amazon.com/dp/B000000001',
+        'currency': 'USD',
+    }
+    product.update(fields)
+    return product
+
+
+@pytest.fixture
+def db(tmp_path):
+    manager = DatabaseManager(str(tmp_path / 'database' / 'database.db'))
+    manager.init_tables()
+    yield manager
+    manager.close()
+
+
+def _row(db, marketplace='amazon.com', asin='B000000001'):
+    db.cursor.execute(
+        'SELECT name, rank, prev_rank, crawl_count, url FROM products WHERE marketplace = ? AND asin = ?',
+        (marketplace, asin),
+    )
+    return db.cursor.fetchone()
+
+
+def _history(db, marketplace='amazon.com', asin='B000000001'):
+    db.cursor.execute(
+        'SELECT rank, price FROM rank_history WHERE marketplace = ? AND asin = ? ORDER BY id', (marketplace, asin)
+    )
+    return db.cursor.fetchall()
+
+
+def test_new_product_is_created_with_a_history_point(db):
+    assert db.upsert_product(_product()) == (True, None, True)
+    assert _row(db) == ('Widget', 1234, None, 1, 'https://www.amazon.com/dp/B000000001')
+    assert _history(db) == [(1234, 19.99)]
+
+
+def test_same_rank_adds_no_history(db):
+    db.upsert_product(_product())
+    assert db.upsert_product(_product(title='Widget v2')) == (False, 1234, False)
+    assert _row(db)[:4] == ('Widget v2', 1234, 1234, 2)
+    # Compared as integers: "1,234" is the same rank
+    assert db.upsert_product(_product(rank='1,234')) == (False, 1234, False)
+    assert _row(db)[3] == 3
+    assert _history(db) == [(1234, 19.99)]
+
+
+def test_changed_rank_adds_history(db):
+    db.upsert_product(_product())
+    assert db.upsert_product(_product(rank='987', price='17.49')) == (False, 1234, True)
+    assert _row(db)[1:4] == (987, 1234, 2)
+    assert _history(db) == [(1234, 19.99), (987, 17.49)]
+
+
+@pytest.mark.parametrize('rank', ['Not found', 'N/A'])
+def test_missing_rank(db, rank):
+    assert db.upsert_product(_product(rank=rank)) == (True, None, False)
+    assert _row(db)[1] is None
+    assert _history(db) == []
+    # A rank appearing later is not a change from the missing one
+    assert db.upsert_product(_product()) == (False, None, False)
+    assert _history(db) == []
+
+
+def test_non_numeric_rank(db):
+    db.upsert_product(_product())
+    assert db.upsert_product(_product(rank='n/a in Toys')) == (False, 1234, False)
+    assert _history(db) == [(1234, 19.99)]
+
+
+def test_url_is_not_overwritten_on_update(db):
+    db.upsert_product(_product())
+    db.upsert_product(_product(url='https://www.amazon.com/Widget-Deluxe/dp/B000000001?th=1'))
+    assert _row(db)[4] == 'https://www.amazon.com/dp/B000000001'
+
+
+def test_marketplaces_are_separate_products(db):
+    db.upsert_product(_product())
+    created, _, rank_changed = db.upsert_product(_product(url='https://www.amazon.de/dp/B000000001', rank='55'))
+    assert (created, rank_changed) == (True, True)
+    assert _row(db)[1:4] == (1234, None, 1)
+    assert _row(db, 'amazon.de')[1:4] == (55, None, 1)
+    assert _history(db, 'amazon.de') == [(55, 19.99)]
+
+
+def _exited_pid():
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    return process.pid
+
+
+def _set_owner(db, run_id, host, pid, heartbeat_age=0):
+    db.cursor.execute(
+        "UPDATE crawl_runs SET owner_host = ?, owner_pid = ?, heartbeat_at = datetime('now', ?) WHERE id = ?",
+        (host, pid, f'-{heartbeat_age} seconds', run_id),
+    )
+    db.conn.commit()
+
+
+def test_new_run_is_owned_by_this_process(db):
+    run_id = db.create_crawl_run(['https://www.amazon.com/dp/B000000001'])
+    db.cursor.execute('SELECT owner_host, owner_pid FROM crawl_runs WHERE id = ?', (run_id,))
+    assert db.cursor.fetchone() == (socket.gethostname(), os.getpid())
+
+
+@pytest.mark.skipif(os.name == 'nt', reason='owner processes are only checked on POSIX')
+def test_run_of_an_exited_process_is_resumed_at_once(db):
+    run_id = db.create_crawl_run(['https://www.amazon.com/dp/B000000001', 'https://www.amazon.com/dp/B000000002'])
+    db.queue_job_state(run_id, 'https://www.amazon.com/dp/B000000001', 'done', 1)
+    db.flush()
+    _set_owner(db, run_id, socket.gethostname(), _exited_pid())
+    assert db.get_resumable_run() == (run_id, 2, [('https://www.amazon.com/dp/B000000002', 0)], 1)
+    # Claimed by the resuming process
+    db.cursor.execute('SELECT owner_pid FROM crawl_runs WHERE id = ?', (run_id,))
+    assert db.cursor.fetchone() == (os.getpid(),)
+
+
+@pytest.mark.skipif(os.name == 'nt', reason='owner processes are only checked on POSIX')
+def test_run_of_a_live_process_is_not_resumed(db):
+    run_id = db.create_crawl_run(['https://www.amazon.com/dp/B000000001'])
+    # Even with a stale heartbeat (a slow page): the owner is still crawling it
+    _set_owner(db, run_id, socket.gethostname(), os.getppid(), heartbeat_age=600)
+    assert db.get_resumable_run() is None
+
+
+@pytest.mark.parametrize('host, pid', [('other-host', 4242), (None, None)])
+def test_run_of_an_unknown_process_waits_for_a_stale_heartbeat(db, host, pid):
+    run_id = db.create_crawl_run(['https://www.amazon.com/dp/B000000001'])
+    _set_owner(db, run_id, host, pid, heartbeat_age=30)
+    assert db.get_resumable_run() is None
+    _set_owner(db, run_id, host, pid, heartbeat_age=600)
+    assert db.get_resumable_run()[0] == run_id
@@ -0,0 +1,41 @@
+from fnmatch import fnmatchcase
+
+import pytest
+
+pytest.importorskip('selenium')
+pytest.importorskip('webdriver_manager')
+
+from driver_pool import LEAN_BLOCKED_URLS  # noqa: E402
+
+
+def _blocked(url):
+    # Network.setBlockedURLs wildcards: '*' any run of characters, '?' exactly one
+    return any(fnmatchcase(url, pattern) for pattern in LEAN_BLOCKED_URLS)
+
+
+@pytest.mark.parametrize('url', [
+    'https://images-na.ssl-images-amazon.com/images/I/11EIQ5IGqaL._RC|01ZTHTZObnL.css,41Cq2yhn9tL.css_.css'
+    '?AUIClients/AmazonUI',
+    'https://m.media-amazon.com/images/I/61gJnLxZ7+L.css?AUIClients/AmazonUIBaseCSS',
+    'https://m.media-amazon.com/images/I/71o8Q5XJS5L._AC_SX300_SY300_QL70_ML2_.jpg',
+    'https://m.media-amazon.com/images/I/41tp0JPPlmL._SS40_.jpg?v=1',
+    'https://m.media-amazon.com/images/I/31Yc1VYqBdL._AC_US40_.png?ref=dp',
+    'https://m.media-amazon.com/images/G/01/AUIClients/AmazonUIFont-amazonember_rg-cc7ebaa05a2cd3b0._V2_.woff2',
+    'https://images-na.ssl-images-amazon.com/images/G/01/x-locale/common/transparent-pixel._V192234675_.gif',
+    'https://m.media-amazon.com/images/S/sash/Dv1WQ5DdeMS5qP7.svg',
+    'https://m.media-amazon.com/images/S/vse-vms-transcoding-artifact-us-east-1-prod/8a6b/default.jobtemplate.hls.m3u8',
+    'https://www.amazon.com/favicon.ico',
+])
+def test_lean_profile_blocks_amazon_assets(url):
+    assert _blocked(url)
+
+
+@pytest.mark.parametrize('url', [
+    'https://www.amazon.com/dp/B000000001',
+    'https://www.amazon.de/Some-Product-Name/dp/B000000001?th=1&psc=1',
+    'https://www.amazon.com/gp/product/B000000001/ref=ox_sc_act_title_1',
+    'https://m.media-amazon.com/images/I/61xKzJ3QdPL.js?AUIClients/AmazonUI',
+    'https://fls-na.amazon.com/1/batch/1/OE/',
+])
+def test_lean_profile_keeps_pages_and_scripts(url):
+    assert not _blocked(url)
@@ -0,0 +1,97 @@
+import pytest
+
+from http_transport import CHUNK_BYTES, PROBE_BYTES, HttpTransport, RegionWatcher
+
+DETAILS = b'<div id="prodDetails"><div class="a"><table><tr><td>Best Sellers Rank</td></tr></table></div></div>'
+BULLETS = b"<DIV id='detailBulletsWrapper_feature_div'><ul><li>Date First Available</li></ul></DIV>"
+REVIEWS = b'<div id="reviewsMedley"><div>'
+
+
+def _page(*parts, tail=20_000):
+    return b'<html><body><div id="dp">' + b'<p>filler</p>'.join(parts) + b'x' * tail + b'</div></body></html>'
+
+
+def _stop_at(page, chunk, watcher=None):
+    """Length of the prefix at which the watcher says stop, when fed `chunk` bytes at a time."""
+    watcher = watcher or RegionWatcher()
+    for end in range(chunk, len(page) + chunk, chunk):
+        if watcher.feed(page[:end]):
+            return min(end, len(page))
+    return None
+
+
+def _after(page, part):
+    return page.index(part) + len(part)
+
+
+def test_stops_once_every_region_is_closed():
+    page = _page(DETAILS, BULLETS, REVIEWS)
+    assert _stop_at(page, 1) == _after(page, BULLETS)
+
+
+@pytest.mark.parametrize('chunk', [2, 3, 5, 7, 11, 16, 31, 64])
+def test_tags_cut_at_chunk_boundaries(chunk):
+    page = _page(DETAILS, BULLETS, REVIEWS)
+    stop = _stop_at(page, chunk)
+    # Never before the last closing tag, and within the chunk that completes it
+    assert _after(page, BULLETS) <= stop < _after(page, BULLETS) + chunk
+
+
+def test_nested_tags_of_the_same_name_are_counted():
+    watcher = RegionWatcher(regions=['prodDetails'], end_markers=[])
+    prefix = b'<div id="prodDetails"><div><div></div></div>'
+    assert not watcher.feed(prefix)
+    assert not watcher.feed(prefix + b'<divider></div')
+    assert watcher.feed(prefix + b'<divider></div>')
+
+
+def test_end_marker_stops_when_regions_are_missing():
+    page = _page(b'<div id="other"></div>', REVIEWS)
+    marker_end = _after(page, b'id="reviewsMedley"')
+    assert marker_end <= _stop_at(page, 7) < marker_end + 7
+
+
+def test_end_marker_waits_for_a_started_region():
+    # A region still open when the end marker arrives (reviews nested in it)
+    page = _page(b'<div id="prodDetails"><div>' + REVIEWS + b'</div></div></div></div>')
+    assert _stop_at(page, 1) == _after(page, b'</div></div></div></div>')
+
+
+def test_page_without_regions_or_markers_is_read_whole():
+    assert _stop_at(_page(b'<div id="other"></div>'), CHUNK_BYTES) is None
+
+
+def _chunks(data, size=CHUNK_BYTES):
+    return (data[i:i + size] for i in range(0, len(data), size))
+
+
+@pytest.fixture
+def transport():
+    return HttpTransport(client='requests')
+
+
+def test_read_stops_after_the_regions(transport):
+    page = _page(DETAILS, BULLETS, REVIEWS, tail=500_000)
+    content, truncated = transport._read(200, _chunks(page))
+    assert (content, truncated) == (page[:CHUNK_BYTES], True)
+
+
+@pytest.mark.parametrize('marker', [b'Type the characters you see in this image', b'Sorry! We couldn\'t find that page'])
+def test_probe_stops_captcha_and_not_found_pages(transport, marker):
+    page = b'<html><body>' + marker + b'x' * 500_000
+    content, truncated = transport._read(200, _chunks(page))
+    assert truncated
+    assert len(content) == PROBE_BYTES
+
+
+def test_probe_only_looks_at_the_first_64kb(transport):
+    page = b'<html><body>' + b'x' * PROBE_BYTES + b'type the characters' + b'x' * 100_000
+    content, truncated = transport._read(200, _chunks(page))
+    assert (content, truncated) == (page, False)
+
+
+@pytest.mark.parametrize('status_code, stream', [(503, True), (200, False)])
+def test_body_is_read_whole_without_streaming(status_code, stream):
+    page = b'<html><body>Type the characters' + DETAILS + BULLETS + b'x' * 200_000
+    content, truncated = HttpTransport(client='requests', stream=stream)._read(status_code, _chunks(page))
+    assert (content, truncated) == (page, False)
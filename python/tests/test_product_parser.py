@@ -0,0 +1,47 @@
+import pytest
+
+from product_parser import parse_price
+
+
+@pytest.mark.parametrize('text, default, expected', [
+    # Compound symbols are not read as the shorter symbol they end with
+    ('US$12.99', 'USD', ('12.99', 'USD')),
+    ('S$12.99', 'USD', ('12.99', 'SGD')),
+    ('CDN$ 24.99', 'USD', ('24.99', 'CAD')),
+    ('AU$5', 'USD', ('5', 'AUD')),
+    # Letter symbols only count as whole tokens
+    ('12 kr', 'EUR', ('12', 'SEK')),
+    ('Marke 12,50', 'EUR', ('12.50', 'EUR')),
+    ('TLC 9.99', 'USD', ('9.99', 'USD')),
+    # '$' alone or no symbol leaves the marketplace's currency
+    ('$1,234.56', 'CAD', ('1234.56', 'CAD')),
+    ('19.99', 'GBP', ('19.99', 'GBP')),
+])
+def test_parse_price_currency(text, default, expected):
+    assert parse_price(text, default) == expected
+
+
+@pytest.mark.parametrize('text, default, expected', [
+    # The decimal separator comes from the number, whatever the marketplace
+    ('12,99 €', 'USD', ('12.99', 'EUR')),
+    ('1.029,99 €', 'EUR', ('1029.99', 'EUR')),
+    ('1 234,56 €', 'EUR', ('1234.56', 'EUR')),
+    ('1 234,5 €', 'EUR', ('1234.5', 'EUR')),
+    ('$1,234.56', 'USD', ('1234.56', 'USD')),
+    ('1,23,456.00 ₹', 'INR', ('123456.00', 'INR')),
+    # Three digits after the only separator are a thousands group
+    ('£1,234', 'GBP', ('1234', 'GBP')),
+    ('1.234 €', 'EUR', ('1234', 'EUR')),
+    # No minor units
+    ('￥1,280', 'JPY', ('1280', 'JPY')),
+    ('¥12,80', 'USD', ('1280', 'JPY')),
+    # Trailing separators
+    ('$24.', 'USD', ('24', 'USD')),
+])
+def test_parse_price_decimal(text, default, expected):
+    assert parse_price(text, default) == expected
+
+
+@pytest.mark.parametrize('text', ['', None, 'Currently unavailable.'])
+def test_parse_price_without_number(text):
+    assert parse_price(text, 'EUR') == (None, 'EUR')
@@ -0,0 +1,98 @@
+import pytest
+
+from rate_limiter import HostRateLimiter
+
+HOST = 'www.amazon.com'
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+def _limiter(clock, **kwargs):
+    options = {'rate': 2.0, 'burst': 2, 'min_rate': 0.2, 'max_rate': 20.0}
+    options.update(kwargs)
+    return HostRateLimiter(clock=clock, **options)
+
+
+def test_burst_then_one_request_per_token(clock):
+    limiter = _limiter(clock)
+    assert [limiter.reserve(HOST) for _ in range(4)] == [0.0, 0.0, 0.5, 1.0]
+    assert limiter.wait_time(HOST) == 1.5
+    clock.now += 1.5
+    assert limiter.wait_time(HOST) == 0.0
+    assert limiter.reserve(HOST) == 0.0
+
+
+def test_tokens_refill_up_to_the_burst(clock):
+    limiter = _limiter(clock)
+    limiter.reserve(HOST)
+    limiter.reserve(HOST)
+    clock.now += 60
+    assert [limiter.reserve(HOST) for _ in range(3)] == [0.0, 0.0, 0.5]
+
+
+def test_hosts_have_their_own_bucket(clock):
+    limiter = _limiter(clock, host_rates={'amazon.co.jp': 0.5})
+    limiter.reserve(HOST)
+    limiter.reserve(HOST)
+    assert limiter.wait_time(HOST) == 0.5
+    assert limiter.wait_time('www.amazon.de') == 0.0
+    assert limiter.rate('www.amazon.de') == 2.0
+    assert limiter.rate('www.amazon.co.jp') == 0.5
+
+
+def test_captcha_halves_the_rate_and_clean_answers_raise_it(clock):
+    limiter = _limiter(clock)
+    assert limiter.record(HOST, True) == 1.0
+    assert limiter.record(HOST, True) == 0.5
+    # Additive increase: increase / rate per clean answer
+    assert limiter.record(HOST, False) == 1.5
+    assert limiter.captcha_ratio(HOST) == pytest.approx(2 / 3)
+    assert limiter.stats() == {HOST: {'rate': 1.5, 'captcha_ratio': pytest.approx(2 / 3)}}
+
+
+def test_rate_stays_within_bounds(clock):
+    limiter = _limiter(clock, max_rate=3.0)
+    for _ in range(10):
+        limiter.record(HOST, True)
+    assert limiter.rate(HOST) == 0.2
+    for _ in range(100):
+        limiter.record(HOST, False)
+    assert limiter.rate(HOST) == 3.0
+
+
+def test_lower_rate_applies_to_the_next_token(clock):
+    limiter = _limiter(clock)
+    limiter.reserve(HOST)
+    limiter.reserve(HOST)
+    limiter.record(HOST, True)
+    assert limiter.wait_time(HOST) == 1.0
+
+
+def test_unlimited_host_never_waits(clock):
+    limiter = _limiter(clock, rate=None)
+    assert [limiter.reserve(HOST) for _ in range(10)] == [0.0] * 10
+    assert limiter.record(HOST, False) is None
+    assert limiter.rate(HOST) is None
+    assert limiter.wait_time(HOST) == 0.0
+
+
+def test_unlimited_host_is_throttled_after_a_captcha(clock):
+    limiter = _limiter(clock, rate=None, max_rate=8.0)
+    limiter.reserve(HOST)
+    assert limiter.record(HOST, True) == 4.0
+    assert limiter.reserve(HOST) == 0.25
+    assert limiter.record(HOST, True) == 2.0
+    assert limiter.record(HOST, False) == 2.25
+    # Other unlimited hosts are unaffected
+    assert limiter.rate('www.amazon.de') is None
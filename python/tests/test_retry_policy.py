@@ -0,0 +1,168 @@
+import pytest
+
+import retry_policy
+from retry_policy import CAPTCHA, PERMANENT, TRANSIENT, RetryQueue, classify_error, classify_status
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _item(url, attempts=0):
+    return {'url': url, 'attempts': attempts}
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def queue(clock, monkeypatch):
+    monkeypatch.setenv('RETRY_BASE_MS', '1000')
+    monkeypatch.setenv('RETRY_MAX_MS', '8000')
+    monkeypatch.setenv('CAPTCHA_COOLDOWN_MS', '60000')
+    return RetryQueue(clock=clock)
+
+
+def _drain(queue):
+    items = []
+    while True:
+        item = queue.pop_ready()
+        if item is None:
+            return items
+        items.append(item['url'])
+
+
+@pytest.mark.parametrize('product_data, kind', [
+    (None, TRANSIENT),
+    ({'error': 'Processing error: timed out'}, TRANSIENT),
+    ({'error': 'Processing error: image not found (requests)', 'error_kind': TRANSIENT}, TRANSIENT),
+    ({'error': 'Processing error: HTTP 404'}, TRANSIENT),
+    ({'error': 'Product not found'}, PERMANENT),
+    ({'error': 'x', 'title': 'Product Not Found'}, PERMANENT),
+    ({'error': 'Processing error: blocked by captcha (selenium)'}, CAPTCHA),
+    ({'error': 'Processing error: HTTP 503', 'error_kind': CAPTCHA}, CAPTCHA),
+])
+def test_classify_error(product_data, kind):
+    assert classify_error(product_data) == kind
+
+
+@pytest.mark.parametrize('status, kind', [
+    (404, PERMANENT), (410, PERMANENT), (403, CAPTCHA), (429, CAPTCHA), (503, CAPTCHA), (500, TRANSIENT), (502, TRANSIENT),
+])
+def test_classify_status(status, kind):
+    assert classify_status(status) == kind
+
+
+@pytest.mark.parametrize('attempts, delay', [(1, 1.0), (2, 2.0), (3, 4.0), (4, 8.0), (5, 8.0), (12, 8.0)])
+def test_backoff_doubles_up_to_the_cap_with_jitter(queue, monkeypatch, attempts, delay):
+    monkeypatch.setattr(retry_policy.random, 'uniform', lambda low, high: high)
+    assert queue.backoff(attempts) == delay
+    monkeypatch.setattr(retry_policy.random, 'uniform', lambda low, high: low)
+    # Half of the delay is fixed
+    assert queue.backoff(attempts) == delay / 2
+
+
+def test_hosts_take_turns(queue):
+    for url in ('https://www.amazon.com/dp/A1', 'https://www.amazon.com/dp/A2', 'https://www.amazon.com/dp/A3',
+                'https://www.amazon.de/dp/D1', 'https://www.amazon.de/dp/D2', 'https://www.amazon.co.jp/dp/J1'):
+        queue.append(_item(url))
+    assert [url.rsplit('/', 1)[1] for url in _drain(queue)] == ['A1', 'D1', 'J1', 'A2', 'D2', 'A3']
+    assert len(queue) == 0
+    assert queue.next_wait() is None
+
+
+def test_transient_retry_waits_for_its_backoff(queue, clock, monkeypatch):
+    monkeypatch.setattr(retry_policy.random, 'uniform', lambda low, high: high)
+    queue.append(_item('https://www.amazon.com/dp/A1'))
+    item = queue.pop_ready()
+    assert queue.retry(dict(item, attempts=2), TRANSIENT) == 2.0
+    assert len(queue) == 1
+    assert queue.pop_ready() is None
+    assert queue.next_wait() == 2.0
+    clock.now += 2.0
+    assert queue.pop_ready() == {'url': 'https://www.amazon.com/dp/A1', 'attempts': 2}
+
+
+def test_captcha_cools_down_the_whole_host(queue, clock, monkeypatch):
+    monkeypatch.setattr(retry_policy.random, 'uniform', lambda low, high: high)
+    for url in ('https://www.amazon.com/dp/A1', 'https://www.amazon.com/dp/A2', 'https://www.amazon.de/dp/D1'):
+        queue.append(_item(url))
+    item = queue.pop_ready()
+    assert queue.retry(dict(item, attempts=1), CAPTCHA) == 60.0
+    # Other hosts keep going while amazon.com's ready URLs are parked
+    assert _drain(queue) == ['https://www.amazon.de/dp/D1']
+    assert len(queue) == 2
+    assert queue.next_wait() == 60.0
+    clock.now += 60.0
+    assert sorted(_drain(queue)) == ['https://www.amazon.com/dp/A1', 'https://www.amazon.com/dp/A2']
+
+
+def test_waiting_hosts_are_skipped(queue):
+    queue.append(_item('https://www.amazon.com/dp/A1'))
+    queue.append(_item('https://www.amazon.de/dp/D1'))
+    waits = {'www.amazon.com': 0.5, 'www.amazon.de': 0}
+    assert queue.pop_ready(wait=waits.get)['url'] == 'https://www.amazon.de/dp/D1'
+    assert queue.pop_ready(wait=waits.get) is None
+    assert queue.blocked
+    assert queue.next_wait() == 0.5
+
+
+def test_next_wait_is_none_when_only_in_flight_fetches_can_free_a_host(queue):
+    queue.append(_item('https://www.amazon.com/dp/A1'))
+    assert queue.next_wait() == 0.0
+    # None: the host is at its concurrency limit until a fetch finishes
+    assert queue.pop_ready(wait=lambda host: None) is None
+    assert queue.next_wait() is None
+
+
+def test_invalid_settings_fall_back_to_defaults(clock, monkeypatch):
+    monkeypatch.setenv('RETRY_BASE_MS', 'soon')
+    monkeypatch.setenv('RETRY_MAX_MS', '10')
+    monkeypatch.setenv('CAPTCHA_COOLDOWN_MS', '-5')
+    queue = RetryQueue(clock=clock)
+    assert (queue.base_delay, queue.max_delay, queue.captcha_cooldown) == (1.0, 1.0, 0.0)
+
+
+class _Recorder:
+    def __init__(self):
+        self.calls = []
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.calls.append((name, args, kwargs))
+
+
+@pytest.fixture
+def crawler():
+    from crawl_and_update_fixed import AmazonProductCrawler
+
+    crawler = AmazonProductCrawler.__new__(AmazonProductCrawler)
+    crawler.max_url_retries = 2
+    crawler.url_aliases = {}
+    crawler.metrics = _Recorder()
+    crawler.events = _Recorder()
+    crawler.jobs = []
+    crawler._mark_job = lambda url, state, attempts, error=None: crawler.jobs.append((state, attempts))
+    return crawler
+
+
+def test_failed_url_is_retried_until_the_attempt_limit(crawler, queue):
+    url = 'https://www.amazon.com/dp/A1'
+    crawler._requeue(queue, url, 0, 'timed out')
+    crawler._requeue(queue, url, 1, 'timed out')
+    assert crawler.jobs == [('pending', 1), ('pending', 2)]
+    assert len(queue) == 2
+    crawler._requeue(queue, url, 2, 'timed out')
+    assert crawler.jobs[-1] == ('failed', 3)
+    assert len(queue) == 2
+
+
+def test_permanent_failure_is_never_retried(crawler, queue):
+    crawler._requeue(queue, 'https://www.amazon.com/dp/A1', 0, 'Product not found', PERMANENT)
+    assert crawler.jobs == [('failed', 1)]
+    assert len(queue) == 0
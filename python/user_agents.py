@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+User-agent pool for the crawler.
+
+The pool is read from a local JSON file (USER_AGENTS_FILE, default
+user_agents.json next to this module) the first time a user agent is
+needed, so startup never waits for fake-useragent or the network. Refresh
+the file from the data bundled with fake-useragent with:
+
+    python python/user_agents.py --refresh
+"""
+
+import argparse
+import json
+import os
+import random
+import threading
+
+DEFAULT_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'user_agents.json')
+
+FALLBACK_USER_AGENTS = [
+    # Kept as a safe fallback if the cached pool cannot be read
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.0 Safari/605.1.15",
+    "Mozilla/5.0 (X11; Ubuntu; Linux x86_64; rv:115.0) Gecko/20100101 Firefox/115.0",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36 Edg/120.0.0.0",
+    "Mozilla/5.0 (iPhone; CPU iPhone OS 17_0 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) CriOS/120.0.0.0 Mobile/15E148 Safari/604.1",
+]
+
+# Chromium-based user agents are preferred; they get blocked least
+PREFERRED_BROWSERS = ('chrome', 'edge')
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def load_pool(path=None):
+    """Preferred and other user agents from the cached file, or the fallback list."""
+    path = path or os.environ.get('USER_AGENTS_FILE') or DEFAULT_FILE
+    try:
+        with open(path, encoding='utf-8') as f:
+            entries = json.load(f)
+        preferred = [e['useragent'] for e in entries if e.get('browser') in PREFERRED_BROWSERS]
+        others = [e['useragent'] for e in entries if e.get('browser') not in PREFERRED_BROWSERS]
+        if preferred or others:
+            return preferred or others, others
+    except Exception as e:
+        print(f"User-agent pool {path} not usable, using the built-in list: {e}")
+    return list(FALLBACK_USER_AGENTS), []
+
+
+def get_random_user_agent():
+    """Return a random user agent, preferring Chromium-based desktop browsers."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = load_pool()
+    return random.choice(_pool[0])
+
+
+def refresh(path=None):
+    """Rebuild the cached pool from fake-useragent's bundled data (desktop browsers only)."""
+    from importlib import resources
+
+    data = resources.files('fake_useragent').joinpath('data', 'browsers.json').read_text(encoding='utf-8')
+    entries = []
+    seen = set()
+    for line in data.splitlines():
+        if not line.strip():
+            continue
+        row = json.loads(line)
+        if row.get('type') != 'pc' or row['useragent'] in seen:
+            continue
+        seen.add(row['useragent'])
+        entries.append({'useragent': row['useragent'], 'browser': row.get('browser'), 'os': row.get('os')})
+    path = path or os.environ.get('USER_AGENTS_FILE') or DEFAULT_FILE
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(entries, f, indent=1)
+        f.write('\n')
+    return path, len(entries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--refresh', action='store_true', help='rebuild the cached pool from fake-useragent data')
+    parser.add_argument('--file', default=None, help='pool file (default: USER_AGENTS_FILE or user_agents.json)')
+    args = parser.parse_args()
+    if args.refresh:
+        path, count = refresh(args.file)
+        print(f"Wrote {count} user agents to {path}")
+    preferred, others = load_pool(args.file)
+    print(f"{len(preferred)} preferred and {len(others)} other user agents")
+
+
+if __name__ == '__main__':
+    main()
@@ -4,6 +4,7 @@ const bodyParser = require('body-parser');
 const path = require('path');
 const logger = require('./src/utils/logger');
 const routes = require('./src/routes');
+const serviceManager = require('./src/services/ServiceManager');
 // Lazy import for node-fetch (ESM)
 const fetch = (...args) => import('node-fetch').then(({ default: fetch }) => fetch(...args));
 
@@ -84,13 +85,20 @@ app.listen(PORT, () => {
     logger.info('Web application is ready to use!');
 });
 
-// Graceful shutdown
-process.on('SIGINT', () => {
+// Graceful shutdown: the crawler daemon finishes its job and its output is drained before exiting
+let shuttingDown = false;
+const shutdown = async () => {
+    if (shuttingDown) {
+        // A second signal skips the wait
+        process.exit(1);
+    }
+    shuttingDown = true;
     logger.info('Shutting down server gracefully...');
+    if (serviceManager.crawlerService) {
+        await serviceManager.crawlerService.stopDaemon();
+    }
     process.exit(0);
-});
+};
 
-process.on('SIGTERM', () => {
-    logger.info('Shutting down server gracefully...');
-    process.exit(0);
-}); 
\ No newline at end of file
+process.on('SIGINT', shutdown);
+process.on('SIGTERM', shutdown); 
\ No newline at end of file
@@ -1,5 +1,74 @@
 const sqlite3 = require('sqlite3').verbose();
 const path = require('path');
+const { canonicalize } = require('../utils/amazonUrl');
+
+// Tables keyed by (marketplace, asin), as python/db_utils.py creates them: an ASIN is a separate
+// product, rank and history on every marketplace. {table} lets rekeyByMarketplace build one beside the old table
+const KEYED_SCHEMAS = {
+    products: `
+        CREATE TABLE IF NOT EXISTS {table} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            price REAL,
+            rank INTEGER,
+            asin TEXT,
+            brand TEXT,
+            ratings TEXT,
+            stars TEXT,
+            image_url TEXT,
+            date TEXT,
+            url TEXT,
+            prev_rank INTEGER,
+            crawl_count INTEGER DEFAULT 1,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            marketplace TEXT NOT NULL DEFAULT 'amazon.com',
+            currency TEXT,
+            UNIQUE (marketplace, asin)
+        )
+    `,
+    rank_history: `
+        CREATE TABLE IF NOT EXISTS {table} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            marketplace TEXT NOT NULL DEFAULT 'amazon.com',
+            asin TEXT NOT NULL,
+            rank INTEGER NOT NULL,
+            price REAL,
+            recorded_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    `,
+    // Rollups of raw history past its retention (compact_rank_history in python/db_utils.py)
+    ...Object.fromEntries(['rank_history_hourly', 'rank_history_daily'].map(rollup => [rollup, `
+        CREATE TABLE IF NOT EXISTS {table} (
+            marketplace TEXT NOT NULL DEFAULT 'amazon.com',
+            asin TEXT NOT NULL,
+            bucket_start DATETIME NOT NULL,
+            min_rank INTEGER,
+            max_rank INTEGER,
+            avg_rank REAL,
+            samples INTEGER NOT NULL,
+            min_price REAL,
+            max_price REAL,
+            avg_price REAL,
+            price_samples INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (marketplace, asin, bucket_start)
+        )
+    `])),
+    // Latest ranks and trend per product, maintained by the crawler with each history point
+    product_trends: `
+        CREATE TABLE IF NOT EXISTS {table} (
+            marketplace TEXT NOT NULL DEFAULT 'amazon.com',
+            asin TEXT NOT NULL,
+            last_rank INTEGER NOT NULL,
+            prev_rank INTEGER,
+            rank_change_percent REAL,
+            rank_trend TEXT NOT NULL DEFAULT 'new',
+            rank_history TEXT,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (marketplace, asin)
+        ) WITHOUT ROWID
+    `,
+};
 
 class Database {
     constructor() {
@@ -60,23 +129,7 @@ class Database {
         console.log('Initializing database tables...');
 
         // Create products table
-        await this.run(`
-            CREATE TABLE IF NOT EXISTS products (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                price REAL,
-                rank INTEGER,
-                asin TEXT UNIQUE,
-                brand TEXT,
-                ratings TEXT,
-                stars TEXT,
-                image_url TEXT,
-                date TEXT,
-                url TEXT,
-                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
-            )
-        `);
+        await this.run(KEYED_SCHEMAS.products.replace('{table}', 'products'));
 
         // Add date column if it doesn't exist
         try {
@@ -86,18 +139,37 @@ class Database {
             console.log('Date column might already exist');
         }
 
-        // Create rank_history table
+        // Columns maintained by the crawler's upsert (rank before last crawl, crawl count, URL marketplace, price currency)
+        for (const column of ['prev_rank INTEGER', 'crawl_count INTEGER DEFAULT 1', 'marketplace TEXT', 'currency TEXT']) {
+            try {
+                await this.run(`ALTER TABLE products ADD COLUMN ${column}`);
+            } catch (err) {
+                // Column already exists
+            }
+        }
+        await this.rekeyByMarketplace();
+
+        // Create rank_history, its rollups and product_trends tables
+        for (const table of ['rank_history', 'rank_history_hourly', 'rank_history_daily', 'product_trends']) {
+            await this.run(KEYED_SCHEMAS[table].replace('{table}', table));
+        }
+
+        // Per-product history lookups (latest points, ranges) are served from this index
         await this.run(`
-            CREATE TABLE IF NOT EXISTS rank_history (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                asin TEXT NOT NULL,
-                rank INTEGER NOT NULL,
-                price REAL,
-                recorded_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (asin) REFERENCES products(asin)
-            )
+            CREATE INDEX IF NOT EXISTS idx_rank_history_key_time ON rank_history(marketplace, asin, recorded_at, rank, price)
         `);
 
+        // Product listing orders (keyset pagination walks these indexes)
+        for (const index of [
+            'idx_products_rank_name ON products(rank, name)',
+            'idx_products_name ON products(name)',
+            'idx_products_updated ON products(updated_at)',
+            'idx_products_brand_rank ON products(brand, rank, name)',
+            'idx_product_trends_change ON product_trends(rank_change_percent)',
+        ]) {
+            await this.run(`CREATE INDEX IF NOT EXISTS ${index}`);
+        }
+
         // Create url_lists table
         await this.run(`
             CREATE TABLE IF NOT EXISTS url_lists (
@@ -107,6 +179,20 @@ class Database {
             )
         `);
 
+        // Create tracked_asins table (bulk-imported ASIN lists, written by python/asin_import.py)
+        await this.run(`
+            CREATE TABLE IF NOT EXISTS tracked_asins (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                marketplace TEXT NOT NULL,
+                asin TEXT NOT NULL,
+                url TEXT NOT NULL,
+                tags TEXT,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                UNIQUE (marketplace, asin)
+            )
+        `);
+
         // Create settings table
         await this.run(`
             CREATE TABLE IF NOT EXISTS settings (
@@ -122,9 +208,80 @@ class Database {
             INSERT OR IGNORE INTO settings (key, value) VALUES ('crawl_interval', '2')
         `);
 
+        // Bumped on every write to product data; listing ETags and caches key on it
+        await this.run(`
+            INSERT OR IGNORE INTO settings (key, value) VALUES ('data_version', '0')
+        `);
+
         console.log('Database tables initialized successfully');
     }
 
+    async columns(table) {
+        return (await this.all(`PRAGMA table_info(${table})`)).map(column => column.name);
+    }
+
+    // Move the tables of older databases, keyed by ASIN alone, to (marketplace, asin) keys. The crawler
+    // (_rekey_by_marketplace in python/db_utils.py) does the same, whichever of the two opens the database first
+    async rekeyByMarketplace() {
+        await this.run('BEGIN IMMEDIATE');
+        try {
+            const stale = [];
+            for (const table of Object.keys(KEYED_SCHEMAS)) {
+                const columns = await this.columns(table);
+                if (columns.length > 0 && !columns.includes('marketplace')) {
+                    stale.push(table);
+                }
+            }
+            for (const index of await this.all('PRAGMA index_list(products)')) {
+                const columns = await this.all(`PRAGMA index_info(${index.name})`);
+                if (index.unique && columns.length === 1 && columns[0].name === 'asin') {
+                    stale.unshift('products');
+                    break;
+                }
+            }
+            if (stale.length > 0) {
+                const unset = await this.all('SELECT id, url FROM products WHERE marketplace IS NULL AND url IS NOT NULL');
+                for (const row of unset) {
+                    const key = canonicalize(row.url);
+                    if (key) {
+                        await this.run('UPDATE products SET marketplace = ? WHERE id = ?', [key.marketplace, row.id]);
+                    }
+                }
+                // Old products are unique by ASIN: one marketplace per ASIN, looked up through the primary key
+                await this.run('CREATE TEMP TABLE rekey_marketplaces (asin TEXT PRIMARY KEY, marketplace TEXT NOT NULL)');
+                await this.run(`
+                    INSERT OR IGNORE INTO rekey_marketplaces (asin, marketplace)
+                    SELECT asin, COALESCE(marketplace, 'amazon.com') FROM products WHERE asin IS NOT NULL
+                `);
+                for (const table of stale) {
+                    await this.rebuildKeyed(table, table === 'products'
+                        ? "COALESCE(marketplace, 'amazon.com')"
+                        : "COALESCE((SELECT m.marketplace FROM temp.rekey_marketplaces m WHERE m.asin = o.asin), 'amazon.com')");
+                }
+                await this.run('DROP TABLE temp.rekey_marketplaces');
+                console.log(`Re-keyed by marketplace: ${stale.join(', ')}`);
+            }
+            await this.run('COMMIT');
+        } catch (err) {
+            await this.run('ROLLBACK');
+            throw err;
+        }
+    }
+
+    // Copy `table` into its KEYED_SCHEMAS form; `marketplaceSql` (over the old rows, alias o) fills the key
+    async rebuildKeyed(table, marketplaceSql) {
+        const oldColumns = (await this.columns(table)).filter(column => column !== 'marketplace');
+        await this.run(KEYED_SCHEMAS[table].replace('{table}', `${table}_rekeyed`));
+        const newColumns = new Set(await this.columns(`${table}_rekeyed`));
+        const columns = oldColumns.filter(column => newColumns.has(column)).join(', ');
+        await this.run(`
+            INSERT OR IGNORE INTO ${table}_rekeyed (marketplace, ${columns})
+            SELECT ${marketplaceSql}, ${columns} FROM ${table} o
+        `);
+        await this.run(`DROP TABLE ${table}`);
+        await this.run(`ALTER TABLE ${table}_rekeyed RENAME TO ${table}`);
+    }
+
     close() {
         return new Promise((resolve) => {
             this.db.close((err) => {
@@ -1,9 +1,67 @@
+const crypto = require('crypto');
 const serviceManager = require('../services/ServiceManager');
+const Product = require('../models/Product');
+const LruCache = require('../utils/lruCache');
+const { MARKETPLACES } = require('../utils/amazonUrl');
 const logger = require('../utils/logger');
 
+const MAX_PAGE_SIZE = 200;
+const DEFAULT_PAGE_SIZE = 50;
+
+// Listing options from the /api/products query string; throws on invalid values
+function parseProductQuery(query) {
+    const options = { sort: query.sort || 'rank', limit: DEFAULT_PAGE_SIZE };
+    if (!Object.prototype.hasOwnProperty.call(Product.SORTS, options.sort)) {
+        throw new Error(`sort must be one of ${Object.keys(Product.SORTS).join(', ')}`);
+    }
+    if (query.limit !== undefined) {
+        options.limit = parseInt(query.limit, 10);
+        if (!(options.limit >= 1 && options.limit <= MAX_PAGE_SIZE)) {
+            throw new Error(`limit must be between 1 and ${MAX_PAGE_SIZE}`);
+        }
+    }
+    for (const [param, option] of [['min_rank', 'minRank'], ['max_rank', 'maxRank']]) {
+        if (query[param] !== undefined) {
+            options[option] = parseInt(query[param], 10);
+            if (Number.isNaN(options[option])) {
+                throw new Error(`${param} must be a number`);
+            }
+        }
+    }
+    if (query.brand) {
+        options.brand = String(query.brand);
+    }
+    if (query.trending === 'true' || query.trending === '1') {
+        options.trending = true;
+    }
+    if (query.updated_since) {
+        const since = new Date(query.updated_since);
+        if (Number.isNaN(since.getTime())) {
+            throw new Error('updated_since must be a date');
+        }
+        // Same format as SQLite's CURRENT_TIMESTAMP (UTC)
+        options.updatedSince = since.toISOString().replace('T', ' ').slice(0, 19);
+    }
+    if (query.q && String(query.q).trim()) {
+        options.search = String(query.q).trim();
+    }
+    if (query.cursor) {
+        options.after = Product.decodeCursor(options.sort, String(query.cursor));
+        if (!options.after) {
+            throw new Error('invalid cursor');
+        }
+    }
+    return options;
+}
+
 class ProductController {
     constructor() {
         // Services will be initialized via ServiceManager
+        // Hot listing pages; emptied whenever the data version moves
+        this.pageCache = new LruCache(parseInt(process.env.PRODUCTS_CACHE_SIZE || '200', 10) || 200);
+        this.pageCacheVersion = null;
+        // last_update is relative to now, so pages are also rebuilt after this long
+        this.pageTtlMs = parseInt(process.env.PRODUCTS_CACHE_TTL_MS || '60000', 10) || 60000;
     }
 
     async init() {
@@ -11,16 +69,52 @@ class ProductController {
     }
 
     async getAllProducts(req, res) {
+        let options;
         try {
-            logger.info('GET /api/products - Fetching all products with trending data');
-            const result = await serviceManager.getProductModel().getAllWithTrending();
-            res.json(result);
+            options = parseProductQuery(req.query);
+        } catch (error) {
+            return res.status(400).json({ error: error.message });
+        }
+
+        try {
+            const productModel = serviceManager.getProductModel();
+            const version = await productModel.getDataVersion();
+            if (version !== this.pageCacheVersion) {
+                this.pageCache.clear();
+                this.pageCacheVersion = version;
+            }
+
+            const key = `${Math.floor(Date.now() / this.pageTtlMs)}|${JSON.stringify(options)}`;
+            const digest = crypto.createHash('sha1').update(key).digest('base64url').slice(0, 16);
+            res.set('ETag', `W/"${version}-${digest}"`);
+            res.set('Cache-Control', 'no-cache');
+            if (req.fresh) {
+                return res.status(304).end();
+            }
+
+            let page = this.pageCache.get(key);
+            if (!page) {
+                logger.info(`GET /api/products - Fetching ${options.sort} page (version ${version})`);
+                page = { ...(await productModel.listProducts(options)), version };
+                this.pageCache.set(key, page);
+            }
+            res.json(page);
         } catch (error) {
             logger.error(`Error fetching products: ${error.message}`);
             res.status(500).json({ error: error.message });
         }
     }
 
+    async getProductUrls(req, res) {
+        try {
+            const urls = await serviceManager.getProductModel().getAllUrls();
+            res.json({ urls });
+        } catch (error) {
+            logger.error(`Error fetching product URLs: ${error.message}`);
+            res.status(500).json({ error: error.message });
+        }
+    }
+
     async getCrawlStatus(req, res) {
         try {
             const { urls } = req.query;
@@ -38,6 +132,62 @@ class ProductController {
         }
     }
 
+    // Server-Sent Events: crawl events as they arrive from the crawler
+    streamCrawlEvents(req, res) {
+        let crawlerService;
+        try {
+            crawlerService = serviceManager.getCrawlerService();
+        } catch (error) {
+            return res.status(503).json({ error: error.message });
+        }
+
+        res.writeHead(200, {
+            'Content-Type': 'text/event-stream',
+            'Cache-Control': 'no-cache',
+            Connection: 'keep-alive',
+            'X-Accel-Buffering': 'no',
+        });
+
+        const send = (evt) => {
+            res.write(`id: ${evt.id}\nevent: ${evt.event.event}\ndata: ${JSON.stringify(evt.event)}\n\n`);
+        };
+
+        // Replay what a reconnecting client missed
+        const lastId = parseInt(req.get('Last-Event-ID') || req.query.lastEventId || '0', 10) || 0;
+        if (lastId > 0) {
+            crawlerService.getEventsSince(lastId).forEach(send);
+        }
+
+        crawlerService.events.on('crawl-event', send);
+        // Comment lines keep proxies from closing an idle stream
+        const heartbeat = setInterval(() => res.write(': ping\n\n'), 15000);
+
+        req.on('close', () => {
+            clearInterval(heartbeat);
+            crawlerService.events.off('crawl-event', send);
+        });
+    }
+
+    // Prometheus scrape target for the crawler's stage histograms, counters and gauges
+    async getMetrics(req, res) {
+        let crawlerService;
+        try {
+            crawlerService = serviceManager.getCrawlerService();
+        } catch (error) {
+            return res.status(503).json({ error: error.message });
+        }
+        if (!crawlerService.useDaemon) {
+            return res.status(503).json({ error: 'Crawl metrics need the crawler daemon (CRAWL_DAEMON=false)' });
+        }
+        try {
+            const text = await crawlerService.getMetrics();
+            res.set('Content-Type', 'text/plain; version=0.0.4; charset=utf-8').send(text);
+        } catch (error) {
+            logger.error(`Error reading crawl metrics: ${error.message}`);
+            res.status(500).json({ error: error.message });
+        }
+    }
+
     async crawlUrls(req, res) {
         try {
             const { urls } = req.body;
@@ -51,6 +201,8 @@ class ProductController {
 
             // Save URLs to database
             await serviceManager.getCrawlerService().saveUrlsToDatabase(urls);
+            // Events of this crawl are the ones published after this id
+            const eventId = serviceManager.getCrawlerService().eventSeq;
             
             // Start crawling asynchronously (do not block the HTTP response)
             serviceManager
@@ -59,14 +211,42 @@ class ProductController {
                 .then(() => logger.info('Crawling finished (async kickoff)'))
                 .catch((error) => logger.error(`Crawling failed (async kickoff): ${error.message}`));
             
-            // Return immediately so the client can begin polling for per-item updates
-            res.status(202).json({ message: 'Crawling started' });
+            // Return immediately; progress is pushed over /api/crawl-events
+            res.status(202).json({ message: 'Crawling started', eventId });
         } catch (error) {
             logger.error(`Error starting crawl: ${error.message}`);
             res.status(500).json({ error: error.message });
         }
     }
 
+    // The request body (text/plain or text/csv) is streamed to the importer as it arrives
+    async importTrackedAsins(req, res) {
+        if (req.is('application/json') || req.is('application/x-www-form-urlencoded')) {
+            return res.status(415).json({ error: 'Send the list as text/plain (one URL or ASIN per line) or text/csv' });
+        }
+        const format = req.query.format || 'auto';
+        if (!['auto', 'lines', 'csv'].includes(format)) {
+            return res.status(400).json({ error: 'format must be one of auto, lines, csv' });
+        }
+        const marketplace = String(req.query.marketplace || 'amazon.com').toLowerCase().replace(/^www\./, '');
+        if (!MARKETPLACES.includes(marketplace)) {
+            return res.status(400).json({ error: `Unknown marketplace: ${marketplace}` });
+        }
+
+        try {
+            logger.info(`POST /api/tracked-asins/import - format ${format}, marketplace ${marketplace}`);
+            const summary = await serviceManager.getCrawlerService().importAsins(req, {
+                format,
+                marketplace,
+                tags: req.query.tags ? String(req.query.tags) : null,
+            });
+            res.json(summary);
+        } catch (error) {
+            logger.error(`Error importing ASINs: ${error.message}`);
+            res.status(500).json({ error: error.message });
+        }
+    }
+
     async deleteProduct(req, res) {
         try {
             const { id } = req.params;
@@ -1,5 +1,17 @@
 const Database = require('../config/database');
 const logger = require('../utils/logger');
+const { canonicalize } = require('../utils/amazonUrl');
+
+// rank_change_percent above which a product counts as trending
+const TRENDING_PERCENT = 10;
+
+// Sort keys per listing order. `nullable`: rows where the first key is NULL come last
+const PRODUCT_SORTS = {
+    rank: { keys: ['p.rank', 'p.name', 'p.id'], direction: 'ASC', nullable: true },
+    name: { keys: ['p.name', 'p.id'], direction: 'ASC' },
+    updated: { keys: ['p.updated_at', 'p.id'], direction: 'DESC' },
+    change: { keys: ['t.rank_change_percent', 't.marketplace', 't.asin'], direction: 'DESC', where: 't.rank_change_percent IS NOT NULL' },
+};
 
 class Product {
     constructor() {
@@ -11,7 +23,98 @@ class Product {
         await this.db.initTables();
     }
 
-    async getAllWithTrending() {
+    // Listing pages, in keyset order; the last key is unique so every row has one position
+    static get SORTS() {
+        return PRODUCT_SORTS;
+    }
+
+    static encodeCursor(sort, values) {
+        return Buffer.from(JSON.stringify({ s: sort, v: values })).toString('base64url');
+    }
+
+    // Key values of the last row of the previous page, or null if the cursor is not one of ours
+    static decodeCursor(sort, cursor) {
+        try {
+            const { s, v } = JSON.parse(Buffer.from(cursor, 'base64url').toString('utf8'));
+            return s === sort && Array.isArray(v) && v.length === PRODUCT_SORTS[sort].keys.length ? v : null;
+        } catch (error) {
+            return null;
+        }
+    }
+
+    async listProducts({ sort = 'rank', limit = 50, after = null, minRank = null, maxRank = null,
+                         brand = null, trending = false, updatedSince = null, search = null } = {}) {
+        const spec = PRODUCT_SORTS[sort];
+        const filters = [];
+        const params = [];
+        if (minRank !== null) {
+            filters.push('p.rank >= ?');
+            params.push(minRank);
+        }
+        if (maxRank !== null) {
+            filters.push('p.rank <= ?');
+            params.push(maxRank);
+        }
+        if (brand) {
+            filters.push('p.brand = ?');
+            params.push(brand);
+        }
+        if (trending) {
+            filters.push('t.rank_change_percent > ?');
+            params.push(TRENDING_PERCENT);
+        }
+        if (updatedSince) {
+            filters.push('p.updated_at >= ?');
+            params.push(updatedSince);
+        }
+        if (search) {
+            filters.push('(p.name LIKE ? OR p.asin LIKE ? OR p.brand LIKE ?)');
+            const pattern = `%${search}%`;
+            params.push(pattern, pattern, pattern);
+        }
+        if (spec.where) {
+            filters.push(spec.where);
+        }
+
+        try {
+            let rows = [];
+            if (!spec.nullable) {
+                rows = await this.queryPage(spec.keys, spec.direction, filters, params, after, limit + 1);
+            } else {
+                // Rows with a value come first, then the ones where the first key is NULL
+                const [first, ...rest] = spec.keys;
+                if (!after || after[0] !== null) {
+                    rows = await this.queryPage(spec.keys, spec.direction,
+                        [...filters, `${first} IS NOT NULL`], params, after, limit + 1);
+                }
+                if (rows.length <= limit) {
+                    rows = rows.concat(await this.queryPage(rest, spec.direction,
+                        [...filters, `${first} IS NULL`], params,
+                        after && after[0] === null ? after.slice(1) : null, limit + 1 - rows.length));
+                }
+            }
+
+            const products = rows.slice(0, limit);
+            const last = products[products.length - 1];
+            const nextCursor = rows.length > limit
+                ? Product.encodeCursor(sort, spec.keys.map(key => last[key.split('.')[1]]))
+                : null;
+            return { products, next_cursor: nextCursor };
+        } catch (error) {
+            logger.error(`Error fetching products: ${error.message}`);
+            throw error;
+        }
+    }
+
+    queryPage(keys, direction, filters, params, after, limit) {
+        const where = [...filters];
+        const values = [...params];
+        if (after) {
+            // Row-value comparison walks the sort index from the previous page's last row
+            const comparator = direction === 'ASC' ? '>' : '<';
+            where.push(`(${keys.join(', ')}) ${comparator} (${keys.map(() => '?').join(', ')})`);
+            values.push(...after);
+        }
         const query = `
             SELECT 
                 p.*,
@@ -27,78 +130,73 @@ class Product {
                     END
                     ELSE 'Never updated'
                 END as last_update,
-                CASE 
-                    WHEN rh1.rank IS NOT NULL AND rh2.rank IS NOT NULL 
-                    THEN ROUND(((rh2.rank - rh1.rank) / rh1.rank) * 100, 2)
-                    ELSE NULL
-                END as rank_change_percent,
-                CASE 
-                    WHEN rh1.rank IS NOT NULL AND rh2.rank IS NOT NULL 
-                    THEN CASE 
-                        WHEN rh1.rank < rh2.rank THEN 'up'
-                        WHEN rh1.rank > rh2.rank THEN 'down'
-                        ELSE 'stable'
-                    END
-                    ELSE 'new'
-                END as rank_trend,
-                (
-                    SELECT GROUP_CONCAT(rank ORDER BY recorded_at DESC)
-                    FROM rank_history rh
-                    WHERE rh.asin = p.asin
-                    ORDER BY recorded_at DESC
-                    LIMIT 5
-                ) as rank_history
+                t.rank_change_percent,
+                COALESCE(t.rank_trend, 'new') as rank_trend,
+                t.rank_history
             FROM products p
-            LEFT JOIN (
-                SELECT asin, rank, recorded_at
-                FROM rank_history 
-                WHERE recorded_at = (
-                    SELECT MAX(recorded_at) 
-                    FROM rank_history rh2 
-                    WHERE rh2.asin = rank_history.asin
-                )
-            ) rh1 ON p.asin = rh1.asin
-            LEFT JOIN (
-                SELECT asin, rank, recorded_at
-                FROM rank_history 
-                WHERE recorded_at = (
-                    SELECT recorded_at 
-                    FROM rank_history rh3 
-                    WHERE rh3.asin = rank_history.asin 
-                    ORDER BY recorded_at DESC 
-                    LIMIT 1 OFFSET 1
-                )
-            ) rh2 ON p.asin = rh2.asin
-            ORDER BY p.rank ASC, p.name ASC
+            LEFT JOIN product_trends t ON t.marketplace = p.marketplace AND t.asin = p.asin
+            ${where.length ? `WHERE ${where.join(' AND ')}` : ''}
+            ORDER BY ${keys.map(key => `${key} ${direction}`).join(', ')}
+            LIMIT ?
         `;
+        return this.db.all(query, [...values, limit]);
+    }
 
-        try {
-            const products = await this.db.all(query);
-            const trendingProducts = products.filter(product => 
-                product.rank_change_percent && product.rank_change_percent > 10
-            );
+    async getAllUrls() {
+        const rows = await this.db.all('SELECT url FROM products WHERE url IS NOT NULL ORDER BY id');
+        return rows.map(row => row.url);
+    }
 
-            logger.info(`Successfully fetched ${products.length} products, ${trendingProducts.length} trending`);
-            return { products, trending: trendingProducts };
-        } catch (error) {
-            logger.error(`Error fetching products: ${error.message}`);
-            throw error;
-        }
+    // Bumped by every write to the listed data (the crawler bumps it too); listing caches key on it
+    async getDataVersion() {
+        const row = await this.db.get("SELECT value FROM settings WHERE key = 'data_version'");
+        return row ? parseInt(row.value, 10) || 0 : 0;
+    }
+
+    async bumpDataVersion() {
+        await this.db.run(
+            "UPDATE settings SET value = CAST(value AS INTEGER) + 1, updated_at = CURRENT_TIMESTAMP WHERE key = 'data_version'"
+        );
     }
 
+    // Crawl status per submitted URL; URL variants of one product all match its (marketplace, asin) row,
+    // the key the crawler writes products under
     async getByUrls(urls) {
-        const query = `
-            SELECT url, name, updated_at 
-            FROM products 
-            WHERE url IN (${urls.map(() => '?').join(',')})
-        `;
+        const keys = urls.map(url => canonicalize(url));
+        const pairs = keys.filter(Boolean);
+        const plain = urls.filter((url, i) => !keys[i]);
+        const selects = [];
+        const params = [];
+        if (pairs.length > 0) {
+            // One index lookup per key
+            selects.push(`
+                SELECT p.url, p.marketplace, p.asin, p.name, p.updated_at
+                FROM (VALUES ${pairs.map(() => '(?, ?)').join(', ')}) k
+                JOIN products p ON p.marketplace = k.column1 AND p.asin = k.column2
+            `);
+            pairs.forEach(key => params.push(key.marketplace, key.asin));
+        }
+        if (plain.length > 0) {
+            selects.push(`
+                SELECT url, marketplace, asin, name, updated_at
+                FROM products
+                WHERE url IN (${plain.map(() => '?').join(',')})
+            `);
+            params.push(...plain);
+        }
+        if (selects.length === 0) {
+            return {};
+        }
+        const query = selects.join(' UNION ALL ');
 
         try {
-            const products = await this.db.all(query, urls);
+            const products = await this.db.all(query, params);
+            const byKey = new Map(products.map(row => [`${row.marketplace}|${row.asin}`, row]));
+            const byUrl = new Map(products.map(row => [row.url, row]));
             const status = {};
             
-            urls.forEach(url => {
-                const product = products.find(row => row.url === url);
+            urls.forEach((url, i) => {
+                const product = keys[i] ? byKey.get(`${keys[i].marketplace}|${keys[i].asin}`) : byUrl.get(url);
                 status[url] = product ? {
                     crawled: true,
                     name: product.name,
@@ -117,9 +215,10 @@ class Product {
 
     async create(productData) {
         const query = `
-            INSERT INTO products (name, price, rank, asin, brand, ratings, stars, image_url, date, url)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            INSERT INTO products (name, price, rank, asin, brand, ratings, stars, image_url, date, url, marketplace)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         `;
+        const key = canonicalize(productData.url);
 
         const params = [
             productData.title,
@@ -131,11 +230,13 @@ class Product {
             productData.stars,
             productData.image_url,
             productData.date,
-            productData.url
+            productData.url,
+            key ? key.marketplace : 'amazon.com'
         ];
 
         try {
             const result = await this.db.run(query, params);
+            await this.bumpDataVersion();
             logger.info(`Added new product: ${productData.title.substring(0, 50)}...`);
             return result;
         } catch (error) {
@@ -144,12 +245,13 @@ class Product {
         }
     }
 
-    async update(asin, productData) {
+    // By row id: an ASIN alone no longer names one product once it is tracked on several marketplaces
+    async update(id, productData) {
         const query = `
             UPDATE products 
             SET name = ?, price = ?, rank = ?, brand = ?, 
                 ratings = ?, stars = ?, image_url = ?, date = ?, updated_at = CURRENT_TIMESTAMP
-            WHERE asin = ?
+            WHERE id = ?
         `;
 
         const params = [
@@ -161,11 +263,12 @@ class Product {
             productData.stars,
             productData.image_url,
             productData.date,
-            asin
+            id
         ];
 
         try {
             const result = await this.db.run(query, params);
+            await this.bumpDataVersion();
             logger.info(`Updated product: ${productData.title.substring(0, 50)}...`);
             return result;
         } catch (error) {
@@ -179,6 +282,7 @@ class Product {
         
         try {
             const result = await this.db.run(query, [id]);
+            await this.bumpDataVersion();
             logger.info(`Deleted product with ID: ${id}`);
             return result;
         } catch (error) {
@@ -187,56 +291,26 @@ class Product {
         }
     }
 
-    async getByAsin(asin) {
-        const query = 'SELECT * FROM products WHERE asin = ?';
+    async getByAsin(asin, marketplace = 'amazon.com') {
+        const query = 'SELECT * FROM products WHERE marketplace = ? AND asin = ?';
         
         try {
-            return await this.db.get(query, [asin]);
+            return await this.db.get(query, [marketplace, asin]);
         } catch (error) {
             logger.error(`Error getting product by ASIN: ${error.message}`);
             throw error;
         }
     }
 
-    async addRankHistory(asin, rank, price) {
-        const query = `
-            INSERT INTO rank_history (asin, rank, price, recorded_at)
-            VALUES (?, ?, ?, CURRENT_TIMESTAMP)
-        `;
-
-        try {
-            await this.db.run(query, [asin, rank, price]);
-            logger.info(`Rank history added: ${rank}`);
-        } catch (error) {
-            logger.error(`Error adding rank history: ${error.message}`);
-            throw error;
-        }
-    }
-
-    async cleanupRankHistory(asin) {
-        const query = `
-            DELETE FROM rank_history 
-            WHERE asin = ? AND id NOT IN (
-                SELECT id FROM rank_history 
-                WHERE asin = ? 
-                ORDER BY recorded_at DESC 
-                LIMIT 5
-            )
-        `;
-
-        try {
-            await this.db.run(query, [asin, asin]);
-        } catch (error) {
-            logger.error(`Error cleaning up rank history: ${error.message}`);
-            throw error;
-        }
-    }
-
     async clearAll() {
         try {
             await this.db.run('DELETE FROM products');
             await this.db.run('DELETE FROM url_lists');
-            await this.db.run('DELETE FROM rank_history');
+            await this.db.run('DELETE FROM tracked_asins');
+            for (const table of ['rank_history', 'rank_history_hourly', 'rank_history_daily', 'product_trends']) {
+                await this.db.run(`DELETE FROM ${table}`);
+            }
+            await this.bumpDataVersion();
             logger.info('Database cleared successfully');
         } catch (error) {
             logger.error(`Error clearing database: ${error.message}`);
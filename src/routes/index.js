@@ -21,8 +21,12 @@ const settingsController = new SettingsController();
 
 // Product routes
 router.get('/api/products', (req, res) => productController.getAllProducts(req, res));
+router.get('/api/products/urls', (req, res) => productController.getProductUrls(req, res));
 router.get('/api/crawl-status', (req, res) => productController.getCrawlStatus(req, res));
+router.get('/api/crawl-events', (req, res) => productController.streamCrawlEvents(req, res));
+router.get('/metrics', (req, res) => productController.getMetrics(req, res));
 router.post('/api/crawl', (req, res) => productController.crawlUrls(req, res));
+router.post('/api/tracked-asins/import', (req, res) => productController.importTrackedAsins(req, res));
 router.delete('/api/products/:id', (req, res) => productController.deleteProduct(req, res));
 router.put('/api/products/:id', (req, res) => productController.updateProduct(req, res));
 
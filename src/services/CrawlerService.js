@@ -1,5 +1,7 @@
 const { spawn, spawnSync } = require('child_process');
+const { EventEmitter } = require('events');
 const path = require('path');
+const readline = require('readline');
 const logger = require('../utils/logger');
 
 // Detect a working Python command across platforms
@@ -48,10 +50,53 @@ function findWorkingPythonCommand() {
     return null;
 }
 
+// The interpreter is detected once per server process
+let detectedPython = null;
+
+function getPythonCommand() {
+    if (!detectedPython) {
+        detectedPython = findWorkingPythonCommand();
+    }
+    return detectedPython;
+}
+
 class CrawlerService {
     constructor() {
         this.crawlInterval = 2; // Default 2 hours
         this.productModel = null;
+        // 'adaptive': crawl only the ASINs due in crawl_schedule every tick; 'fixed': crawl the whole list every interval
+        this.schedulerMode = (process.env.CRAWL_SCHEDULER || 'adaptive').toLowerCase();
+        const tickMinutes = parseInt(process.env.SCHEDULER_TICK_MINUTES || '15', 10);
+        this.schedulerTickMinutes = tickMinutes > 0 ? tickMinutes : 15;
+        this.dueCrawlTimer = null;
+        this.dueCrawlRunning = false;
+        // Crawl events (NDJSON from the crawler's fd 3), re-emitted as 'crawl-event' for SSE clients
+        this.events = new EventEmitter();
+        this.events.setMaxListeners(0);
+        this.eventSeq = 0;
+        this.recentEvents = [];
+        this.recentEventsLimit = 500;
+        // One long-lived Python crawler taking JSON-RPC jobs; CRAWL_DAEMON=false spawns a process per crawl
+        this.useDaemon = process.env.CRAWL_DAEMON !== 'false';
+        this.daemon = null;
+        // How long shutdown waits for the daemon to finish its job before killing it
+        this.daemonStopTimeoutMs = parseInt(process.env.CRAWL_DAEMON_STOP_TIMEOUT_MS, 10) || 10000;
+        this.rpcSeq = 0;
+        this.pendingCalls = new Map();
+    }
+
+    // Events after `lastId`, so a reconnecting SSE client (Last-Event-ID) misses nothing
+    getEventsSince(lastId) {
+        return this.recentEvents.filter((evt) => evt.id > lastId);
+    }
+
+    publishEvent(event) {
+        const evt = { id: ++this.eventSeq, event };
+        this.recentEvents.push(evt);
+        if (this.recentEvents.length > this.recentEventsLimit) {
+            this.recentEvents.shift();
+        }
+        this.events.emit('crawl-event', evt);
     }
 
     async init() {
@@ -66,64 +111,171 @@ class CrawlerService {
 
     async crawlUrls(urls) {
         logger.info(`Starting crawl for ${urls.length} URLs`);
+        if (this.useDaemon) {
+            return this.runDaemonJob('crawl', { urls });
+        }
+        return this.runPythonCrawler([], JSON.stringify(urls));
+    }
 
-        return new Promise(async (resolve, reject) => {
-            let pythonProcess = null;
-
-            const detected = findWorkingPythonCommand();
-            if (!detected) {
-                const isWindows = process.platform === 'win32';
-                const helpMessage = isWindows
-                    ? 'Install Python 3.x from python.org and ensure the "py" launcher or "python" is in PATH. Also consider disabling Windows App Execution Aliases for python/python3.'
-                    : 'Install Python 3.x (e.g., sudo apt-get install python3) and ensure python3 is available in PATH.';
-                const error = new Error(`No working Python interpreter found. ${helpMessage}`);
-                logger.error(error.message);
-                reject(error);
-                return;
+    // Crawl the ASINs that the Python scheduler reports as due
+    async crawlDue() {
+        logger.info('Starting adaptive scheduler tick');
+        if (this.useDaemon) {
+            return this.runDaemonJob('crawl_due', { tick_minutes: this.schedulerTickMinutes });
+        }
+        return this.runPythonCrawler(['--due', '--tick-minutes', String(this.schedulerTickMinutes)], null);
+    }
+
+    // Finish a crawl run that was interrupted (crash, restart) from its last checkpoint
+    async resumeInterruptedCrawl() {
+        if (this.dueCrawlRunning) {
+            return;
+        }
+        this.dueCrawlRunning = true;
+        try {
+            logger.info('Checking for an interrupted crawl run to resume');
+            if (this.useDaemon) {
+                await this.runDaemonJob('resume', {});
+            } else {
+                await this.runPythonCrawler(['--resume'], null);
             }
+        } catch (error) {
+            logger.error(`Resuming interrupted crawl failed: ${error.message}`);
+        } finally {
+            this.dueCrawlRunning = false;
+        }
+    }
+
+    // Spawn the crawler script; stdout/stderr are logged line by line, fd 3 carries the NDJSON events.
+    // With ownStdout the caller reads stdout (JSON-RPC, import summary) and stderr carries the logs
+    spawnCrawler(extraArgs, { ownStdout = false } = {}) {
+        const detected = getPythonCommand();
+        if (!detected) {
+            const isWindows = process.platform === 'win32';
+            const helpMessage = isWindows
+                ? 'Install Python 3.x from python.org and ensure the "py" launcher or "python" is in PATH. Also consider disabling Windows App Execution Aliases for python/python3.'
+                : 'Install Python 3.x (e.g., sudo apt-get install python3) and ensure python3 is available in PATH.';
+            const error = new Error(`No working Python interpreter found. ${helpMessage}`);
+            logger.error(error.message);
+            throw error;
+        }
 
-            // Resolve script path so it works regardless of working directory
-            const scriptPath = path.join(__dirname, '..', '..', 'python', 'crawl_and_update_fixed.py');
-            const repoRoot = path.join(__dirname, '..', '..');
+        // Resolve script path so it works regardless of working directory
+        const scriptPath = path.join(__dirname, '..', '..', 'python', 'crawl_and_update_fixed.py');
+        const repoRoot = path.join(__dirname, '..', '..');
 
-            // Now spawn the process with the found command
+        let pythonProcess;
+        try {
+            const spawnArgs = [...detected.args, scriptPath, ...extraArgs];
+            pythonProcess = spawn(detected.cmd, spawnArgs, {
+                stdio: ['pipe', 'pipe', 'pipe', 'pipe'],
+                cwd: repoRoot,
+                env: { ...process.env, PYTHONIOENCODING: 'utf-8', CRAWL_EVENTS_FD: '3' },
+            });
+            logger.info(`Using Python command: ${detected.cmd} ${detected.args.join(' ')}`.trim());
+        } catch (error) {
+            logger.error(`Failed to spawn Python process with ${detected.cmd}: ${error.message}`);
+            throw error;
+        }
+
+        // Consume output line by line as it arrives; nothing is accumulated
+        if (!ownStdout) {
+            readline.createInterface({ input: pythonProcess.stdout, crlfDelay: Infinity })
+                .on('line', (line) => logger.info(`Python crawler output: ${line}`));
+        }
+
+        // The daemon sends its log lines to stderr, keeping stdout for JSON-RPC
+        readline.createInterface({ input: pythonProcess.stderr, crlfDelay: Infinity })
+            .on('line', (line) => (ownStdout
+                ? logger.info(`Python crawler output: ${line}`)
+                : logger.error(`Python crawler error: ${line}`)));
+
+        readline.createInterface({ input: pythonProcess.stdio[3], crlfDelay: Infinity })
+            .on('line', (line) => {
+                if (!line) {
+                    return;
+                }
+                try {
+                    this.publishEvent(JSON.parse(line));
+                } catch (error) {
+                    logger.warn(`Invalid crawl event: ${line}`);
+                }
+            });
+
+        return pythonProcess;
+    }
+
+    // Stream an ASIN list (a URL or ASIN per line, or asin,marketplace,tags CSV) into tracked_asins through
+    // python crawl_and_update_fixed.py --import -. `input` is piped, never buffered; resolves with the summary
+    importAsins(input, { format = 'auto', marketplace = 'amazon.com', tags = null } = {}) {
+        return new Promise((resolve, reject) => {
+            const args = ['--import', '-', '--import-format', format, '--marketplace', marketplace];
+            if (tags) {
+                args.push('--tags', tags);
+            }
+            let pythonProcess;
             try {
-                const spawnArgs = [...detected.args, scriptPath];
-                pythonProcess = spawn(detected.cmd, spawnArgs, {
-                    stdio: ['pipe', 'pipe', 'pipe'],
-                    cwd: repoRoot,
-                    env: { ...process.env, PYTHONIOENCODING: 'utf-8' },
-                });
-                logger.info(`Using Python command: ${detected.cmd} ${detected.args.join(' ')}`.trim());
+                pythonProcess = this.spawnCrawler(args, { ownStdout: true });
             } catch (error) {
-                logger.error(`Failed to spawn Python process with ${detected.cmd}: ${error.message}`);
                 reject(error);
                 return;
             }
 
-            // Send URLs to Python process
-            pythonProcess.stdin.write(JSON.stringify(urls));
-            pythonProcess.stdin.end();
+            // The summary is the last stdout line
+            let summary = null;
+            readline.createInterface({ input: pythonProcess.stdout, crlfDelay: Infinity })
+                .on('line', (line) => {
+                    try {
+                        summary = JSON.parse(line);
+                    } catch (error) {
+                        logger.info(`Python import output: ${line}`);
+                    }
+                });
 
-            let output = '';
-            let errorOutput = '';
+            pythonProcess.stdin.on('error', (error) => logger.error(`Import stdin error: ${error.message}`));
+            input.on('error', (error) => {
+                logger.error(`Import upload failed: ${error.message}`);
+                pythonProcess.kill();
+            });
+            input.pipe(pythonProcess.stdin);
 
-            pythonProcess.stdout.on('data', (data) => {
-                const message = data.toString().trim();
-                output += message + '\n';
-                logger.info(`Python crawler output: ${message}`);
+            pythonProcess.on('close', (code) => {
+                if (code === 0 && summary) {
+                    logger.info(`Imported ${summary.imported} of ${summary.read} ASINs (${summary.tracked} tracked)`);
+                    resolve(summary);
+                } else {
+                    logger.error(`ASIN import failed with code ${code}`);
+                    reject(new Error(`ASIN import failed with code ${code}`));
+                }
             });
 
-            pythonProcess.stderr.on('data', (data) => {
-                const message = data.toString().trim();
-                errorOutput += message + '\n';
-                logger.error(`Python crawler error: ${message}`);
+            pythonProcess.on('error', (error) => {
+                logger.error(`Failed to start Python process: ${error.message}`);
+                reject(error);
             });
+        });
+    }
+
+    runPythonCrawler(extraArgs, stdinPayload) {
+        return new Promise((resolve, reject) => {
+            let pythonProcess;
+            try {
+                pythonProcess = this.spawnCrawler(extraArgs);
+            } catch (error) {
+                reject(error);
+                return;
+            }
+
+            // Send URLs to Python process
+            if (stdinPayload !== null) {
+                pythonProcess.stdin.write(stdinPayload);
+            }
+            pythonProcess.stdin.end();
 
             pythonProcess.on('close', async (code) => {
                 if (code === 0) {
                     logger.info(`Crawling completed successfully with code ${code}`);
-                    resolve({ success: true, output, errorOutput });
+                    resolve({ success: true });
                 } else {
                     logger.error(`Crawling failed with code ${code}`);
                     reject(new Error(`Crawling failed with code ${code}`));
@@ -137,11 +289,134 @@ class CrawlerService {
         });
     }
 
+    // Start the long-lived crawler (python crawl_and_update_fixed.py --daemon) if it is not running
+    startDaemon() {
+        if (this.daemon) {
+            return this.daemon;
+        }
+        const daemon = this.spawnCrawler(['--daemon'], { ownStdout: true });
+        this.daemon = daemon;
+
+        readline.createInterface({ input: daemon.stdout, crlfDelay: Infinity })
+            .on('line', (line) => {
+                let message;
+                try {
+                    message = JSON.parse(line);
+                } catch (error) {
+                    logger.warn(`Invalid crawler daemon message: ${line}`);
+                    return;
+                }
+                if (message.method === 'ready') {
+                    logger.info(`Crawler daemon ready (pid ${message.params.pid})`);
+                    return;
+                }
+                const call = this.pendingCalls.get(message.id);
+                if (!call) {
+                    return;
+                }
+                this.pendingCalls.delete(message.id);
+                if (message.error) {
+                    call.reject(new Error(`Crawler daemon ${call.method} failed: ${message.error.message}`));
+                } else {
+                    call.resolve(message.result);
+                }
+            });
+
+        const onExit = (reason) => {
+            if (this.daemon !== daemon) {
+                return;
+            }
+            // The next job starts a new daemon
+            this.daemon = null;
+            if (reason === 'code 0') {
+                logger.info('Crawler daemon exited');
+            } else {
+                logger.error(`Crawler daemon stopped: ${reason}`);
+            }
+            for (const call of this.pendingCalls.values()) {
+                call.reject(new Error(`Crawler daemon stopped: ${reason}`));
+            }
+            this.pendingCalls.clear();
+        };
+        daemon.on('exit', (code, signal) => onExit(signal ? `signal ${signal}` : `code ${code}`));
+        daemon.on('error', (error) => onExit(error.message));
+        daemon.stdin.on('error', (error) => logger.error(`Crawler daemon stdin error: ${error.message}`));
+        return daemon;
+    }
+
+    callDaemon(method, params) {
+        return new Promise((resolve, reject) => {
+            let daemon;
+            try {
+                daemon = this.startDaemon();
+            } catch (error) {
+                reject(error);
+                return;
+            }
+            const id = ++this.rpcSeq;
+            this.pendingCalls.set(id, { method, resolve, reject });
+            daemon.stdin.write(`${JSON.stringify({ jsonrpc: '2.0', id, method, params })}\n`);
+        });
+    }
+
+    // Jobs are queued by the daemon and answered when they finish; overlapping ASINs are crawled once
+    async runDaemonJob(method, params) {
+        const result = await this.callDaemon(method, params);
+        if (result && result.success === false) {
+            logger.error(`Crawl job ${result.job} failed (run ${result.run_id})`);
+            throw new Error(`Crawl job ${result.job} failed`);
+        }
+        const details = result && result.total !== undefined
+            ? `: ${result.total} URLs, ${result.merged} covered by earlier jobs`
+            : '';
+        logger.info(`Crawl job ${result && result.job} (${method}) completed${details}`);
+        return result;
+    }
+
+    // Prometheus text of the daemon's crawl metrics; a crawler spawned per crawl keeps none between runs
+    async getMetrics() {
+        if (!this.useDaemon) {
+            throw new Error('Crawl metrics need the crawler daemon (CRAWL_DAEMON=false)');
+        }
+        const result = await this.callDaemon('metrics', {});
+        return result.text;
+    }
+
+    // Ask the daemon to finish its current job and exit; queued jobs are dropped. Resolves once it has
+    // exited and its output is read (so it never writes to a closed pipe), killing it after `timeoutMs`
+    stopDaemon(timeoutMs = this.daemonStopTimeoutMs) {
+        const daemon = this.daemon;
+        if (!daemon) {
+            return Promise.resolve();
+        }
+        return new Promise((resolve) => {
+            const timer = setTimeout(() => {
+                logger.warn(`Crawler daemon still running after ${timeoutMs} ms, killing it`);
+                daemon.kill('SIGKILL');
+            }, timeoutMs);
+            daemon.once('close', () => {
+                clearTimeout(timer);
+                resolve();
+            });
+            daemon.stdin.end();
+        });
+    }
+
     async scheduleCrawling() {
         const cron = require('node-cron');
         
         // Clear existing schedules
         cron.getTasks().forEach(task => task.stop());
+        clearInterval(this.dueCrawlTimer);
+        this.dueCrawlTimer = null;
+
+        if (this.schedulerMode === 'adaptive') {
+            // The crawl interval is the starting per-ASIN interval; the scheduler adapts it. A timer rather than
+            // a cron step, which only fits ticks below an hour that divide it evenly
+            this.dueCrawlTimer = setInterval(() => this.runDueCrawl(), this.schedulerTickMinutes * 60 * 1000);
+            logger.info(`Adaptive crawl schedule: tick every ${this.schedulerTickMinutes} minutes, base interval ${this.crawlInterval} hours`);
+            return;
+        }
         
         // Schedule new crawl interval
         cron.schedule(`0 */${this.crawlInterval} * * *`, async () => {
@@ -170,6 +445,21 @@ class CrawlerService {
         }
     }
 
+    async runDueCrawl() {
+        if (this.dueCrawlRunning) {
+            logger.info('Previous scheduler tick still running, skipping this tick');
+            return;
+        }
+        this.dueCrawlRunning = true;
+        try {
+            await this.crawlDue();
+        } catch (error) {
+            logger.error(`Scheduled crawl failed: ${error.message}`);
+        } finally {
+            this.dueCrawlRunning = false;
+        }
+    }
+
     async getUrlsFromDatabase() {
         try {
             const result = await this.productModel.db.all(
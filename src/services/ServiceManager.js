@@ -2,6 +2,9 @@ const CrawlerService = require('./CrawlerService');
 const Product = require('../models/Product');
 const logger = require('../utils/logger');
 
+// Past the crawler's 120 s heartbeat window (get_resumable_run in python/db_utils.py)
+const RESUME_RECHECK_MS = 130 * 1000;
+
 class ServiceManager {
     constructor() {
         this.crawlerService = null;
@@ -25,6 +28,14 @@ class ServiceManager {
         this.crawlerService.setProductModel(this.productModel);
         await this.crawlerService.init();
         await this.crawlerService.scheduleCrawling();
+
+        // Pick up a run left unfinished by a previous process; don't block startup on it
+        if (process.env.CRAWL_AUTO_RESUME !== 'false') {
+            this.crawlerService.resumeInterruptedCrawl();
+            // Check again once a crawler the restart left running (or one on another host, which only
+            // counts as gone when its heartbeat is 2 minutes old) has had time to exit
+            setTimeout(() => this.crawlerService.resumeInterruptedCrawl(), RESUME_RECHECK_MS).unref();
+        }
         
         this.initialized = true;
         logger.info('ServiceManager initialized successfully');
@@ -0,0 +1,37 @@
+// Amazon product URL -> (marketplace, ASIN); mirrors python/amazon_urls.py, keep the two in step
+const MARKETPLACES = [
+    'amazon.com', 'amazon.ca', 'amazon.com.mx', 'amazon.com.br',
+    'amazon.co.uk', 'amazon.de', 'amazon.fr', 'amazon.it', 'amazon.es', 'amazon.nl', 'amazon.se', 'amazon.pl',
+    'amazon.com.be', 'amazon.com.tr', 'amazon.ae', 'amazon.sa', 'amazon.eg',
+    'amazon.in', 'amazon.co.jp', 'amazon.sg', 'amazon.com.au',
+];
+
+const ASIN_PATH = new RegExp(
+    '/(?:dp|dp/product|gp/product|gp/aw/d|gp/offer-listing|product-reviews|exec/obidos/asin'
+    + '|exec/obidos/tg/detail/-|o/asin)/([a-z0-9]{10})(?=[/?#;]|$)',
+    'i'
+);
+
+// 'amazon.co.uk' for www.amazon.co.uk; other hosts are their own marketplace
+function marketplace(host) {
+    const hostname = host.toLowerCase().split(':')[0].replace(/\.$/, '');
+    const domain = MARKETPLACES.find(d => hostname === d || hostname.endsWith(`.${d}`));
+    return domain || host.toLowerCase();
+}
+
+// { marketplace, asin } of a product URL, or null if the URL names no product
+function canonicalize(url) {
+    let parsed;
+    try {
+        parsed = new URL(String(url).trim());
+    } catch (error) {
+        return null;
+    }
+    const match = ASIN_PATH.exec(parsed.pathname);
+    if (!match || !parsed.host) {
+        return null;
+    }
+    return { marketplace: marketplace(parsed.host), asin: match[1].toUpperCase() };
+}
+
+module.exports = { MARKETPLACES, canonicalize };
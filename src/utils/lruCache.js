@@ -0,0 +1,36 @@
+// Least-recently-used cache; a Map keeps keys in insertion order, oldest first
+class LruCache {
+    constructor(maxEntries = 100) {
+        this.maxEntries = Math.max(1, maxEntries);
+        this.entries = new Map();
+    }
+
+    get(key) {
+        if (!this.entries.has(key)) {
+            return undefined;
+        }
+        const value = this.entries.get(key);
+        // Move to the most recently used end
+        this.entries.delete(key);
+        this.entries.set(key, value);
+        return value;
+    }
+
+    set(key, value) {
+        this.entries.delete(key);
+        this.entries.set(key, value);
+        if (this.entries.size > this.maxEntries) {
+            this.entries.delete(this.entries.keys().next().value);
+        }
+    }
+
+    clear() {
+        this.entries.clear();
+    }
+
+    get size() {
+        return this.entries.size;
+    }
+}
+
+module.exports = LruCache;
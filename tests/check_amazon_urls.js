@@ -0,0 +1,17 @@
+// Checks src/utils/amazonUrl.js against the URL cases shared with python/tests/test_amazon_urls.py
+const path = require('path');
+const { canonicalize } = require('../src/utils/amazonUrl');
+const cases = require(path.join(__dirname, 'amazon_url_cases.json'));
+
+let failures = 0;
+for (const { url, marketplace, asin } of cases) {
+    const expected = asin ? { marketplace, asin } : null;
+    const actual = canonicalize(url);
+    if (JSON.stringify(actual) !== JSON.stringify(expected)) {
+        failures += 1;
+        console.error(`FAIL ${JSON.stringify(url)}: expected ${JSON.stringify(expected)}, got ${JSON.stringify(actual)}`);
+    }
+}
+
+console.log(`${cases.length - failures}/${cases.length} URL cases passed`);
+process.exitCode = failures ? 1 : 0;